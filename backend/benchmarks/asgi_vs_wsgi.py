@@ -0,0 +1,143 @@
+"""
+Compare the WSGI endpoint (gunicorn sync workers, /graphql/) with the ASGI
+endpoint (gunicorn + uvicorn workers, /graphql/async/) at the same worker count.
+
+Both servers are started against the database configured in the
+environment (DATABASE_URL), which needs at least one organization with a
+project, e.g. after `python manage.py seed`. Run from backend/:
+
+    python benchmarks/asgi_vs_wsgi.py --workers 2 --concurrency 32 --requests 2000
+
+--db-latency-ms adds a delay to every SQL statement on both servers, to
+see how they behave against a database that isn't on the same machine.
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Several independent root fields, as the dashboard and project pages ask
+QUERY = '''
+query($slug: String!, $projectId: ID!) {
+  organization(slug: $slug) { id name }
+  projectsByOrganization(organizationSlug: $slug) { id name taskCount completedTasks }
+  project(id: $projectId) { id name status }
+  tasksByProject(projectId: $projectId, first: 50) {
+    edges { node { id title status assigneeEmail } }
+  }
+}
+'''
+
+SERVERS = {
+    'wsgi': (['config.wsgi'], '/graphql/'),
+    'asgi': (['config.asgi', '-k', 'uvicorn.workers.UvicornWorker'], '/graphql/async/'),
+}
+
+
+def post(url, query, variables=None):
+    body = json.dumps({'query': query, 'variables': variables or {}}).encode()
+    request = urllib.request.Request(url, body, {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        content = json.loads(response.read())
+    if 'errors' in content:
+        raise RuntimeError(content['errors'])
+    return content['data']
+
+
+def start(name, port, workers):
+    args, path = SERVERS[name]
+    config = os.path.join(os.path.dirname(__file__), 'gunicorn_latency.py')
+    process = subprocess.Popen(
+        [
+            'gunicorn', *args,
+            '--config', config,
+            '--workers', str(workers),
+            '--bind', f'127.0.0.1:{port}',
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f'http://localhost:{port}{path}'  # in the default ALLOWED_HOSTS
+    for _ in range(100):
+        try:
+            post(url, '{ __typename }')
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{name} server didn't start")
+
+
+def sample_variables(url):
+    data = post(url, '{ allOrganizations(first: 100) { edges { node { slug projects { id } } } } }')
+    for edge in data['allOrganizations']['edges']:
+        organization = edge['node']
+        if organization['projects']:
+            return {'slug': organization['slug'], 'projectId': organization['projects'][0]['id']}
+    raise RuntimeError("No organization with a project found, seed the database first")
+
+
+def run(url, variables, requests, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        post(url, QUERY, variables)
+        return time.perf_counter() - started
+
+    for _ in range(concurrency):  # warm up every worker's connections
+        timed(None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'requests_per_second': requests / elapsed,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=8101)
+    parser.add_argument('--db-latency-ms', type=float, default=0)
+    options = parser.parse_args()
+
+    os.environ['BENCHMARK_DB_LATENCY_MS'] = str(options.db_latency_ms)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    results = {}
+    for offset, name in enumerate(SERVERS):
+        process, url = start(name, options.port + offset, options.workers)
+        try:
+            results[name] = run(
+                url, sample_variables(url), options.requests, options.concurrency
+            )
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+
+        result = results[name]
+        print(
+            f"{name}: {result['requests_per_second']:7.1f} req/s  "
+            f"p50 {result['p50_ms']:6.1f}ms  p95 {result['p95_ms']:6.1f}ms  "
+            f"p99 {result['p99_ms']:6.1f}ms",
+            flush=True,
+        )
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure how long requests wait to get a database connection, under concurrency,
+with each way of managing connections:
+
+- connect: a new connection per request (CONN_MAX_AGE=0)
+- persistent: one connection per thread, kept open (CONN_MAX_AGE, the default)
+- pool: a psycopg_pool pool shared by the threads (DATABASE_POOL)
+
+Needs a Postgres DATABASE_URL. Each of --concurrency threads serves --requests
+simulated requests the way a worker thread (sync worker, or the async
+endpoint's resolver threads) does: take a connection, hold it for a query of
+--work-ms, then hand it back as Django does when the request finishes. Run
+from backend/:
+
+    python benchmarks/connection_pool.py --concurrency 32 --requests 200 --pool-max-size 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+MODES = ('connect', 'persistent', 'pool')
+
+
+def configure(options):
+    """Add a database alias per mode, all pointing at the default database"""
+    base = settings.DATABASES['default']
+    if base['ENGINE'] != 'django.db.backends.postgresql':
+        raise SystemExit("This benchmark needs a Postgres DATABASE_URL")
+    connection_options = {k: v for k, v in base.get('OPTIONS', {}).items() if k != 'pool'}
+    settings.DATABASES['connect'] = {**base, 'OPTIONS': connection_options, 'CONN_MAX_AGE': 0}
+    settings.DATABASES['persistent'] = {
+        **base, 'OPTIONS': connection_options, 'CONN_MAX_AGE': 600,
+    }
+    settings.DATABASES['pool'] = {
+        **base,
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            **connection_options,
+            'pool': {
+                'min_size': options.pool_min_size,
+                'max_size': options.pool_max_size,
+                'timeout': options.pool_timeout,
+            },
+        },
+    }
+
+
+def run(alias, concurrency, requests, work):
+    from django.db import connections
+
+    backends = set()
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency)
+
+    def serve(_):
+        connection = connections[alias]
+        waits = []
+        start.wait()
+        for _ in range(requests):
+            started = time.perf_counter()
+            connection.ensure_connection()
+            waits.append(time.perf_counter() - started)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid(), pg_sleep(%s)", [work])
+                pid = cursor.fetchone()[0]
+            with lock:
+                backends.add(pid)
+            # What the request_finished signal does
+            connection.close_if_unusable_or_obsolete()
+        connection.close()
+        return waits
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        waits = sorted(wait for thread in executor.map(serve, range(concurrency)) for wait in thread)
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(waits, n=100)
+    result = {
+        'requests_per_second': len(waits) / elapsed,
+        'acquire_p50_ms': quantiles[49] * 1000,
+        'acquire_p95_ms': quantiles[94] * 1000,
+        'acquire_p99_ms': quantiles[98] * 1000,
+        'acquire_max_ms': waits[-1] * 1000,
+        'server_connections': len(backends),
+    }
+    if alias == 'pool':
+        result['pool_stats'] = connections[alias].pool.get_stats()
+        connections[alias].close_pool()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200, help="Per thread")
+    parser.add_argument('--work-ms', type=float, default=5)
+    parser.add_argument('--pool-min-size', type=int, default=settings.DATABASE_POOL_MIN_SIZE)
+    parser.add_argument('--pool-max-size', type=int, default=settings.DATABASE_POOL_MAX_SIZE)
+    parser.add_argument('--pool-timeout', type=float, default=settings.DATABASE_POOL_TIMEOUT)
+    parser.add_argument('--modes', default=','.join(MODES))
+    options = parser.parse_args()
+
+    configure(options)
+    django.setup()
+
+    results = {}
+    for mode in options.modes.split(','):
+        result = results[mode] = run(
+            mode, options.concurrency, options.requests, options.work_ms / 1000
+        )
+        print(
+            f"{mode:>10}: {result['requests_per_second']:7.1f} req/s  acquire "
+            f"p50 {result['acquire_p50_ms']:6.2f}ms  p95 {result['acquire_p95_ms']:6.2f}ms  "
+            f"p99 {result['acquire_p99_ms']:6.2f}ms  max {result['acquire_max_ms']:7.2f}ms  "
+            f"{result['server_connections']} server connections",
+            flush=True,
+        )
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
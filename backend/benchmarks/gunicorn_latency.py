@@ -0,0 +1,20 @@
+# gunicorn config used by asgi_vs_wsgi.py: delays every SQL statement by
+# BENCHMARK_DB_LATENCY_MS, standing in for the round trip to a remote database
+import os
+import time
+
+
+def post_worker_init(worker):
+    delay = float(os.environ.get('BENCHMARK_DB_LATENCY_MS', 0)) / 1000
+    if not delay:
+        return
+
+    from django.db.backends import utils
+
+    execute = utils.CursorWrapper.execute
+
+    def slow_execute(self, sql, params=None):
+        time.sleep(delay)
+        return execute(self, sql, params)
+
+    utils.CursorWrapper.execute = slow_execute
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections to /graphql/ speak GraphQL
+(graphql-transport-ws) for subscriptions.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +15,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from projects.websocket import graphql_websocket  # noqa: E402
+
+WEBSOCKET_PATHS = ('/graphql/', '/graphql')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] in WEBSOCKET_PATHS:
+            return await graphql_websocket(scope, receive, send)
+        await receive()  # websocket.connect
+        return await send({'type': 'websocket.close', 'code': 1000})
+    return await django_application(scope, receive, send)
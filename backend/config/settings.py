@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'projects.routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,14 +78,68 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Pooled connections (Postgres only, with psycopg 3's psycopg_pool): each
+# process keeps between DATABASE_POOL_MIN_SIZE and DATABASE_POOL_MAX_SIZE
+# connections, shared by its threads and handed back after every request,
+# and a request waits up to DATABASE_POOL_TIMEOUT seconds for one. Without
+# it, each thread keeps its own connection open for 10 minutes. A database
+# URL can also set them: ?pool=true&pool_min_size=2&pool_max_size=20&pool_timeout=5
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+DATABASE_POOL_MIN_SIZE = config('DATABASE_POOL_MIN_SIZE', default=1, cast=int)
+DATABASE_POOL_MAX_SIZE = config('DATABASE_POOL_MAX_SIZE', default=10, cast=int)
+DATABASE_POOL_TIMEOUT = config('DATABASE_POOL_TIMEOUT', default=10, cast=float)
+
+
+def database(url):
+    """The DATABASES entry for a database URL"""
+    entry = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    options = entry.setdefault('OPTIONS', {})
+    pool = {
+        'min_size': options.pop('pool_min_size', DATABASE_POOL_MIN_SIZE),
+        'max_size': options.pop('pool_max_size', DATABASE_POOL_MAX_SIZE),
+        'timeout': float(options.pop('pool_timeout', DATABASE_POOL_TIMEOUT)),
+    }
+    if options.pop('pool', DATABASE_POOL) and entry['ENGINE'] == 'django.db.backends.postgresql':
+        options['pool'] = pool
+        # Connections go back to the pool at the end of each request (and
+        # are checked when taken out, as CONN_HEALTH_CHECKS is on)
+        entry['CONN_MAX_AGE'] = 0
+    return entry
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=config('DATABASE_URL'),
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    'default': database(config('DATABASE_URL')),
 }
 
+# Read replicas, as comma-separated database URLs: 'replica_1', 'replica_2', ...
+# While serving requests, reads go to a healthy replica and writes to the
+# primary (projects.routing). Two SQLite files work for trying this locally:
+# migrate both, then refresh the replica with `manage.py sync_sqlite_replicas`.
+for number, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), 1):
+    DATABASES[f'replica_{number}'] = database(url)
+
+# Shards, as comma-separated database URLs: 'shard_1', 'shard_2', ... Each
+# organization, with its projects, tasks and comments, lives on one shard
+# ('default' unless moved with `manage.py move_organization`; see
+# projects.sharding). Only append to the list: a shard's position sets the
+# range of ids it hands out. Replicas replicate the default shard.
+for number, url in enumerate(config('DATABASE_SHARD_URLS', default='', cast=Csv()), 1):
+    DATABASES[f'shard_{number}'] = database(url)
+DATABASE_SHARDS = ['default', *(alias for alias in DATABASES if alias.startswith('shard_'))]
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias not in DATABASE_SHARDS]
+DATABASE_ROUTERS = ['projects.sharding.ShardRouter', 'projects.routing.PrimaryReplicaRouter']
+# After writing, a client reads from the primary for this many seconds, to
+# see its own writes before the replicas have them (0: only that request)
+DATABASE_READ_YOUR_WRITES_SECONDS = config('DATABASE_READ_YOUR_WRITES_SECONDS', default=5, cast=int)
+# SameSite of the cookie that tells so: 'None' (then sent Secure, so over
+# HTTPS only) when the frontend calls the API from another site
+DATABASE_READ_YOUR_WRITES_SAMESITE = config('DATABASE_READ_YOUR_WRITES_SAMESITE', default='Lax')
+# How often to check that a replica answers, and on Postgres how far behind
+# (in seconds) it may be replaying (0: any lag); failing ones are skipped
+DATABASE_REPLICA_CHECK_INTERVAL = config('DATABASE_REPLICA_CHECK_INTERVAL', default=10, cast=float)
+DATABASE_REPLICA_MAX_LAG = config('DATABASE_REPLICA_MAX_LAG', default=0, cast=float)
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -133,15 +188,61 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # GraphQL Configuration
 GRAPHENE = {
-    'SCHEMA': 'projects.schema.schema'
+    'SCHEMA': 'projects.schema.schema',
+    # Mutations and the counter updates they trigger commit together
+    'ATOMIC_MUTATIONS': True,
+    'MIDDLEWARE': ['projects.metrics.ResolverTimingMiddleware'],
 }
 
+# Parsed/validated documents kept in memory per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = config('GRAPHQL_DOCUMENT_CACHE_SIZE', default=500, cast=int)
+# JSON manifest of {sha256: query} persisted queries
+GRAPHQL_PERSISTED_QUERIES_FILE = config('GRAPHQL_PERSISTED_QUERIES_FILE', default='')
+# Only run queries from the manifest (production lock-down)
+GRAPHQL_ALLOWLIST = config('GRAPHQL_ALLOWLIST', default=False, cast=bool)
+
+# Response cache for read-only operations: '' (off), 'local' (in-process,
+# single worker only) or 'django' (the CACHES alias below, e.g. Redis)
+GRAPHQL_RESPONSE_CACHE = config('GRAPHQL_RESPONSE_CACHE', default='')
+GRAPHQL_RESPONSE_CACHE_ALIAS = config('GRAPHQL_RESPONSE_CACHE_ALIAS', default='default')
+GRAPHQL_RESPONSE_CACHE_SIZE = config('GRAPHQL_RESPONSE_CACHE_SIZE', default=5000, cast=int)
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = config('GRAPHQL_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Async endpoint (/graphql/async/): run resolvers in one shared thread
+# instead of a pool, i.e. without concurrency between root fields
+GRAPHQL_ASYNC_THREAD_SENSITIVE = config('GRAPHQL_ASYNC_THREAD_SENSITIVE', default=False, cast=bool)
+
+# Static query cost limits (0 turns a check off). Cost counts object fields
+# resolved; unpaginated lists are assumed to hold GRAPHQL_DEFAULT_LIST_SIZE items,
+# a default page: they have no limit, so never cost less than a paginated list
+GRAPHQL_MAX_QUERY_DEPTH = config('GRAPHQL_MAX_QUERY_DEPTH', default=10, cast=int)
+GRAPHQL_MAX_QUERY_COST = config('GRAPHQL_MAX_QUERY_COST', default=10000, cast=int)
+GRAPHQL_DEFAULT_LIST_SIZE = config('GRAPHQL_DEFAULT_LIST_SIZE', default=50, cast=int)
+
+# Resolver and SQL timings: returned in the response's extensions when the
+# trace header is sent (and GRAPHQL_TRACING is on), and always aggregated
+# into the Prometheus histograms served at /metrics/ to these addresses (and
+# /graphql/stats/ too)
+GRAPHQL_TRACING = config('GRAPHQL_TRACING', default=DEBUG, cast=bool)
+GRAPHQL_TRACE_HEADER = config('GRAPHQL_TRACE_HEADER', default='X-GraphQL-Trace')
+GRAPHQL_METRICS_ALLOWED_IPS = config(
+    'GRAPHQL_METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv()
+)
+
+# GraphQL subscriptions (WebSocket at /graphql/ under ASGI): 'memory' for a
+# single process, 'redis' for several workers/nodes, '' to turn publishing
+# off, or the dotted path of a custom broker class
+GRAPHQL_SUBSCRIPTIONS_BROKER = config('GRAPHQL_SUBSCRIPTIONS_BROKER', default='memory')
+GRAPHQL_SUBSCRIPTIONS_REDIS_URL = config('GRAPHQL_SUBSCRIPTIONS_REDIS_URL', default='redis://localhost:6379/0')
+
 # CORS Configuration (allows frontend to access backend)
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
     default='http://localhost:3000',
     cast=Csv()
 )
+# The frontend sends cookies (read-your-writes routing, see DATABASE_READ_YOUR_WRITES_SECONDS)
+CORS_ALLOW_CREDENTIALS = True
 # neon not supporting test database
 import sys
 if 'test' in sys.argv:
@@ -149,6 +250,21 @@ if 'test' in sys.argv:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': ':memory:',
-        }
+        },
+        # A second database for the routing tests, which add it to
+        # DATABASE_REPLICAS; it only gets rows written to it directly
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+        # A second shard for the sharding tests, which add it to DATABASE_SHARDS
+        'shard': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
     }
+    DATABASE_REPLICAS = []
+    DATABASE_SHARDS = ['default']
+    # Test data lives in the test thread's open transaction
+    GRAPHQL_ASYNC_THREAD_SENSITIVE = True
 
@@ -1,10 +1,23 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from projects.views import (
+    AsyncGraphQLView,
+    CachedGraphQLView,
+    graphql_metrics,
+    graphql_stats,
+    import_data,
+    organization_export,
+)
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(CachedGraphQLView.as_view(graphiql=True))),
+    # Same API executed asynchronously, for ASGI deployments (uvicorn)
+    path('graphql/async/', csrf_exempt(AsyncGraphQLView.as_view(graphiql=True))),
+    path('graphql/stats/', graphql_stats),
+    path('metrics/', graphql_metrics),
+    path('export/<slug:slug>/', organization_export),
+    path('import/', csrf_exempt(import_data)),
 ]
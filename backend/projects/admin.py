@@ -1,39 +1,329 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from . import search
+from .archive import archive_project, restore_project
+from .caching import invalidate_all
+from .counters import set_task_status
+from .estimates import ESTIMATE, EXACT, EXACT_COUNT_LIMIT, estimated_count
 from .models import Organization, Project, Task, TaskComment
+from .purge import purge_organization
+
+
+class InvalidateResponseCacheMixin:
+    """Admin edits can move or remove anything, so expire every cached read"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_all()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_all()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_all()
+
 
 @admin.register(Organization)
-class OrganizationAdmin(admin.ModelAdmin):
+class OrganizationAdmin(InvalidateResponseCacheMixin, admin.ModelAdmin):
     list_display = ('name', 'slug', 'contact_email', 'created_at')
     search_fields = ('name', 'slug', 'contact_email')
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ('created_at', 'updated_at')
+    actions = ['purge_selected']
+
+    @admin.action(
+        description="Purge selected organizations (fast delete of all their data)",
+        permissions=['delete'],
+    )
+    def purge_selected(self, request, queryset):
+        # Skips the deletion collector, which loads every row of a large tenant
+        for organization in queryset:
+            deleted = purge_organization(organization)
+            summary = ", ".join(f"{count} {name}" for name, count in deleted.items())
+            self.message_user(
+                request, f"Purged {organization.name}: {summary}", messages.SUCCESS
+            )
+
+
+class FullTextSearchMixin:
+    """
+    Search through the full-text index (projects.search) instead of
+    search_fields' ILIKE '%term%', which reads the whole table.
+    search_fields still has to be set for the search box to show.
+    """
+
+    # search.task_matches or search.comment_matches
+    search_matches = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not search.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        sql, params = self.search_matches(search_term)
+        return queryset.filter(pk__in=RawSQL(sql, params)), False
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts at most exact_count_limit rows; past that the count is
+    the planner's estimate (or that limit, as a lower bound).
+    """
+
+    exact_count_limit = EXACT_COUNT_LIMIT
+
+    @cached_property
+    def count_with_accuracy(self):
+        return estimated_count(self.object_list, self.exact_count_limit)
+
+    @property
+    def count(self):
+        return self.count_with_accuracy[0]
+
+    @property
+    def count_label(self):
+        count, how = self.count_with_accuracy
+        if how == EXACT:
+            return f"{count:,}"
+        if how == ESTIMATE:
+            return f"about {count:,}"
+        return f"{count:,}+"
+
+
+# Query string parameters of keyset pages: the id a page continues after
+# (older rows) or before (newer rows)
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+class KeysetChangeList(ChangeList):
+    """
+    A changelist paged by primary key, newest first: each page is one
+    indexed range scan (WHERE id < last id ORDER BY id DESC LIMIT n)
+    rather than an OFFSET that reads every row before it. Links go to the
+    next, previous and first pages; there are no page numbers.
+    """
+
+    # Tells admin/projects/pagination.html which links to show
+    keyset = True
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filtering or searching starts again from the first page
+        remove = [*(remove or []), AFTER_VAR, BEFORE_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def _cursor(self, name):
+        value = self.params.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise IncorrectLookupParameters(f"Invalid {name}: {value!r}")
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        after = self._cursor(AFTER_VAR)
+        before = self._cursor(BEFORE_VAR)
+        size = self.list_per_page
+
+        if before is not None:
+            rows = list(self.queryset.filter(pk__gt=before).order_by('pk')[:size + 1])
+            has_previous = len(rows) > size
+            rows = rows[:size][::-1]
+            has_next = True
+        else:
+            rows = self.queryset
+            if after is not None:
+                rows = rows.filter(pk__lt=after)
+            rows = list(rows[:size + 1])
+            has_next = len(rows) > size
+            rows = rows[:size]
+            has_previous = after is not None
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or has_previous
+        self.paginator = paginator
+        self.first_url = self.get_query_string() if has_previous else None
+        self.previous_url = (
+            self.get_query_string({BEFORE_VAR: rows[0].pk}) if has_previous and rows else None
+        )
+        self.next_url = (
+            self.get_query_string({AFTER_VAR: rows[-1].pk}) if has_next and rows else None
+        )
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    A foreign key filter picked with the admin's autocomplete widget, which
+    searches as you type, instead of a link per related row. Use it as
+    list_filter = [('field__path', AutocompleteFilter)]; the related
+    model's admin needs search_fields.
+    """
+
+    template = 'admin/projects/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # What the autocomplete view searches: the related model, through this field
+        self.app_label = field.model._meta.app_label
+        self.model_name = field.model._meta.model_name
+        self.field_name = field.name
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    @cached_property
+    def selected(self):
+        values = self.used_parameters.get(self.lookup_kwarg)
+        if not values:
+            return None
+        try:
+            return self.field.related_model._default_manager.filter(pk=values[-1]).first()
+        except (ValueError, ValidationError):
+            return None  # the filter itself reports it
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.selected,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    For tables too big to count or page through with OFFSET: estimated
+    counts, keyset pages (newest first, so columns don't sort), and no
+    second COUNT(*) for the unfiltered total or per-choice facet counts.
+    Pair it with AutocompleteFilter and autocomplete_fields, which don't
+    load every related row either.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Facets count every filter choice over the whole table
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ('-pk',)
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @property
+    def media(self):
+        # select2, for AutocompleteFilter; its media doesn't depend on the field
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(js=['admin/js/jquery.init.js', 'projects/autocomplete_filter.js'])
+        )
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(InvalidateResponseCacheMixin, admin.ModelAdmin):
     list_display = ('name', 'organization', 'status', 'due_date', 'created_at')
     list_filter = ('status', 'organization')
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'todo_count', 'in_progress_count', 'done_count', 'archived_at', 'created_at', 'updated_at'
+    )
+    actions = ['archive_selected', 'restore_selected']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('organization')
 
+    @admin.action(
+        description="Archive tasks of selected completed projects", permissions=['change']
+    )
+    def archive_selected(self, request, queryset):
+        for project in queryset:
+            if project.status != 'COMPLETED':
+                self.message_user(
+                    request, f"{project.name} isn't completed, not archived.", messages.WARNING
+                )
+                continue
+            moved = archive_project(project)
+            self.message_user(request, f"Archived {moved} tasks of {project.name}.", messages.SUCCESS)
+
+    @admin.action(description="Restore archived tasks of selected projects", permissions=['change'])
+    def restore_selected(self, request, queryset):
+        for project in queryset:
+            moved = restore_project(project)
+            self.message_user(request, f"Restored {moved} tasks of {project.name}.", messages.SUCCESS)
+
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(
+    LargeTableAdminMixin, FullTextSearchMixin, InvalidateResponseCacheMixin, admin.ModelAdmin
+):
     list_display = ('title', 'project', 'status', 'assignee_email', 'due_date', 'created_at')
-    list_filter = ('status', 'project__organization')
+    list_filter = (
+        'status',
+        ('project__organization', AutocompleteFilter),
+        ('project', AutocompleteFilter),
+    )
     search_fields = ('title', 'description', 'assignee_email')
+    search_matches = staticmethod(search.task_matches)
+    autocomplete_fields = ('project',)
     readonly_fields = ('created_at', 'updated_at')
+    actions = ['mark_todo', 'mark_in_progress', 'mark_done']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('project', 'project__organization')
 
+    def set_status(self, request, queryset, status):
+        # One UPDATE for the whole selection, even "select all" across pages
+        changed = set_task_status(queryset, status)
+        invalidate_all()
+        label = dict(Task.STATUS_CHOICES)[status]
+        self.message_user(request, f"{changed} tasks marked as {label}.", messages.SUCCESS)
+
+    @admin.action(description="Mark selected tasks as To Do", permissions=['change'])
+    def mark_todo(self, request, queryset):
+        self.set_status(request, queryset, 'TODO')
+
+    @admin.action(description="Mark selected tasks as In Progress", permissions=['change'])
+    def mark_in_progress(self, request, queryset):
+        self.set_status(request, queryset, 'IN_PROGRESS')
+
+    @admin.action(description="Mark selected tasks as Done", permissions=['change'])
+    def mark_done(self, request, queryset):
+        self.set_status(request, queryset, 'DONE')
+
 @admin.register(TaskComment)
-class TaskCommentAdmin(admin.ModelAdmin):
+class TaskCommentAdmin(
+    LargeTableAdminMixin, FullTextSearchMixin, InvalidateResponseCacheMixin, admin.ModelAdmin
+):
     list_display = ('task', 'author_email', 'created_at')
+    list_filter = (
+        ('task__project__organization', AutocompleteFilter),
+        ('task__project', AutocompleteFilter),
+    )
     search_fields = ('content', 'author_email')
+    autocomplete_fields = ('task',)
+    search_matches = staticmethod(search.comment_matches)
     readonly_fields = ('created_at', 'updated_at')
     
     def get_queryset(self, request):
@@ -0,0 +1,215 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .caching import invalidate_project
+from .models import HOT_MODELS, ArchivedTask, ArchivedTaskComment, Project, Task, TaskComment
+
+# The tasks of a completed project are moved to the archive tables (see
+# models.ArchivedTask) once it has been left alone for a while, and can be
+# moved back. Rows keep their ids, so links to them stay valid, and the
+# project counters keep counting them: task_count and the organization's
+# stats don't change. Archived rows are read-only; the task field and the
+# task lists read them when asked to (includeArchived).
+
+DEFAULT_BATCH_SIZE = 1000
+# Completed projects not updated for this long are archived by archive_projects
+DEFAULT_ARCHIVE_AFTER = timedelta(days=90)
+
+# (task model, comment model) of each tier
+HOT = (Task, TaskComment)
+ARCHIVE = (ArchivedTask, ArchivedTaskComment)
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _copy(queryset, target):
+    """INSERT INTO target SELECT ... the queryset's rows, in the database"""
+    connection = connections[router.db_for_write(target)]
+    names = columns(target)
+    sql, params = queryset.order_by().values(*names).query.sql_with_params()
+    quoted = ', '.join(connection.ops.quote_name(name) for name in names)
+    table = connection.ops.quote_name(target._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({quoted}) {sql}", params)
+        return cursor.rowcount
+
+
+def _move_batch(project_id, source, target, batch_size):
+    """
+    Move up to batch_size of a project's tasks, with their comments, from
+    the source (task model, comment model) pair to the target pair, in one
+    transaction. Returns the number of tasks moved.
+    """
+    tasks, comments = source
+    # The project's shard (projects.sharding)
+    db = router.db_for_write(tasks)
+    with transaction.atomic(using=db):
+        # Locked on Postgres: a concurrent update or new comment waits, then
+        # finds the task gone; SQLite lets one connection write at a time
+        ids = list(
+            tasks.objects
+            .filter(project_id=project_id)
+            .order_by('pk')
+            .select_for_update()
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        _copy(tasks.objects.filter(pk__in=ids), target[0])
+        _copy(comments.objects.filter(task_id__in=ids), target[1])
+        # Raw deletes: no signals, so the counters keep including the tasks
+        comments.objects.filter(task_id__in=ids)._raw_delete(db)
+        tasks.objects.filter(pk__in=ids)._raw_delete(db)
+        invalidate_project(project_id)
+    return len(ids)
+
+
+def _move(project, source, target, batch_size, pause, progress):
+    moved = 0
+    while True:
+        count = _move_batch(project.pk, source, target, batch_size)
+        if not count:
+            return moved
+        moved += count
+        if progress is not None:
+            progress(project, moved)
+        if pause:
+            # Let other writers through between batches
+            time.sleep(pause)
+
+
+def archive_project(project, batch_size=DEFAULT_BATCH_SIZE, pause=0, progress=None):
+    """
+    Move a completed project's tasks and their comments to the archive
+    tables, batch_size tasks per transaction, sleeping `pause` seconds
+    between batches. `progress(project, moved)` is called after each one.
+    An interrupted run can simply be rerun. Returns the number of tasks moved.
+    """
+    if project.status != 'COMPLETED':
+        raise ValueError(f"Only completed projects can be archived, not {project.status}")
+    moved = _move(project, HOT, ARCHIVE, batch_size, pause, progress)
+    Project.objects.filter(pk=project.pk).update(archived_at=timezone.now())
+    return moved
+
+
+def restore_project(project, batch_size=DEFAULT_BATCH_SIZE, pause=0, progress=None):
+    """Move a project's archived tasks and comments back, as archive_project() moved them"""
+    moved = _move(project, ARCHIVE, HOT, batch_size, pause, progress)
+    Project.objects.filter(pk=project.pk).update(archived_at=None)
+    return moved
+
+
+def archivable_projects(completed_before):
+    """Completed projects last updated before `completed_before` that still have hot tasks"""
+    return Project.objects.filter(
+        Exists(Task.objects.filter(project=OuterRef('pk'))),
+        status='COMPLETED',
+        updated_at__lt=completed_before,
+    ).order_by('pk')
+
+
+def as_hot(row, _converted=None):
+    """
+    An archived row as a read-only instance of its hot model, marked
+    _archived. It has the columns loaded on the row, and the related rows
+    cached or prefetched on it (optimize()), converted too.
+    """
+    converted = {} if _converted is None else _converted
+    if id(row) in converted:
+        return converted[id(row)]  # a prefetched child's link back to its parent
+    model = HOT_MODELS[type(row)]
+    names = [name for name in columns(model) if name in row.__dict__]
+    instance = model.from_db(row._state.db, names, [row.__dict__[name] for name in names])
+    instance._archived = True
+    converted[id(row)] = instance
+
+    for field in type(row)._meta.concrete_fields:
+        if field.is_relation and field.is_cached(row):
+            related = field.get_cached_value(row)
+            if type(related) in HOT_MODELS:
+                related = as_hot(related, converted)
+            model._meta.get_field(field.name).set_cached_value(instance, related)
+    prefetched = getattr(row, '_prefetched_objects_cache', {})
+    if prefetched:
+        instance._prefetched_objects_cache = {
+            name: _prefetched(
+                HOT_MODELS[queryset.model], [as_hot(child, converted) for child in queryset]
+            )
+            for name, queryset in prefetched.items()
+        }
+    return instance
+
+
+def _prefetched(model, instances):
+    # What prefetch_related() leaves in _prefetched_objects_cache
+    queryset = model.objects.all()
+    queryset._result_cache = instances
+    queryset._prefetch_done = True
+    return queryset
+
+
+def unarchived_tasks(rows, with_comments=False):
+    """
+    ArchivedTask rows as Task instances (see as_hot()), with their archived
+    comments loaded in one query as if prefetched when with_comments is set.
+    """
+    tasks = [as_hot(row) for row in rows]
+    if with_comments and tasks:
+        by_task = defaultdict(list)
+        comments = ArchivedTaskComment.objects.filter(task_id__in=[task.pk for task in tasks])
+        for row in comments.order_by('created_at', 'id'):
+            by_task[row.task_id].append(as_hot(row))
+        for task in tasks:
+            for comment in by_task[task.pk]:
+                comment._state.fields_cache['task'] = task
+            task._prefetched_objects_cache = {
+                'comments': _prefetched(TaskComment, by_task[task.pk])
+            }
+    return tasks
+
+
+def unarchived_comments(rows):
+    """ArchivedTaskComment rows as TaskComment instances, their archived task attached"""
+    comments = []
+    tasks = {}
+    for row in rows:
+        comment = as_hot(row)
+        if row.task_id not in tasks:
+            tasks[row.task_id] = as_hot(row.task)
+        comment._state.fields_cache['task'] = tasks[row.task_id]
+        comments.append(comment)
+    return comments
+
+
+def table_sizes(models=(Task, TaskComment, ArchivedTask, ArchivedTaskComment)):
+    """
+    {table: (data bytes, index bytes)} of the models' tables: from
+    pg_table_size()/pg_indexes_size() on Postgres, SQLite's dbstat table
+    otherwise. Deleted rows leave free space behind until VACUUM.
+    """
+    tables = [model._meta.db_table for model in models]
+    connection = connections[router.db_for_read(models[0])]
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass)",
+                    [table, table],
+                )
+                sizes[table] = cursor.fetchone()
+            else:
+                cursor.execute(
+                    "SELECT COALESCE(SUM(CASE WHEN name = %s THEN pgsize END), 0), "
+                    "COALESCE(SUM(CASE WHEN name <> %s THEN pgsize END), 0) FROM dbstat "
+                    "WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table, table, table],
+                )
+                sizes[table] = cursor.fetchone()
+    return sizes
@@ -0,0 +1,179 @@
+import graphene
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Model, QuerySet
+from graphene.utils.str_converters import to_camel_case
+from graphql import GraphQLError
+from .models import Organization, Project, Task, TaskComment
+from .metrics import sql_accounting
+from .optimizer import prefetch_selected
+from .pubsub import comment_topic, decode, get_broker, project_topic, task_topic
+from .routing import pin_primary
+from .sharding import organization_id_for_slug
+from .schema import (
+    BulkCreateComments,
+    BulkCreateTasks,
+    BulkUpdateTasks,
+    CreateComment,
+    CreateProject,
+    CreateTask,
+    Mutation,
+    ProjectType,
+    Query,
+    TaskCommentType,
+    TaskType,
+    UpdateProject,
+    UpdateTask,
+)
+
+# The ORM is synchronous, so every root field runs its sync resolver in a
+# worker thread and hands back fully loaded objects. Nested fields then
+# resolve on the event loop from memory (the optimizer already fetched
+# what the selection reads), and independent root fields of one operation
+# run concurrently, each thread on its own database connection.
+
+
+async def run_in_thread(func, *args, **kwargs):
+    def call():
+        # The trace's SQL hook goes on this thread's connection
+        with sql_accounting():
+            return func(*args, **kwargs)
+
+    def run():
+        # What Django does around a request, per worker thread connection
+        close_old_connections()
+        try:
+            return call()
+        finally:
+            close_old_connections()
+
+    if settings.GRAPHQL_ASYNC_THREAD_SENSITIVE:
+        # One shared thread and connection (tests, or to debug without concurrency)
+        return await sync_to_async(call, thread_sensitive=True)()
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+def query_in_thread(resolver):
+    def load(root, info, **args):
+        result = resolver(root, info, **args)
+        if isinstance(result, QuerySet):
+            result = list(result)  # evaluate here, not on the event loop
+        return result
+
+    async def resolve(root, info, **args):
+        return await run_in_thread(load, root, info, **args)
+
+    return resolve
+
+
+def mutation_in_thread(mutation):
+    def write(root, info, **args):
+        pin_primary()
+        with transaction.atomic():
+            payload = mutation._meta.resolver(root, info, **args)
+
+        # Relations selected on the returned objects, loaded up front
+        for name in mutation._meta.fields:
+            value = getattr(payload, name, None)
+            if isinstance(value, Model):
+                prefetch_selected([value], info, path=(to_camel_case(name),))
+            elif isinstance(value, list) and value and isinstance(value[0], Model):
+                prefetch_selected(value, info, path=(to_camel_case(name),))
+        return payload
+
+    async def resolve(root, info, **args):
+        return await run_in_thread(write, root, info, **args)
+
+    return graphene.Field(
+        mutation._meta.output, args=mutation._meta.arguments, resolver=resolve
+    )
+
+
+class AsyncQuery(Query):
+    class Meta:
+        name = 'Query'
+
+    resolve_all_organizations = query_in_thread(Query.resolve_all_organizations)
+    resolve_organization = query_in_thread(Query.resolve_organization)
+    resolve_projects_by_organization = query_in_thread(Query.resolve_projects_by_organization)
+    resolve_project = query_in_thread(Query.resolve_project)
+    resolve_tasks_by_project = query_in_thread(Query.resolve_tasks_by_project)
+    resolve_task = query_in_thread(Query.resolve_task)
+    resolve_comments_by_task = query_in_thread(Query.resolve_comments_by_task)
+    resolve_search_tasks = query_in_thread(Query.resolve_search_tasks)
+    resolve_organization_stats = query_in_thread(Query.resolve_organization_stats)
+
+
+class AsyncMutation(Mutation):
+    class Meta:
+        name = 'Mutation'
+
+    create_project = mutation_in_thread(CreateProject)
+    update_project = mutation_in_thread(UpdateProject)
+    create_task = mutation_in_thread(CreateTask)
+    update_task = mutation_in_thread(UpdateTask)
+    create_comment = mutation_in_thread(CreateComment)
+    bulk_create_tasks = mutation_in_thread(BulkCreateTasks)
+    bulk_update_tasks = mutation_in_thread(BulkUpdateTasks)
+    bulk_create_comments = mutation_in_thread(BulkCreateComments)
+
+
+# Subscriptions: each one listens on the broker topic of what it watches
+# and yields the rows carried by the events, loading only the relations
+# its selection asks for.
+
+class TaskChange(graphene.ObjectType):
+    action = graphene.String()  # CREATED or UPDATED
+    changed_fields = graphene.List(graphene.String)  # None when created
+    task = graphene.Field(TaskType)
+
+
+class ProjectChange(graphene.ObjectType):
+    action = graphene.String()
+    changed_fields = graphene.List(graphene.String)
+    project = graphene.Field(ProjectType)
+
+
+async def listen(topic, model, info, path):
+    broker = get_broker()
+    if broker is None:
+        raise GraphQLError("Subscriptions are not enabled")
+    async for message in broker.subscribe(topic):
+        action, fields, obj = decode(model, message)
+        await run_in_thread(prefetch_selected, [obj], info, path=path)
+        changed = None if fields is None else [to_camel_case(name) for name in fields]
+        yield action, changed, obj
+
+
+class Subscription(graphene.ObjectType):
+    task_changed = graphene.Field(TaskChange, project_id=graphene.ID(required=True))
+    comment_added = graphene.Field(TaskCommentType, task_id=graphene.ID(required=True))
+    project_changed = graphene.Field(
+        ProjectChange, organization_slug=graphene.String(required=True)
+    )
+
+    async def subscribe_task_changed(root, info, project_id):
+        async for action, changed, task in listen(
+            task_topic(project_id), Task, info, ('task',)
+        ):
+            yield TaskChange(action=action, changed_fields=changed, task=task)
+
+    async def subscribe_comment_added(root, info, task_id):
+        async for _, _, comment in listen(comment_topic(task_id), TaskComment, info, ()):
+            yield comment
+
+    async def subscribe_project_changed(root, info, organization_slug):
+        organization_id = await run_in_thread(organization_id_for_slug, organization_slug)
+        if organization_id is None:
+            raise Organization.DoesNotExist("Organization matching query does not exist.")
+        async for action, changed, project in listen(
+            project_topic(organization_id), Project, info, ('project',)
+        ):
+            yield ProjectChange(action=action, changed_fields=changed, project=project)
+
+
+# Same types and fields as `schema`, executed with graphql-core's async executor
+async_schema = graphene.Schema(
+    query=AsyncQuery, mutation=AsyncMutation, subscription=Subscription
+)
@@ -0,0 +1,224 @@
+import statistics
+import time
+import tracemalloc
+from django.db import connection, transaction
+from django.db.models import Count, F
+from .explain import QUERIES
+from .models import Organization, Project, Task
+from .schema import schema
+from .seed import seed
+
+# One document per Mutation field. Each run is rolled back, so the dataset
+# stays the same from one iteration (and one benchmark run) to the next.
+MUTATIONS = {
+    'createProject': '''
+        mutation($slug: String!) {
+          createProject(organizationSlug: $slug, name: "Benchmark") { project { id } }
+        }
+    ''',
+    'updateProject': '''
+        mutation($projectId: ID!) {
+          updateProject(id: $projectId, status: "ON_HOLD") { project { id status } }
+        }
+    ''',
+    'createTask': '''
+        mutation($projectId: ID!) {
+          createTask(projectId: $projectId, title: "Benchmark") { task { id } }
+        }
+    ''',
+    'updateTask': '''
+        mutation($taskId: ID!) {
+          updateTask(id: $taskId, status: "DONE") { task { id status } }
+        }
+    ''',
+    'createComment': '''
+        mutation($taskId: ID!) {
+          createComment(taskId: $taskId, content: "Benchmark", authorEmail: "bench@example.com") {
+            comment { id }
+          }
+        }
+    ''',
+    'bulkCreateTasks': '''
+        mutation($tasks: [TaskInput!]!) {
+          bulkCreateTasks(tasks: $tasks) { tasks { id } errors { index message } }
+        }
+    ''',
+    'bulkUpdateTasks': '''
+        mutation($taskUpdates: [TaskUpdateInput!]!) {
+          bulkUpdateTasks(tasks: $taskUpdates) { tasks { id } errors { index message } }
+        }
+    ''',
+    'bulkCreateComments': '''
+        mutation($comments: [CommentInput!]!) {
+          bulkCreateComments(comments: $comments) { comments { id } errors { index message } }
+        }
+    ''',
+}
+
+# Items sent to each bulk mutation
+BULK_SIZE = 100
+
+# Latency percentiles reported, in milliseconds
+PERCENTILES = (50, 90, 95, 99)
+
+# Relative slowdown of the median below which a change is noise, and the
+# absolute ones under which small operations aren't flagged
+DEFAULT_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 0.5
+MIN_REGRESSION_KIB = 64
+
+
+def uncovered_fields():
+    """Query and Mutation fields no benchmark document exercises"""
+    graphql_schema = schema.graphql_schema
+    fields = {*graphql_schema.query_type.fields, *graphql_schema.mutation_type.fields}
+    return sorted(fields - set(QUERIES) - set(MUTATIONS))
+
+
+def seed_dataset(organizations, projects, tasks, comments, **options):
+    """Seed organizations × projects (each) × tasks (each project, on average)"""
+    return seed(
+        organizations,
+        organizations * projects,
+        organizations * projects * tasks,
+        comments=comments,
+        **options
+    )
+
+
+def sample_variables():
+    """Variables for every document, pointing into the middle of the dataset"""
+    organization = Organization.objects.order_by('pk')[
+        Organization.objects.count() // 2
+    ]
+    # Project sizes and comment threads are skewed: take the largest ones
+    project = (
+        Project.objects.filter(organization=organization)
+        .order_by(-(F('todo_count') + F('in_progress_count') + F('done_count')), 'pk')
+        .first()
+    )
+    task = (
+        Task.objects.filter(project=project)
+        .annotate(comment_count=Count('comments'))
+        .order_by('-comment_count', 'pk')
+        .first()
+    )
+    if task is None:
+        raise ValueError("No tasks found, seed the database first")
+    return {
+        'slug': organization.slug,
+        'projectId': project.pk,
+        'taskId': task.pk,
+        'query': task.title.split()[0],
+        'tasks': [
+            {'projectId': project.pk, 'title': f'Bulk {i}'} for i in range(BULK_SIZE)
+        ],
+        'taskUpdates': [
+            {'id': pk, 'status': 'IN_PROGRESS'}
+            for pk in Task.objects.filter(project=project)
+            .order_by('pk').values_list('pk', flat=True)[:BULK_SIZE]
+        ],
+        'comments': [
+            {'taskId': task.pk, 'content': f'Bulk {i}', 'authorEmail': 'bench@example.com'}
+            for i in range(BULK_SIZE)
+        ],
+    }
+
+
+def percentile(values, p):
+    """Linear-interpolated percentile of a sorted list"""
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def run_once(document, variables, rollback):
+    with transaction.atomic():
+        result = schema.execute(document, variable_values=variables)
+        if rollback:
+            transaction.set_rollback(True)
+    if result.errors:
+        raise result.errors[0]
+
+
+def benchmark(document, variables, iterations, warmup=3, rollback=False):
+    """Time `iterations` executions of one document"""
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    for _ in range(warmup):
+        run_once(document, variables, rollback)
+
+    timings = []
+    with connection.execute_wrapper(count):
+        for _ in range(iterations):
+            queries.append(0)
+            started = time.perf_counter()
+            run_once(document, variables, rollback)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    # A separate run: tracing allocations slows everything down
+    tracemalloc.start()
+    try:
+        run_once(document, variables, rollback)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        **{f'p{p}': round(percentile(timings, p), 3) for p in PERCENTILES},
+        'mean': round(statistics.fmean(timings), 3),
+        'max': round(timings[-1], 3),
+        'queries': max(queries),
+        'peakMemoryKiB': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(iterations, warmup=3, only=None, progress=None):
+    """Benchmark every Query and Mutation document; {field: results}"""
+    variables = sample_variables()
+    cases = [(name, document, False) for name, document in QUERIES.items()]
+    cases += [(name, document, True) for name, document in MUTATIONS.items()]
+
+    results = {}
+    for name, document, rollback in cases:
+        if only and name not in only:
+            continue
+        results[name] = benchmark(document, variables, iterations, warmup, rollback)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Return the regressions of `current` against `baseline` results, as
+    (field, metric, before, after): a median more than `threshold` slower
+    (and by at least MIN_REGRESSION_MS), more SQL queries, or a peak memory
+    more than `threshold` (and MIN_REGRESSION_KIB) higher.
+    """
+    regressions = []
+    for name, after in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if (
+            after['p50'] > before['p50'] * (1 + threshold)
+            and after['p50'] - before['p50'] >= MIN_REGRESSION_MS
+        ):
+            regressions.append((name, 'p50', before['p50'], after['p50']))
+        if after['queries'] > before['queries']:
+            regressions.append((name, 'queries', before['queries'], after['queries']))
+        if (
+            after['peakMemoryKiB'] > before['peakMemoryKiB'] * (1 + threshold)
+            and after['peakMemoryKiB'] - before['peakMemoryKiB'] >= MIN_REGRESSION_KIB
+        ):
+            regressions.append(
+                (name, 'peakMemoryKiB', before['peakMemoryKiB'], after['peakMemoryKiB'])
+            )
+    return regressions
@@ -0,0 +1,199 @@
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from graphql import GraphQLError
+from .caching import invalidate_organization
+from .counters import adjust_task_counters
+from .models import Project, Task, TaskComment
+from .pubsub import CREATED, UPDATED, publish_comment, publish_task
+
+# Upper bound on items per bulk mutation, keeps one request's cost bounded
+MAX_BULK_ITEMS = 500
+
+TASK_FIELDS = ('title', 'description', 'status', 'assignee_email', 'due_date')
+
+
+class BulkResult:
+    def __init__(self):
+        self.objects = []
+        self.errors = []  # (index, message)
+
+    def error(self, index, message):
+        self.errors.append((index, message))
+
+
+def _check_size(items):
+    if len(items) > MAX_BULK_ITEMS:
+        raise GraphQLError(f"At most {MAX_BULK_ITEMS} items per request")
+
+
+def _parse_ids(values):
+    """Map each raw ID to an int, or None when it isn't one"""
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            ids.append(None)
+    return ids
+
+
+def _validation_message(error):
+    if hasattr(error, 'message_dict'):
+        return "; ".join(
+            f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items()
+        )
+    return " ".join(error.messages)
+
+
+def _validate(obj, exclude):
+    # FKs are checked in bulk by the caller, not one query per row
+    obj.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+
+
+def bulk_create_tasks(items, all_or_nothing=False):
+    _check_size(items)
+    result = BulkResult()
+
+    project_ids = _parse_ids(item['project_id'] for item in items)
+    organizations = dict(
+        Project.objects.filter(pk__in={pk for pk in project_ids if pk})
+        .values_list('pk', 'organization_id')
+    )
+
+    tasks = []
+    for index, (item, project_id) in enumerate(zip(items, project_ids)):
+        if project_id not in organizations:
+            result.error(index, f"Project {item['project_id']} does not exist")
+            continue
+        task = Task(
+            project_id=project_id,
+            **{key: value for key, value in item.items() if key != 'project_id' and value is not None}
+        )
+        try:
+            _validate(task, exclude=['project'])
+        except ValidationError as e:
+            result.error(index, _validation_message(e))
+            continue
+        tasks.append(task)
+
+    if result.errors and all_or_nothing:
+        return result
+
+    with transaction.atomic():
+        result.objects = Task.objects.bulk_create(tasks)
+        adjust_task_counters((task.project_id, task.status, 1) for task in tasks)
+        for task in result.objects:
+            publish_task(task, CREATED)
+        for organization_id in {organizations[task.project_id] for task in tasks}:
+            invalidate_organization(organization_id)
+    return result
+
+
+def bulk_update_tasks(items, all_or_nothing=False):
+    _check_size(items)
+    result = BulkResult()
+
+    task_ids = _parse_ids(item['id'] for item in items)
+    with transaction.atomic():
+        existing = {
+            task.pk: task
+            for task in Task.objects
+            .filter(pk__in={pk for pk in task_ids if pk})
+            .annotate(organization_id=F('project__organization_id'))
+            .select_for_update(of=('self',))
+        }
+
+        counted = {pk: (task.project_id, task.status) for pk, task in existing.items()}
+        changed_fields = set()
+        changed_by_task = defaultdict(set)
+        tasks = {}
+        for index, (item, task_id) in enumerate(zip(items, task_ids)):
+            task = existing.get(task_id)
+            if task is None:
+                result.error(index, f"Task {item['id']} does not exist")
+                continue
+            updates = {
+                key: value for key, value in item.items()
+                if key in TASK_FIELDS and value is not None
+            }
+            previous = {key: getattr(task, key) for key in updates}
+            for key, value in updates.items():
+                setattr(task, key, value)
+            try:
+                _validate(task, exclude=['project'])
+            except ValidationError as e:
+                # Leave the row as it was for any later item on the same task
+                for key, value in previous.items():
+                    setattr(task, key, value)
+                result.error(index, _validation_message(e))
+                continue
+            changed_fields.update(updates)
+            changed_by_task[task.pk].update(updates)
+            tasks[task.pk] = task
+
+        if (result.errors and all_or_nothing) or not tasks:
+            return result
+
+        now = timezone.now()
+        for task in tasks.values():
+            task.updated_at = now
+        Task.objects.bulk_update(tasks.values(), [*changed_fields, 'updated_at'])
+
+        changes = []
+        for task in tasks.values():
+            old_project, old_status = counted[task.pk]
+            if old_status != task.status:
+                changes += [(old_project, old_status, -1), (task.project_id, task.status, 1)]
+            task._counted = (task.project_id, task.status)
+        adjust_task_counters(changes)
+
+        for task in tasks.values():
+            publish_task(task, UPDATED, sorted(changed_by_task[task.pk]))
+
+        for organization_id in {task.organization_id for task in tasks.values()}:
+            invalidate_organization(organization_id)
+
+    result.objects = list(tasks.values())
+    return result
+
+
+def bulk_create_comments(items, all_or_nothing=False):
+    _check_size(items)
+    result = BulkResult()
+
+    task_ids = _parse_ids(item['task_id'] for item in items)
+    organizations = dict(
+        Task.objects.filter(pk__in={pk for pk in task_ids if pk})
+        .values_list('pk', 'project__organization_id')
+    )
+
+    comments = []
+    for index, (item, task_id) in enumerate(zip(items, task_ids)):
+        if task_id not in organizations:
+            result.error(index, f"Task {item['task_id']} does not exist")
+            continue
+        comment = TaskComment(
+            task_id=task_id,
+            content=item['content'],
+            author_email=item['author_email'],
+        )
+        try:
+            _validate(comment, exclude=['task'])
+        except ValidationError as e:
+            result.error(index, _validation_message(e))
+            continue
+        comments.append(comment)
+
+    if result.errors and all_or_nothing:
+        return result
+
+    with transaction.atomic():
+        result.objects = TaskComment.objects.bulk_create(comments)
+        for comment in result.objects:
+            publish_comment(comment)
+        for organization_id in {organizations[c.task_id] for c in comments}:
+            invalidate_organization(organization_id)
+    return result
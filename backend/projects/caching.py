@@ -0,0 +1,304 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from graphql import OperationType
+from graphql.execution.values import get_argument_values
+from graphql.language import FragmentDefinitionNode
+from .models import Organization
+from .optimizer import collect_fields
+from .sharding import (
+    organization_id_for_project, organization_id_for_slug, organization_id_for_task,
+)
+
+
+class LRUCache:
+    """Thread-safe bounded LRU cache that counts its hits and misses"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Response cache backends
+#
+# Versions start from the current time rather than 0, so a version that
+# was lost (evicted, process restart) can never match old entries again.
+
+class LocalCacheBackend:
+    """In-process LRU. Only correct when a single process serves requests."""
+
+    def __init__(self, maxsize):
+        self.entries = LRUCache(maxsize)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, timeout):
+        self.entries.set(key, value)
+
+    def get_version(self, scope):
+        with self._lock:
+            return self._versions.setdefault(scope, time.time_ns())
+
+    def bump_version(self, scope):
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, time.time_ns()) + 1
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class DjangoCacheBackend:
+    """Any Django cache alias; use a shared one (Redis, Memcached) for many workers"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def get_version(self, scope):
+        key = f'gql:version:{scope}'
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key)
+        return version
+
+    def bump_version(self, scope):
+        key = f'gql:version:{scope}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Scope that every key depends on: the set of organizations itself
+GLOBAL = 'global'
+# Scope of the operations that read every organization: any write bumps it
+EVERY = 'every'
+
+
+class ResponseCache:
+    """
+    Caches the data of read-only operations.
+
+    Keys combine the query hash, operation name, variables and the version
+    of every organization the operation reads. Writes bump the versions
+    of the organizations they touch, so stale entries are never found.
+    """
+
+    def __init__(self, backend, timeout):
+        self.backend = backend
+        self.timeout = timeout
+
+        # Root field -> (resolver argument, lookup returning the organization
+        # id); no lookup for those reading every organization
+        self.scopes = {
+            'allOrganizations': (None, None),
+            'organization': ('slug', self.organization_for_slug),
+            'projectsByOrganization': ('organization_slug', self.organization_for_slug),
+            'project': ('id', self.organization_for_project),
+            'tasksByProject': ('project_id', self.organization_for_project),
+            'task': ('id', self.organization_for_task),
+            'commentsByTask': ('task_id', self.organization_for_task),
+            'searchTasks': ('organization_slug', self.organization_for_slug),
+            'organizationStats': ('slug', self.organization_for_slug),
+        }
+
+    def _lookup(self, kind, value, find):
+        # Versioned by GLOBAL so admin moves/deletes drop every mapping
+        key = f'gql:org:{self.backend.get_version(GLOBAL)}:{kind}:{value}'
+        organization_id = self.backend.get(key)
+        if organization_id is None:
+            # On whichever shard the row is (projects.sharding)
+            organization_id = find(value)
+            if organization_id is None:
+                # Unknown row: the global scope covers it being created
+                return GLOBAL
+            self.backend.set(key, organization_id, None)
+        return organization_id
+
+    def organization_for_slug(self, slug):
+        return self._lookup('slug', slug, organization_id_for_slug)
+
+    def organization_for_project(self, project_id):
+        return self._lookup('project', project_id, organization_id_for_project)
+
+    def organization_for_task(self, task_id):
+        # Archived tasks too (includeArchived), which keep their project
+        return self._lookup('task', task_id, organization_id_for_task)
+
+    def operation_scopes(self, schema, document, operation, variables):
+        """Organizations an operation reads, or None if it can't be cached"""
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        query_type = schema.query_type
+        scopes = {GLOBAL}
+        for node in collect_fields(operation.selection_set.selections, fragments):
+            name = node.name.value
+            if name == '__typename':
+                continue
+            if name not in self.scopes:
+                return None  # unknown field, don't guess what it reads
+            argument, lookup = self.scopes[name]
+            if lookup is None:
+                scopes.add(EVERY)
+            else:
+                args = get_argument_values(query_type.fields[name], node, variables)
+                scopes.add(lookup(args[argument]))
+        return scopes
+
+    def key(self, query_key, operation_name, variables, scopes):
+        versions = sorted(
+            (str(scope), self.backend.get_version(scope)) for scope in scopes
+        )
+        raw = json.dumps(
+            [query_key, operation_name, variables, versions],
+            sort_keys=True,
+            default=str,
+        )
+        return 'gql:response:' + hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_key(self, schema, document, operation, query_key, operation_name, variables):
+        """Cache key for a request, or None when it must not be cached"""
+        if operation is None or operation.operation != OperationType.QUERY:
+            return None
+        scopes = self.operation_scopes(schema, document, operation, variables or {})
+        if scopes is None:
+            return None
+        return self.key(query_key, operation_name, variables, scopes)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, data):
+        self.backend.set(key, data, self.timeout)
+
+
+_response_cache = None
+_response_cache_config = None
+
+
+def get_response_cache():
+    """The configured ResponseCache, or None when caching is off"""
+    global _response_cache, _response_cache_config
+
+    config = (
+        settings.GRAPHQL_RESPONSE_CACHE,
+        settings.GRAPHQL_RESPONSE_CACHE_ALIAS,
+        settings.GRAPHQL_RESPONSE_CACHE_SIZE,
+        settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT,
+    )
+    if config != _response_cache_config:
+        kind, alias, size, timeout = config
+        if kind == 'local':
+            _response_cache = ResponseCache(LocalCacheBackend(size), timeout)
+        elif kind == 'django':
+            _response_cache = ResponseCache(DjangoCacheBackend(alias), timeout)
+        elif not kind:
+            _response_cache = None
+        else:
+            raise ValueError(f"Unknown GRAPHQL_RESPONSE_CACHE backend: {kind}")
+        _response_cache_config = config
+    return _response_cache
+
+
+def _bump_on_commit(scope):
+    def bump():
+        cache = get_response_cache()
+        if cache is not None:
+            cache.backend.bump_version(scope)
+            if scope != GLOBAL:
+                cache.backend.bump_version(EVERY)
+
+    # Once the shard the write went to commits
+    transaction.on_commit(bump, using=router.db_for_write(Organization))
+
+
+def invalidate_organization(organization_id):
+    """Expire cached reads of an organization once the transaction commits"""
+    if get_response_cache() is not None:
+        _bump_on_commit(organization_id)
+
+
+def invalidate_project(project_id):
+    cache = get_response_cache()
+    if cache is not None:
+        _bump_on_commit(cache.organization_for_project(project_id))
+
+
+def invalidate_task(task_id):
+    cache = get_response_cache()
+    if cache is not None:
+        _bump_on_commit(cache.organization_for_task(task_id))
+
+
+def invalidate_all():
+    """Expire every cached read (organizations added/removed, rows moved)"""
+    if get_response_cache() is not None:
+        _bump_on_commit(GLOBAL)
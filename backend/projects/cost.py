@@ -0,0 +1,171 @@
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLObjectType,
+    OperationDefinitionNode,
+    ValidationRule,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+)
+from graphql.language import FragmentDefinitionNode
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# Cost of resolving a field once, keyed 'Type.field'. Fields returning
+# objects or lists cost 1 unless listed here; scalar fields are free.
+FIELD_WEIGHTS = {
+    # Answered from the counters stored on the project
+    'ProjectType.taskCount': 0,
+    'ProjectType.completedTasks': 0,
+    # Ranks every match in the organization before returning a page
+    'Query.searchTasks': 10,
+}
+
+
+class OperationCost:
+    """Static cost and depth of one operation, before it runs"""
+
+    def __init__(self, schema, fragments):
+        self.schema = schema
+        self.fragments = fragments
+
+    def measure(self, operation):
+        """Return (cost, depth) for an OperationDefinitionNode"""
+        root = self.schema.get_root_type(operation.operation)
+        if root is None:
+            return 0, 0
+        return self._selection_set(root, operation.selection_set, 1, None, set())
+
+    def _selection_set(self, parent_type, selection_set, multiplier, page_size, visiting):
+        cost = 0
+        depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self._field(
+                    parent_type, selection, multiplier, page_size, visiting
+                )
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.fragments.get(name)
+                    if fragment is None or name in visiting:
+                        continue  # unknown or cyclic, other rules report it
+                    inside = visiting | {name}
+                else:
+                    fragment = selection
+                    inside = visiting
+                type_condition = fragment.type_condition
+                fragment_type = (
+                    self.schema.get_type(type_condition.name.value)
+                    if type_condition else parent_type
+                )
+                if not isinstance(fragment_type, GraphQLObjectType):
+                    continue
+                field_cost, field_depth = self._selection_set(
+                    fragment_type, fragment.selection_set, multiplier, page_size, inside
+                )
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def _field(self, parent_type, node, multiplier, page_size, visiting):
+        name = node.name.value
+        field = parent_type.fields.get(name)
+        if field is None:
+            return 0, 0  # __typename, or unknown (reported by other rules)
+
+        field_type = get_nullable_type(field.type)
+        named_type = get_named_type(field_type)
+        key = f'{parent_type.name}.{name}'
+        weight = FIELD_WEIGHTS.get(key, 0 if is_leaf_type(named_type) else 1)
+        cost = weight * multiplier
+
+        if node.selection_set is None or not isinstance(named_type, GraphQLObjectType):
+            return cost, 1
+
+        # A paginated field's `first` sizes the list below it (its edges)
+        first = self._first(field, node)
+        if isinstance(field_type, GraphQLList):
+            size = page_size or settings.GRAPHQL_DEFAULT_LIST_SIZE
+            multiplier *= size
+            page_size = None
+        elif first is not None:
+            page_size = first
+
+        child_cost, child_depth = self._selection_set(
+            named_type, node.selection_set, multiplier, page_size, visiting
+        )
+        return cost + child_cost, child_depth + 1
+
+    def _first(self, field, node):
+        if 'first' not in field.args:
+            return None
+        for argument in node.arguments or ():
+            if argument.name.value == 'first':
+                if isinstance(argument.value, VariableNode):
+                    return MAX_PAGE_SIZE  # not known yet, assume the worst
+                try:
+                    return min(int(argument.value.value), MAX_PAGE_SIZE)
+                except (AttributeError, TypeError, ValueError):
+                    return MAX_PAGE_SIZE  # invalid, reported by other rules
+        return DEFAULT_PAGE_SIZE
+
+
+def fragments_of(document):
+    return {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+
+def operation_costs(schema, document):
+    """{operation name or None: {'cost': n, 'depth': n}} for a valid document"""
+    measure = OperationCost(schema, fragments_of(document)).measure
+    costs = {}
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode):
+            cost, depth = measure(definition)
+            name = definition.name.value if definition.name else None
+            costs[name] = {'cost': cost, 'depth': depth}
+    return costs
+
+
+class QueryCostRule(ValidationRule):
+    """
+    Reject operations deeper than GRAPHQL_MAX_QUERY_DEPTH or costlier than
+    GRAPHQL_MAX_QUERY_COST (0 turns either check off).
+
+    Cost is the number of object fields resolved: each field's weight times
+    how many times it runs, where lists multiply their children by their
+    `first` argument (capped at the maximum page size) or, when unpaginated,
+    by GRAPHQL_DEFAULT_LIST_SIZE.
+    """
+
+    def enter_document(self, node, *_):
+        context = self.context
+        measure = OperationCost(context.schema, fragments_of(node)).measure
+        max_depth = settings.GRAPHQL_MAX_QUERY_DEPTH
+        max_cost = settings.GRAPHQL_MAX_QUERY_COST
+
+        for definition in node.definitions:
+            if not isinstance(definition, OperationDefinitionNode):
+                continue
+            cost, depth = measure(definition)
+            if max_depth and depth > max_depth:
+                context.report_error(GraphQLError(
+                    f"Query depth {depth} exceeds the maximum of {max_depth}",
+                    definition,
+                    extensions={'code': 'QUERY_TOO_DEEP', 'depth': depth, 'maxDepth': max_depth},
+                ))
+            if max_cost and cost > max_cost:
+                context.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {max_cost}",
+                    definition,
+                    extensions={'code': 'QUERY_TOO_COSTLY', 'cost': cost, 'maxCost': max_cost},
+                ))
+        return self.SKIP
@@ -0,0 +1,329 @@
+from collections import defaultdict
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.lookups import Exact
+from django.utils import timezone
+from .models import ArchivedTask, Organization, OrganizationStats, Project, Task
+
+# Task status -> Project counter column
+COUNTER_FIELDS = {
+    'TODO': 'todo_count',
+    'IN_PROGRESS': 'in_progress_count',
+    'DONE': 'done_count',
+}
+
+# Project status -> OrganizationStats counter column
+PROJECT_COUNTER_FIELDS = {
+    'ACTIVE': 'active_projects',
+    'COMPLETED': 'completed_projects',
+    'ON_HOLD': 'on_hold_projects',
+}
+
+
+def adjust_task_counters(changes):
+    """
+    Apply (project_id, status, delta) changes to the stored counters.
+
+    Deltas are summed first, and projects whose deltas come out the same
+    share one UPDATE using F() expressions (safe against concurrent
+    writers), so a large batch spread over many projects doesn't cost
+    a query per project. Each such UPDATE is followed by one of their
+    organizations' OrganizationStats. Returns the number of project rows
+    updated.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for project_id, status, delta in changes:
+        field = COUNTER_FIELDS.get(status)
+        if project_id is None or field is None:
+            continue
+        deltas[project_id][field] += delta
+
+    groups = defaultdict(list)
+    for project_id, fields in deltas.items():
+        key = tuple(sorted((field, delta) for field, delta in fields.items() if delta))
+        if key:
+            groups[key].append(project_id)
+
+    updated = 0
+    for key, project_ids in groups.items():
+        updates = {field: F(field) + delta for field, delta in key}
+        if len(project_ids) == 1:
+            projects = Project.objects.filter(pk=project_ids[0])
+            updated += projects.update(**updates)
+            organization_updates = updates
+        else:
+            projects = Project.objects.filter(pk__in=project_ids)
+            updated += projects.update(**updates)
+            # An organization gets the deltas once per project of the group it owns
+            owned = Subquery(
+                projects.filter(organization_id=OuterRef('organization_id'))
+                .order_by().values('organization_id').annotate(n=Count('pk')).values('n'),
+                output_field=IntegerField(),
+            )
+            organization_updates = {field: F(field) + delta * owned for field, delta in key}
+        OrganizationStats.objects.filter(
+            organization_id__in=projects.values('organization_id')
+        ).update(**organization_updates)
+    return updated
+
+
+def move_task_counters(task_id, status):
+    """
+    Shift counters for a task about to change to `status`, in one UPDATE
+    of its project and one of its organization's stats.
+
+    The task's current project and status are read by subqueries inside
+    the statements, so callers don't have to load the task first. Run it
+    before the task row itself is updated.
+    """
+    current = Task.objects.filter(pk=task_id).order_by()
+    current_status = Subquery(current.values('status')[:1])
+    updates = {}
+    for counted_status, field in COUNTER_FIELDS.items():
+        delta = Case(When(Exact(current_status, counted_status), then=Value(-1)), default=Value(0))
+        if counted_status == status:
+            delta = delta + 1
+        updates[field] = F(field) + delta
+    project = Project.objects.filter(pk=Subquery(current.values('project_id')[:1]))
+    OrganizationStats.objects.filter(
+        organization_id=Subquery(project.values('organization_id')[:1])
+    ).update(**updates)
+    return project.update(**updates)
+
+
+def adjust_organization_stats(changes):
+    """
+    Apply (organization_id, field, delta) changes to OrganizationStats,
+    one UPDATE per organization. Returns the number of rows updated.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for organization_id, field, delta in changes:
+        if organization_id is not None and field is not None:
+            deltas[organization_id][field] += delta
+
+    updated = 0
+    for organization_id, fields in deltas.items():
+        updates = {field: F(field) + delta for field, delta in fields.items() if delta}
+        if updates:
+            updated += OrganizationStats.objects.filter(pk=organization_id).update(**updates)
+    return updated
+
+
+def adjust_project_counters(changes):
+    """Apply (organization_id, project status, delta) changes to the project counts"""
+    return adjust_organization_stats(
+        (organization_id, PROJECT_COUNTER_FIELDS.get(status), delta)
+        for organization_id, status, delta in changes
+    )
+
+
+def move_project_counters(project_id, status):
+    """
+    The project version of move_task_counters(): shift its organization's
+    project counts for a project about to change to `status`, in one UPDATE.
+    """
+    current = Project.objects.filter(pk=project_id).order_by()
+    current_status = Subquery(current.values('status')[:1])
+    updates = {}
+    for counted_status, field in PROJECT_COUNTER_FIELDS.items():
+        delta = Case(When(Exact(current_status, counted_status), then=Value(-1)), default=Value(0))
+        if counted_status == status:
+            delta = delta + 1
+        updates[field] = F(field) + delta
+    return (
+        OrganizationStats.objects
+        .filter(organization_id=Subquery(current.values('organization_id')[:1]))
+        .update(**updates)
+    )
+
+
+def set_task_status(tasks, status):
+    """
+    Move every task of the queryset to `status` in one UPDATE, however many
+    there are, and the project counters with them (grouped as in
+    adjust_task_counters()). Returns the number of tasks changed.
+
+    On Postgres the UPDATE locks the rows and reports their old project and
+    status itself, so concurrent writes can't make the counters drift.
+    Elsewhere they are counted first in the same transaction; SQLite lets
+    one connection write at a time.
+    """
+    if status not in COUNTER_FIELDS:
+        raise ValueError(f"status must be one of {', '.join(COUNTER_FIELDS)}")
+    tasks = tasks.exclude(status=status).order_by()
+    now = timezone.now()
+
+    # The database of the tasks' shard (projects.sharding)
+    db = router.db_for_write(Task)
+    with transaction.atomic(using=db):
+        if connections[db].vendor == 'postgresql':
+            sql, params = tasks.values('pk').query.sql_with_params()
+            with connections[db].cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    WITH old AS (
+                        SELECT id, project_id, status FROM projects_task
+                        WHERE id IN ({sql}) FOR UPDATE
+                    ), moved AS (
+                        UPDATE projects_task t SET status = %s, updated_at = %s
+                        FROM old WHERE t.id = old.id AND old.status <> %s
+                        RETURNING old.project_id, old.status
+                    )
+                    SELECT project_id, status, COUNT(*) FROM moved GROUP BY project_id, status
+                    """,
+                    [*params, status, now, status],
+                )
+                moved = cursor.fetchall()
+        else:
+            moved = list(
+                tasks.values('project_id', 'status')
+                .annotate(count=Count('pk'))
+                .values_list('project_id', 'status', 'count')
+            )
+            tasks.update(status=status, updated_at=now)
+
+        changes = []
+        for project_id, old_status, count in moved:
+            changes += [(project_id, old_status, -count), (project_id, status, count)]
+        adjust_task_counters(changes)
+    return sum(count for _, _, count in moved)
+
+
+def count_tasks(project_ids):
+    """
+    Recount tasks per status for the given projects, archived ones included
+    (see projects.archive), in one grouped query per table
+    """
+    counts = {
+        project_id: {field: 0 for field in COUNTER_FIELDS.values()}
+        for project_id in project_ids
+    }
+    for model in (Task, ArchivedTask):
+        rows = (
+            model.objects
+            .filter(project_id__in=project_ids)
+            .order_by()
+            .values('project_id')
+            .annotate(**{
+                field: Count('id', filter=Q(status=status))
+                for status, field in COUNTER_FIELDS.items()
+            })
+        )
+        for row in rows:
+            totals = counts[row.pop('project_id')]
+            for field, count in row.items():
+                totals[field] += count
+    return counts
+
+
+def reconcile_task_counters(batch_size=1000, fix=True):
+    """
+    Recompute every project's counters and return the drift found.
+
+    Projects are processed in primary key batches; each batch is locked
+    while it is recounted so concurrent task writes can't slip in between.
+    Returns a list of (project_id, field, stored, actual).
+    """
+    drift = []
+    last_pk = 0
+    while True:
+        # On the current shard (projects.sharding)
+        with transaction.atomic(using=router.db_for_write(Project)):
+            projects = list(
+                Project.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .select_for_update()
+                .only('pk', *COUNTER_FIELDS.values())[:batch_size]
+            )
+            if not projects:
+                break
+            last_pk = projects[-1].pk
+
+            counts = count_tasks([p.pk for p in projects])
+            changed = []
+            for project in projects:
+                drifted = False
+                for field, value in counts[project.pk].items():
+                    stored = getattr(project, field)
+                    if stored != value:
+                        drift.append((project.pk, field, stored, value))
+                        setattr(project, field, value)
+                        drifted = True
+                if drifted:
+                    changed.append(project)
+
+            if fix and changed:
+                Project.objects.bulk_update(changed, list(COUNTER_FIELDS.values()))
+    return drift
+
+
+def count_organization_stats(organization_ids=None):
+    """
+    What each organization's OrganizationStats should hold: project counts
+    from one GROUP BY over the projects, task counts from one over each
+    task table. Organizations without projects get zeros.
+    """
+    projects = Project.objects.order_by().values('organization_id').annotate(**{
+        # Annotations can't reuse the stats' column names
+        f'total_{field}': Count('pk', filter=Q(status=status))
+        for status, field in PROJECT_COUNTER_FIELDS.items()
+    })
+    # Archived tasks (projects.archive) count too
+    tasks = [
+        model.objects.order_by().values('project__organization_id').annotate(**{
+            f'total_{field}': Count('pk', filter=Q(status=status))
+            for status, field in COUNTER_FIELDS.items()
+        })
+        for model in (Task, ArchivedTask)
+    ]
+    organizations = Organization.objects.all()
+    if organization_ids is not None:
+        projects = projects.filter(organization_id__in=organization_ids)
+        tasks = [rows.filter(project__organization_id__in=organization_ids) for rows in tasks]
+        organizations = organizations.filter(pk__in=organization_ids)
+
+    fields = [*PROJECT_COUNTER_FIELDS.values(), *COUNTER_FIELDS.values()]
+    counts = {pk: dict.fromkeys(fields, 0) for pk in organizations.values_list('pk', flat=True)}
+    for row in projects:
+        counts[row['organization_id']].update(
+            (field, row[f'total_{field}']) for field in PROJECT_COUNTER_FIELDS.values()
+        )
+    for rows in tasks:
+        for row in rows:
+            totals = counts[row['project__organization_id']]
+            for field in COUNTER_FIELDS.values():
+                totals[field] += row[f'total_{field}']
+    return counts
+
+
+def reconcile_organization_stats(fix=True):
+    """
+    Recount every organization's stats, creating any missing row, and
+    return the drift as (organization_id, field, stored, actual). All rows
+    are locked while counting, so concurrent writes wait.
+    """
+    fields = [*PROJECT_COUNTER_FIELDS.values(), *COUNTER_FIELDS.values()]
+    drift = []
+    with transaction.atomic(using=router.db_for_write(OrganizationStats)):
+        stored = {stats.pk: stats for stats in OrganizationStats.objects.select_for_update()}
+        missing = []
+        changed = []
+        for organization_id, counts in count_organization_stats().items():
+            stats = stored.get(organization_id)
+            if stats is None:
+                stats = OrganizationStats(organization_id=organization_id)
+                missing.append(stats)
+            drifted = False
+            for field, value in counts.items():
+                if getattr(stats, field) != value:
+                    drift.append((organization_id, field, getattr(stats, field), value))
+                    setattr(stats, field, value)
+                    drifted = True
+            if drifted and organization_id in stored:
+                changed.append(stats)
+
+        if fix:
+            OrganizationStats.objects.bulk_create(missing)
+            OrganizationStats.objects.bulk_update(changed, fields, batch_size=1000)
+    return drift
@@ -0,0 +1,91 @@
+import json
+from django.db import connection
+
+# Counts up to this many rows are exact; past it they come from estimates
+EXACT_COUNT_LIMIT = 10000
+
+# How an estimated_count() was arrived at
+EXACT = 'exact'
+ESTIMATE = 'estimate'
+LOWER_BOUND = 'lower bound'
+
+
+def capped_count(queryset, limit=EXACT_COUNT_LIMIT):
+    """
+    COUNT(*) that stops after `limit` rows (SELECT COUNT(*) FROM (... LIMIT
+    n)), so its cost doesn't grow with the table.
+    """
+    return queryset.order_by()[:limit].count()
+
+
+def table_estimate(model):
+    """
+    Rows in the model's table as of the last statistics, without reading it:
+    pg_class.reltuples on Postgres; on SQLite, sqlite_stat1 once ANALYZE has
+    run, else the span of its ids (two index lookups). None when unknown.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table]
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first vacuumed or analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                # stat starts with the table's row count, for every index
+                cursor.execute(
+                    "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s",
+                    [table],
+                )
+                (rows,) = cursor.fetchone()
+                if rows is not None:
+                    return rows
+            pk = connection.ops.quote_name(model._meta.pk.column)
+            table = connection.ops.quote_name(table)
+            # Separate subqueries: SQLite only reads MIN() or MAX() alone off the index
+            cursor.execute(
+                f"SELECT (SELECT MAX({pk}) FROM {table}) - (SELECT MIN({pk}) FROM {table}) + 1"
+            )
+            return cursor.fetchone()[0]
+    return None
+
+
+def planner_estimate(queryset):
+    """
+    The number of rows the database expects the queryset to return, or None
+    where it can't say: the plan's estimate on Postgres (EXPLAIN, without
+    running the query); only unfiltered querysets elsewhere.
+    """
+    queryset = queryset.order_by()
+    if not queryset.query.where:
+        return table_estimate(queryset.model)
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset, limit=EXACT_COUNT_LIMIT):
+    """
+    (count, how) for the queryset, in bounded time: EXACT below `limit`;
+    above it the planner's ESTIMATE or, lacking one, `limit` itself as a
+    LOWER_BOUND.
+    """
+    count = capped_count(queryset, limit)
+    if count < limit:
+        return count, EXACT
+    estimate = planner_estimate(queryset)
+    if estimate is None:
+        return limit, LOWER_BOUND
+    return max(estimate, limit), ESTIMATE
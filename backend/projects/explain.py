@@ -0,0 +1,144 @@
+import re
+from django.db import connection, transaction
+from .models import Task
+from .schema import schema
+
+# One document per Query field, selecting what the frontend selects
+QUERIES = {
+    'allOrganizations': '''
+        query { allOrganizations(first: 20) { edges { node { id name slug } } } }
+    ''',
+    'organization': '''
+        query($slug: String!) { organization(slug: $slug) { id name } }
+    ''',
+    'projectsByOrganization': '''
+        query($slug: String!) {
+          projectsByOrganization(organizationSlug: $slug) {
+            id name status taskCount completedTasks
+          }
+        }
+    ''',
+    'project': '''
+        query($projectId: ID!) {
+          project(id: $projectId) { id name organization { id name } }
+        }
+    ''',
+    'tasksByProject': '''
+        query($projectId: ID!) {
+          tasksByProject(projectId: $projectId, first: 50) {
+            edges { node { id title status } }
+          }
+        }
+    ''',
+    'task': '''
+        query($taskId: ID!) { task(id: $taskId) { id title comments { id } } }
+    ''',
+    'commentsByTask': '''
+        query($taskId: ID!) {
+          commentsByTask(taskId: $taskId, first: 50) {
+            edges { node { id content } }
+          }
+        }
+    ''',
+    'organizationStats': '''
+        query($slug: String!) {
+          organizationStats(slug: $slug) {
+            projectsByStatus { active completed onHold total }
+            tasksByStatus { todo inProgress done total }
+            overdueTasks
+            projectProgress { id name taskCount completedTasks progress }
+          }
+        }
+    ''',
+    'searchTasks': '''
+        query($slug: String!, $query: String!) {
+          searchTasks(organizationSlug: $slug, query: $query, first: 20) {
+            edges { rank node { id title status } }
+          }
+        }
+    ''',
+}
+
+
+def sample_variables():
+    """Variables pointing at existing rows, so every resolver finds data"""
+    task = Task.objects.select_related('project__organization').first()
+    if task is None:
+        raise ValueError("No tasks found, seed the database first")
+    return {
+        'slug': task.project.organization.slug,
+        'projectId': task.project_id,
+        'taskId': task.pk,
+        'query': task.title.split()[0],
+    }
+
+
+def explain(sql, params):
+    """Return the query plan lines for one statement"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def is_full_scan(line, subqueries=()):
+    if connection.vendor == 'sqlite':
+        # "SCAN t USING INDEX i" walks an index in order (bounded by LIMIT);
+        # a bare "SCAN t" reads the whole table
+        line = line.strip()
+        if not line.startswith('SCAN') or 'USING' in line:
+            return False
+        # Full-text MATCH lookups show as "VIRTUAL TABLE INDEX 0:M1" (an
+        # empty index string is a full scan), and rows of a subquery
+        # computed just before are read as "SCAN <subquery>"
+        if re.search(r'VIRTUAL TABLE INDEX \d+:\S', line):
+            return False
+        return line.split()[1] not in subqueries
+    return 'Seq Scan' in line
+
+
+def full_scans(plan):
+    subqueries = {
+        line.split()[1] for line in plan
+        if line.strip().startswith(('CO-ROUTINE', 'MATERIALIZE'))
+    }
+    return [line for line in plan if is_full_scan(line, subqueries)]
+
+
+def explain_queries(variables=None):
+    """
+    Run every Query field and EXPLAIN each SELECT it issued.
+
+    Returns a list of (field, sql, plan_lines, full_scan_lines). On
+    Postgres sequential scans are disabled while planning, so a Seq Scan
+    in the plan means no usable index exists, not that the table is small.
+    """
+    if variables is None:
+        variables = sample_variables()
+
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    report = []
+    for field, document in QUERIES.items():
+        statements.clear()
+        with connection.execute_wrapper(capture):
+            result = schema.execute(document, variable_values=variables)
+        if result.errors:
+            raise result.errors[0]
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for sql, params in list(statements):
+                plan = explain(sql, params)
+                scans = full_scans(plan)
+                report.append((field, sql, plan, scans))
+    return report
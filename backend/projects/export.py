@@ -0,0 +1,157 @@
+import csv
+import datetime
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import ArchivedTask, ArchivedTaskComment, Project, Task, TaskComment
+
+FORMATS = ('ndjson', 'csv')
+# What an export can contain; NDJSON can mix them all in one stream
+RESOURCES = {
+    'projects': Project,
+    'tasks': Task,
+    'comments': TaskComment,
+}
+DEFAULT_CHUNK_SIZE = 2000
+# Output is sent in pieces of about this many bytes, not a write per row
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_updated_since(value):
+    """An ISO date or datetime (naive ones are in the current timezone), or None"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"updatedSince must be an ISO date or datetime, not {value!r}")
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def queryset(resource, organization, updated_since=None, archived=False):
+    """The resource's rows, or with `archived` those in the archive tables (projects.archive)"""
+    # Routed like the organization's own relations: to its shard
+    hints = {'instance': organization}
+    if resource == 'projects':
+        rows = Project.objects.db_manager(hints=hints).filter(organization=organization)
+    elif resource == 'tasks':
+        model = ArchivedTask if archived else Task
+        rows = model.objects.db_manager(hints=hints).filter(project__organization=organization)
+    else:
+        model = ArchivedTaskComment if archived else TaskComment
+        rows = model.objects.db_manager(hints=hints).filter(task__project__organization=organization)
+    if updated_since is not None:
+        rows = rows.filter(updated_at__gte=updated_since)
+    return rows.order_by('pk')
+
+
+def columns(resource):
+    return [field.attname for field in RESOURCES[resource]._meta.concrete_fields]
+
+
+def rows(resource, organization, updated_since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield one tuple per row, in primary key order, without loading them all:
+    iterator() streams them from a server-side cursor on Postgres (chunked
+    fetches elsewhere) and skips building model instances. Archived tasks
+    and comments follow the others, with the same columns.
+    """
+    names = columns(resource)
+    yield from queryset(resource, organization, updated_since).values_list(
+        *names
+    ).iterator(chunk_size=chunk_size)
+    if resource != 'projects':
+        yield from queryset(resource, organization, updated_since, archived=True).values_list(
+            *names
+        ).iterator(chunk_size=chunk_size)
+
+
+def ndjson_lines(organization, resources, updated_since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for resource in resources:
+        names = columns(resource)
+        kind = resource[:-1]  # projects -> project
+        for row in rows(resource, organization, updated_since, chunk_size):
+            record = {'type': kind, **dict(zip(names, row))}
+            yield encoder.encode(record) + '\n'
+
+
+class _Line:
+    """File-like object handing csv.writer's output back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(organization, resource, updated_since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns(resource))
+    for row in rows(resource, organization, updated_since, chunk_size):
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Join text lines into UTF-8 chunks of about `size` bytes"""
+    pending = []
+    length = 0
+    for line in lines:
+        pending.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(pending).encode()
+            pending.clear()
+            length = 0
+    if pending:
+        yield ''.join(pending).encode()
+
+
+def gzipped(chunks):
+    """Compress a stream of bytes into a gzip stream, chunk by chunk"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(organization, format='ndjson', resource=None, updated_since=None,
+           gzip=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream an organization's data as bytes.
+
+    NDJSON exports every resource (or just `resource`), one JSON object
+    per line with a "type"; CSV exports one resource, with a header row.
+    Memory use doesn't depend on the number of rows.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if resource is not None and resource not in RESOURCES:
+        raise ValueError(f"resource must be one of {', '.join(RESOURCES)}")
+
+    if format == 'csv':
+        if resource is None:
+            raise ValueError("A CSV export needs a resource: " + ', '.join(RESOURCES))
+        lines = csv_lines(organization, resource, updated_since, chunk_size)
+    else:
+        resources = [resource] if resource else list(RESOURCES)
+        lines = ndjson_lines(organization, resources, updated_since, chunk_size)
+
+    chunks = buffered(lines)
+    return gzipped(chunks) if gzip else chunks
+
+
+def filename(organization, format, resource=None, gzip=False):
+    parts = [organization.slug, resource] if resource else [organization.slug]
+    return '-'.join(parts) + f'.{format}' + ('.gz' if gzip else '')
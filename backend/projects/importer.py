@@ -0,0 +1,356 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+from collections import Counter
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from .bulk import TASK_FIELDS, _validate, _validation_message
+from .caching import invalidate_organization
+from .counters import adjust_project_counters, adjust_task_counters
+from .export import RESOURCES
+from .models import Organization, Project, Task, TaskComment
+from .seed import copy_rows
+
+FORMATS = ('ndjson', 'csv')
+# Record "type" -> what it creates. Within a batch they are written in
+# this order, so a task can name a project from earlier in the same batch.
+KINDS = {
+    'project': Project,
+    'task': Task,
+    'comment': TaskComment,
+}
+# Fields taken from a record; anything else (e.g. exported ids) is ignored
+FIELDS = {
+    'project': ('name', 'description', 'status', 'due_date'),
+    'task': TASK_FIELDS,
+    'comment': ('content', 'author_email'),
+}
+DEFAULT_BATCH_SIZE = 5000
+# The upload endpoint returns at most this many rejected rows (plus the total)
+MAX_REPORTED_ERRORS = 1000
+
+
+class Rejected(Exception):
+    """A record that can't be imported, with the reason"""
+
+
+def read_ndjson(stream):
+    """Yield (line number, record or Rejected) for each non-empty line"""
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, Rejected(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield number, Rejected("Expected a JSON object")
+            continue
+        yield number, record
+
+
+def read_csv(stream, resource):
+    """Yield (line number, record) for each row, typed after the resource"""
+    kind = resource[:-1]  # tasks -> task
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {**row, 'type': kind}
+
+
+def open_text(stream, name=''):
+    """Text over a binary upload or file, gunzipped when its name ends in .gz"""
+    if name.endswith('.gz'):
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+def records(stream, format='ndjson', resource=None):
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if format == 'csv':
+        if resource not in RESOURCES:
+            raise ValueError("A CSV import needs a resource: " + ', '.join(RESOURCES))
+        return read_csv(stream, resource)
+    return read_ndjson(stream)
+
+
+def _present(record, fields):
+    # CSV has no nulls: empty cells leave the model default
+    return {
+        field: record[field] for field in fields
+        if record.get(field) not in (None, '')
+    }
+
+
+def _aware(value):
+    if isinstance(value, datetime.datetime) and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+class BulkCreateLoader:
+    """Chunked bulk_create(), for any database that returns inserted ids"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def load(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+
+class CopyLoader:
+    """
+    Postgres: COPY the rows into a temporary staging table, then move them
+    over with one INSERT ... SELECT. Ids are taken from the table's sequence
+    up front so new tasks can be matched to their refs. The INSERT joins the
+    parent table, so a row whose project or task was deleted since it was
+    validated is dropped (and reported) instead of failing the whole batch.
+    """
+
+    PARENTS = {Project: 'organization', Task: 'project', TaskComment: 'task'}
+
+    def load(self, model, objects):
+        opts = model._meta
+        qn = connection.ops.quote_name
+        table = opts.db_table
+        staging = f'import_{table}'
+        fields = opts.concrete_fields
+        parent = opts.get_field(self.PARENTS[model])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [table, opts.pk.column, len(objects)],
+            )
+            for obj, (pk,) in zip(objects, cursor.fetchall()):
+                obj.pk = pk
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {qn(staging)} "
+                f"(LIKE {qn(table)} INCLUDING DEFAULTS)"
+            )
+            cursor.execute(f"TRUNCATE {qn(staging)}")
+
+        copy_rows(
+            staging,
+            [field.column for field in fields],
+            (
+                [field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields]
+                for obj in objects
+            ),
+        )
+
+        columns = ', '.join(qn(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(table)} ({columns}) "
+                f"SELECT {', '.join(f's.{qn(field.column)}' for field in fields)} "
+                f"FROM {qn(staging)} s "
+                f"JOIN {qn(parent.related_model._meta.db_table)} p "
+                f"ON p.{qn(parent.target_field.column)} = s.{qn(parent.column)} "
+                f"RETURNING {qn(opts.pk.column)}"
+            )
+            inserted = {pk for (pk,) in cursor.fetchall()}
+        return [obj for obj in objects if obj.pk in inserted]
+
+
+# How rows are written: COPY through a staging table on Postgres,
+# bulk_create() elsewhere
+LOADERS = ('copy', 'bulk_create')
+
+
+def get_loader(method=None, batch_size=DEFAULT_BATCH_SIZE):
+    if method is None:
+        method = 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+    if method == 'copy':
+        if connection.vendor != 'postgresql':
+            raise ValueError("COPY is only available on Postgres")
+        return CopyLoader()
+    return BulkCreateLoader(batch_size)
+
+
+class Importer:
+    """
+    Create projects, tasks and comments from a stream of records, in
+    batches of `batch_size`, each batch in its own transaction.
+
+    Records reference their parents by name rather than id:
+
+    - project: organization (slug), name, description, status, due_date
+    - task: organization, project (name), title, description, status,
+      assignee_email, due_date, and an optional ref to point comments at
+    - comment: task (a ref from this import) or task_id (an existing
+      task), content, author_email
+
+    Lookups are made once per batch (one query per kind), not per row.
+    Invalid records are passed to `reject(line, record, message)` and
+    skipped; the rest of the batch is still written.
+    """
+
+    def __init__(self, reject, loader=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.reject = reject
+        self.loader = loader or get_loader(batch_size=batch_size)
+        self.batch_size = batch_size
+        self.created = Counter()
+        self.rejected = 0
+        # ref -> (task id, organization id) of the tasks imported so far
+        self.refs = {}
+
+    def run(self, rows):
+        batch = []
+        for line, record in rows:
+            if isinstance(record, Rejected):
+                self.fail(line, None, str(record))
+                continue
+            if record.get('type') not in KINDS:
+                self.fail(line, record, f"type must be one of {', '.join(KINDS)}")
+                continue
+            batch.append((line, record))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.created
+
+    def fail(self, line, record, message):
+        self.rejected += 1
+        self.reject(line, record, message)
+
+    def import_batch(self, batch):
+        by_kind = {kind: [] for kind in KINDS}
+        for line, record in batch:
+            by_kind[record['type']].append((line, record))
+
+        with transaction.atomic():
+            organizations = set()
+            if by_kind['project']:
+                organizations |= self.import_projects(by_kind['project'])
+            if by_kind['task']:
+                organizations |= self.import_tasks(by_kind['task'])
+            if by_kind['comment']:
+                organizations |= self.import_comments(by_kind['comment'])
+            for organization_id in organizations:
+                invalidate_organization(organization_id)
+
+    def build(self, kind, items, **parents):
+        """Validated instances for (line, record, parent ids) items"""
+        model = KINDS[kind]
+        exclude = [field.name for field in model._meta.concrete_fields if field.is_relation]
+        built = []
+        for line, record, ids in items:
+            obj = model(**ids, **_present(record, FIELDS[kind]))
+            try:
+                _validate(obj, exclude=exclude)
+            except ValidationError as e:
+                self.fail(line, record, _validation_message(e))
+                continue
+            if kind == 'task':
+                obj.due_date = _aware(obj.due_date)
+            built.append((line, record, obj))
+        return built
+
+    def write(self, kind, built):
+        """Insert the built objects; returns those actually written"""
+        objects = self.loader.load(KINDS[kind], [obj for _, _, obj in built])
+        written = {id(obj) for obj in objects}
+        for line, record, obj in built:
+            if id(obj) not in written:
+                self.fail(line, record, "Its parent was deleted during the import")
+        self.created[kind] += len(objects)
+        return [(line, record, obj) for line, record, obj in built if id(obj) in written]
+
+    def organization_ids(self, items):
+        slugs = {str(record.get('organization')) for _, record in items}
+        return dict(Organization.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+
+    def import_projects(self, items):
+        organizations = self.organization_ids(items)
+        resolved = []
+        for line, record in items:
+            organization_id = organizations.get(str(record.get('organization')))
+            if organization_id is None:
+                self.fail(line, record, f"Organization {record.get('organization')!r} does not exist")
+                continue
+            resolved.append((line, record, {'organization_id': organization_id}))
+        written = self.write('project', self.build('project', resolved))
+        adjust_project_counters((obj.organization_id, obj.status, 1) for _, _, obj in written)
+        return {obj.organization_id for _, _, obj in written}
+
+    def import_tasks(self, items):
+        organizations = self.organization_ids(items)
+        names = {str(record.get('project')) for _, record in items}
+        projects = {}
+        for pk, organization_id, name in Project.objects.filter(
+            organization_id__in=set(organizations.values()), name__in=names
+        ).values_list('pk', 'organization_id', 'name'):
+            # Names aren't unique: None marks one tasks can't be pointed at
+            key = (organization_id, name)
+            projects[key] = None if key in projects else pk
+
+        resolved = []
+        refs = set()
+        for line, record in items:
+            organization_id = organizations.get(str(record.get('organization')))
+            if organization_id is None:
+                self.fail(line, record, f"Organization {record.get('organization')!r} does not exist")
+                continue
+            key = (organization_id, str(record.get('project')))
+            if key not in projects:
+                self.fail(line, record, f"Project {record.get('project')!r} does not exist")
+                continue
+            if projects[key] is None:
+                self.fail(line, record, f"More than one project is named {record.get('project')!r}")
+                continue
+            ref = record.get('ref')
+            if ref not in (None, '') and (str(ref) in self.refs or str(ref) in refs):
+                self.fail(line, record, f"Ref {ref!r} is already used")
+                continue
+            if ref not in (None, ''):
+                refs.add(str(ref))
+            resolved.append((line, record, {'project_id': projects[key]}))
+
+        written = self.write('task', self.build('task', resolved))
+        project_organizations = {pk: organization_id for (organization_id, _), pk in projects.items()}
+        adjust_task_counters((obj.project_id, obj.status, 1) for _, _, obj in written)
+        for _, record, obj in written:
+            if record.get('ref') not in (None, ''):
+                self.refs[str(record['ref'])] = (obj.pk, project_organizations[obj.project_id])
+        return {project_organizations[obj.project_id] for _, _, obj in written}
+
+    def import_comments(self, items):
+        task_ids = set()
+        for _, record in items:
+            if record.get('task') in (None, ''):
+                try:
+                    task_ids.add(int(record.get('task_id')))
+                except (TypeError, ValueError):
+                    pass
+        existing = dict(
+            Task.objects.filter(pk__in=task_ids).values_list('pk', 'project__organization_id')
+        )
+
+        resolved = []
+        organizations = {}
+        for line, record in items:
+            if record.get('task') not in (None, ''):
+                task_id, organization_id = self.refs.get(str(record['task']), (None, None))
+                missing = f"No task with ref {record['task']!r} was imported"
+            else:
+                try:
+                    task_id = int(record.get('task_id'))
+                except (TypeError, ValueError):
+                    task_id = None
+                organization_id = existing.get(task_id)
+                missing = f"Task {record.get('task_id')!r} does not exist"
+            if organization_id is None:
+                self.fail(line, record, missing)
+                continue
+            organizations[task_id] = organization_id
+            resolved.append((line, record, {'task_id': task_id}))
+
+        written = self.write('comment', self.build('comment', resolved))
+        return {organizations[obj.task_id] for _, _, obj in written}
@@ -0,0 +1,66 @@
+class AggregateLoader:
+    """
+    Batches a per-parent aggregate into one GROUP BY query.
+
+    List resolvers queue the parent keys they return; the first load()
+    runs a single grouped query for every queued key and caches the
+    rows, so the remaining loads for that request are free.
+    """
+
+    def __init__(self, queryset, key_field, **aggregates):
+        self.queryset = queryset
+        self.key_field = key_field
+        self.aggregates = aggregates
+        self._pending = set()
+        self._cache = {}
+
+    def queue(self, keys):
+        for key in keys:
+            if key not in self._cache:
+                self._pending.add(key)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            self._dispatch()
+        return self._cache[key]
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, set()
+
+        # Parents without children don't come back from GROUP BY
+        for key in keys:
+            self._cache[key] = {name: 0 for name in self.aggregates}
+
+        rows = (
+            self.queryset
+            .filter(**{f'{self.key_field}__in': keys})
+            .order_by()  # keep Meta.ordering out of the GROUP BY
+            .values(self.key_field)
+            .annotate(**self.aggregates)
+        )
+        for row in rows:
+            key = row.pop(self.key_field)
+            self._cache[key] = row
+
+
+class Loaders:
+    """
+    All loaders for one request, one attribute each. None at the moment:
+    the project task counts it started with are stored on Project now
+    (projects.counters).
+    """
+
+
+def get_loaders(info):
+    """Return the loaders for the current request, creating them once"""
+    context = info.context
+    if context is None:
+        # schema.execute() without a context: nothing to share loaders on
+        return Loaders()
+
+    loaders = getattr(context, '_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context._loaders = loaders
+    return loaders
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from projects.archive import (
+    DEFAULT_ARCHIVE_AFTER, DEFAULT_BATCH_SIZE, archivable_projects, archive_project,
+    restore_project, table_sizes,
+)
+from projects.models import Project
+from projects.sharding import is_sharded, using_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the tasks and comments of completed projects not updated for a while "
+        "to the archive tables, in batches; or move a project's back (--restore)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=DEFAULT_ARCHIVE_AFTER.days,
+            help="Archive completed projects not updated for this many days",
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help="Seconds to wait between batches, to leave room for other writers",
+        )
+        parser.add_argument(
+            '--restore', type=int, nargs='+', metavar='PROJECT_ID',
+            help="Move these projects' archived tasks back instead",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help="Only list the projects that would be archived",
+        )
+
+    def handle(self, *args, older_than_days, batch_size, pause, restore, dry_run, **options):
+        def progress(project, moved):
+            self.stdout.write(f"  {project.name}: {moved} tasks moved", ending='\r')
+
+        if restore:
+            # Each project is restored on its shard
+            projects = []
+            for shard in settings.DATABASE_SHARDS:
+                with using_shard(shard):
+                    projects += [
+                        (shard, project) for project in Project.objects.filter(pk__in=restore)
+                    ]
+            missing = set(restore) - {project.pk for _, project in projects}
+            if missing:
+                raise CommandError(f"No such project: {', '.join(map(str, sorted(missing)))}")
+            for shard, project in projects:
+                with using_shard(shard):
+                    moved = restore_project(project, batch_size, pause, progress)
+                self.stdout.write(f"Restored {moved} tasks of {project.name} ({project.pk})")
+            return
+
+        cutoff = timezone.now() - timedelta(days=older_than_days)
+        archived = 0
+        for shard in settings.DATABASE_SHARDS:
+            with using_shard(shard):
+                archived += self.archive_shard(shard, cutoff, batch_size, pause, dry_run, progress)
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Archived {archived} tasks"))
+
+    def archive_shard(self, shard, cutoff, batch_size, pause, dry_run, progress):
+        projects = archivable_projects(cutoff)
+        if dry_run:
+            for project in projects:
+                self.stdout.write(f"Would archive {project.name} ({project.pk})")
+            return 0
+
+        sizes = table_sizes()
+        archived = 0
+        for project in projects:
+            moved = archive_project(project, batch_size, pause, progress)
+            archived += moved
+            self.stdout.write(f"Archived {moved} tasks of {project.name} ({project.pk})")
+
+        # On Postgres the hot tables keep their size until VACUUM makes the
+        # freed space reusable (VACUUM FULL or pg_repack gives it back)
+        label = f"{shard}: " if is_sharded() else ''
+        for table, (data, indexes) in table_sizes().items():
+            before = sizes[table]
+            self.stdout.write(
+                f"{label}{table}: {data / 1024:,.0f} KiB data, {indexes / 1024:,.0f} KiB indexes "
+                f"(was {before[0] / 1024:,.0f} / {before[1] / 1024:,.0f})"
+            )
+        return archived
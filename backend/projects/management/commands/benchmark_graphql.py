@@ -0,0 +1,154 @@
+import json
+import os
+import platform
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from projects.benchmark import (
+    DEFAULT_THRESHOLD,
+    PERCENTILES,
+    compare,
+    run_benchmarks,
+    seed_dataset,
+    uncovered_fields,
+)
+from projects.models import Organization, Task
+
+RESULTS_DIR = os.path.join(settings.BASE_DIR, 'benchmarks', 'results')
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every GraphQL Query and Mutation field through schema.execute on a "
+        "synthetic dataset, in a separate test database, and save the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=4)
+        parser.add_argument('--projects', type=int, default=25, help="Per organization")
+        parser.add_argument('--tasks', type=int, default=100, help="Per project, on average")
+        parser.add_argument('--comments', type=float, default=2, help="Per task, on average")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='+', metavar='FIELD', help="Fields to benchmark")
+        parser.add_argument(
+            '--output',
+            help="JSON file for the results (default: benchmarks/results/<database>-<time>.json)",
+        )
+        parser.add_argument('--compare', metavar='BASELINE', help="Results JSON to compare with")
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the benchmark database, and reuse it when it holds the same dataset",
+        )
+
+    def handle(self, *args, **options):
+        missing = uncovered_fields()
+        if missing:
+            self.stderr.write(self.style.WARNING(f"No benchmark for: {', '.join(missing)}"))
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        dataset = {
+            'organizations': options['organizations'],
+            'projects': options['projects'],
+            'tasks': options['tasks'],
+            'comments': options['comments'],
+        }
+
+        # Never touch the configured database: run in its test database
+        # (a file next to manage.py on SQLite, so --keepdb can reuse it)
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                settings.BASE_DIR, 'benchmarks', 'benchmark.sqlite3'
+            )
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            self.seed(dataset)
+            self.stdout.write(
+                f"{'field':<22}" + ''.join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+                + f"{'queries':>9}{'peak KiB':>10}"
+            )
+            results = run_benchmarks(
+                options['iterations'],
+                options['warmup'],
+                only=options['only'],
+                progress=self.report,
+            )
+            database = {'vendor': connection.vendor, 'version': self.database_version()}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output = {
+            'createdAt': timezone.now().isoformat(),
+            'database': database,
+            'python': platform.python_version(),
+            'dataset': dataset,
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        path = options['output'] or os.path.join(
+            RESULTS_DIR, f"{connection.vendor}-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(output, f, indent=2)
+        self.stdout.write(f"Results written to {path}")
+
+        if baseline is not None:
+            self.compare(baseline, output, options['threshold'])
+
+    def seed(self, dataset):
+        expected_tasks = dataset['organizations'] * dataset['projects'] * dataset['tasks']
+        if (
+            Organization.objects.count() == dataset['organizations']
+            and Task.objects.count() == expected_tasks
+        ):
+            self.stdout.write("Reusing the seeded dataset")
+            return
+        if Organization.objects.exists():
+            call_command('flush', interactive=False, verbosity=0)
+        self.stdout.write(f"Seeding {expected_tasks} tasks...")
+        seed_dataset(
+            **dataset,
+            workers=os.cpu_count(),
+            progress=lambda done, total: self.stdout.write(f"  {done}/{total}", ending='\r'),
+        )
+        self.stdout.write('')
+
+    def database_version(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT sqlite_version()')
+            else:
+                cursor.execute('SELECT version()')
+            return cursor.fetchone()[0]
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<22}" + ''.join(f"{result[f'p{p}']:>10.2f}" for p in PERCENTILES)
+            + f"{result['queries']:>9}{result['peakMemoryKiB']:>10.1f}"
+        )
+
+    def compare(self, baseline, output, threshold):
+        if baseline.get('dataset') != output['dataset'] or (
+            baseline.get('database', {}).get('vendor') != output['database']['vendor']
+        ):
+            self.stderr.write(self.style.WARNING(
+                "The baseline ran on a different dataset or database, "
+                "its figures may not be comparable"
+            ))
+        regressions = compare(baseline['results'], output['results'], threshold)
+        for name, metric, before, after in regressions:
+            self.stderr.write(self.style.ERROR(f"{name}: {metric} {before} -> {after}"))
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline['createdAt']}")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from projects.counters import adjust_task_counters
+from projects.models import Organization, Project, Task, TaskComment
+from projects.purge import DEFAULT_CHUNK_SIZE, purge_organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Organization.delete() (Django's collector) with purge_organization "
+        "on two identical synthetic tenants"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=100_000)
+        parser.add_argument('--projects', type=int, default=100)
+        parser.add_argument('--comments-per-task', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def create_tenant(self, slug, tasks, projects, comments_per_task):
+        organization = Organization.objects.create(
+            name=slug, slug=slug, contact_email=f'admin@{slug}.example.com'
+        )
+        project_objs = Project.objects.bulk_create(
+            Project(organization=organization, name=f'Project {i}') for i in range(projects)
+        )
+        batch = 10_000
+        for start in range(0, tasks, batch):
+            task_objs = Task.objects.bulk_create(
+                Task(project=project_objs[i % projects], title=f'Task {i}')
+                for i in range(start, min(start + batch, tasks))
+            )
+            adjust_task_counters((task.project_id, task.status, 1) for task in task_objs)
+            TaskComment.objects.bulk_create(
+                TaskComment(task=task, content='Comment', author_email='user@example.com')
+                for task in task_objs
+                for _ in range(comments_per_task)
+            )
+        return organization
+
+    def measure(self, label, func):
+        tracemalloc.start()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{label:<12} {elapsed:8.2f}s  peak {peak / 1024 / 1024:8.1f} MiB")
+        return elapsed, peak
+
+    def handle(self, *args, tasks, projects, comments_per_task, chunk_size, **options):
+        self.stdout.write(
+            f"Seeding 2 tenants with {projects} projects, {tasks} tasks, "
+            f"{tasks * comments_per_task} comments each..."
+        )
+        collected = self.create_tenant('bench-collector', tasks, projects, comments_per_task)
+        purged = self.create_tenant('bench-purge', tasks, projects, comments_per_task)
+
+        collector = self.measure('collector', collected.delete)
+        purge = self.measure(
+            'purge', lambda: purge_organization(purged, chunk_size=chunk_size)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"purge is {collector[0] / purge[0]:.1f}x faster "
+            f"and peaks at {purge[1] / collector[1]:.1%} of the collector's memory"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.explain import explain_queries
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the SQL of every GraphQL Query field and fail on sequential scans"
+
+    def handle(self, *args, **options):
+        try:
+            report = explain_queries()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        failed = []
+        for field, sql, plan, scans in report:
+            self.stdout.write(self.style.MIGRATE_HEADING(field))
+            self.stdout.write(f"  {sql}")
+            for line in plan:
+                self.stdout.write(f"    {line}")
+            if scans:
+                failed.append(field)
+
+        if failed:
+            raise CommandError(f"Sequential scans in: {', '.join(sorted(set(failed)))}")
+        self.stdout.write(self.style.SUCCESS(f"{len(report)} statements, no sequential scans"))
@@ -0,0 +1,89 @@
+import csv
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from projects.export import RESOURCES
+from projects.importer import (
+    DEFAULT_BATCH_SIZE,
+    FORMATS,
+    LOADERS,
+    Importer,
+    get_loader,
+    open_text,
+    records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import projects, tasks and comments from NDJSON or CSV in batches, "
+        "writing rejected rows to a report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read (.gz is decompressed), - for stdin")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help="Default: csv for .csv(.gz) files, ndjson otherwise",
+        )
+        parser.add_argument(
+            '--resource', choices=list(RESOURCES), help="What a CSV file holds (required for CSV)"
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--loader', choices=LOADERS,
+            help="Default: copy (through a staging table) on Postgres, bulk_create elsewhere",
+        )
+        parser.add_argument(
+            '--report', default='import-rejected.csv',
+            help="CSV of rejected rows: line, type, error, record",
+        )
+
+    def handle(self, *args, path, **options):
+        format = options['format'] or (
+            'csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson'
+        )
+        try:
+            loader = get_loader(options['loader'], options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        report_file = open(options['report'], 'w', newline='')
+        report = csv.writer(report_file)
+        report.writerow(['line', 'type', 'error', 'record'])
+
+        def reject(line, record, message):
+            report.writerow([
+                line,
+                record.get('type', '') if record else '',
+                message,
+                json.dumps(record, default=str) if record else '',
+            ])
+
+        importer = Importer(reject, loader=loader, batch_size=options['batch_size'])
+        started = time.perf_counter()
+        try:
+            importer.run(records(open_text(source, path), format, options['resource']))
+        except (UnicodeDecodeError, OSError) as e:
+            raise CommandError(
+                f"Could not read {path} ({e}) after importing {dict(importer.created)}"
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            report_file.close()
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        created = ', '.join(
+            f"{importer.created[kind]} {kind}s" for kind in ('project', 'task', 'comment')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} in {time.perf_counter() - started:.1f}s"
+        ))
+        if importer.rejected:
+            self.stderr.write(self.style.WARNING(
+                f"{importer.rejected} rows rejected, see {options['report']}"
+            ))
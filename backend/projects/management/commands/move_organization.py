@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from projects.models import Organization
+from projects.relocate import DEFAULT_BATCH_SIZE, move_organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Move an organization with all its projects, tasks and comments to another "
+        "shard, while it stays in use (writes to it are refused during the final pass)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug')
+        parser.add_argument('shard', choices=settings.DATABASE_SHARDS)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, slug, shard, batch_size, **options):
+        def progress(step, name, rows):
+            self.stdout.write(f"{step}: {rows} {name}")
+
+        try:
+            deleted = move_organization(slug, shard, batch_size, progress)
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{slug}' does not exist")
+        except ValueError as e:
+            raise CommandError(str(e))
+        summary = ", ".join(f"{count} {name}" for name, count in deleted.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved '{slug}' to {shard}; deleted from the old shard: {summary}"
+        ))
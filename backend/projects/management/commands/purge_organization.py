@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.models import Organization
+from projects.purge import DEFAULT_CHUNK_SIZE, purge_organization
+from projects.sharding import shard_for_slug, using_shard
+
+
+class Command(BaseCommand):
+    help = "Delete an organization with all its projects, tasks and comments, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help="Don't ask for confirmation",
+        )
+
+    def handle(self, *args, slug, chunk_size, interactive, **options):
+        shard, moving, _ = shard_for_slug(slug)
+        if moving:
+            raise CommandError(f"Organization '{slug}' is being moved, purge it once that's done")
+        try:
+            with using_shard(shard):
+                organization = Organization.objects.get(slug=slug)
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{slug}' does not exist")
+
+        if interactive:
+            answer = input(
+                f"This permanently deletes '{organization.name}' and all its data. "
+                "Type 'yes' to continue: "
+            )
+            if answer != 'yes':
+                raise CommandError("Purge cancelled")
+
+        def progress(name, deleted, total):
+            self.stdout.write(f"{name}: {deleted}/{total} deleted")
+
+        with using_shard(shard):
+            deleted = purge_organization(organization, chunk_size=chunk_size, progress=progress)
+        summary = ", ".join(f"{count} {name}" for name, count in deleted.items())
+        self.stdout.write(self.style.SUCCESS(f"Purged '{slug}': {summary}"))
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from projects.counters import reconcile_organization_stats, reconcile_task_counters
+from projects.sharding import using_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored per-status task counters on every project, then "
+        "every organization's stats, and report drift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report drift, don't write the corrected counters",
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        drift = []
+        stats_drift = []
+        for shard in settings.DATABASE_SHARDS:
+            with using_shard(shard):
+                shard_drift = reconcile_task_counters(batch_size=batch_size, fix=not dry_run)
+                for project_id, field, stored, actual in shard_drift:
+                    self.stdout.write(
+                        f"Project {project_id}: {field} was {stored}, counted {actual}"
+                    )
+
+                # From the project counters, so only exact once those are fixed
+                shard_stats_drift = reconcile_organization_stats(fix=not dry_run)
+                for organization_id, field, stored, actual in shard_stats_drift:
+                    self.stdout.write(
+                        f"Organization {organization_id}: {field} was {stored}, counted {actual}"
+                    )
+            drift += shard_drift
+            stats_drift += shard_stats_drift
+
+        projects = len({project_id for project_id, *_ in drift})
+        organizations = len({organization_id for organization_id, *_ in stats_drift})
+        if not drift and not stats_drift:
+            self.stdout.write(self.style.SUCCESS("All task counters are correct"))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"{projects} project(s) and {organizations} organization(s) have drifted"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Fixed counters on {projects} project(s) and {organizations} organization(s)"
+            ))
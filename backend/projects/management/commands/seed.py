@@ -0,0 +1,84 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from projects.models import (
+    ArchivedTask, ArchivedTaskComment, Organization, Project, Task, TaskComment,
+)
+from projects.seed import DEFAULT_BATCH_SIZE, WRITERS, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate deterministic sample data: skewed organization and project sizes, "
+        "status mixes, assignees, due dates and comment threads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=2)
+        parser.add_argument('--projects', type=int, default=6, help="In total")
+        parser.add_argument('--tasks', type=int, default=60, help="In total")
+        parser.add_argument('--comments', type=float, default=1.0, help="Average per task")
+        parser.add_argument('--seed', type=int, default=0, help="Same seed, same data")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="Writer processes (Postgres only; SQLite always uses one)",
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--writer', choices=WRITERS,
+            help="copy (Postgres, the default there), insert (one INSERT per batch, "
+                 "the default elsewhere) or bulk_create",
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help="Empty the organization, project, task and comment tables first",
+        )
+
+    def handle(self, *args, **options):
+        if options['projects'] < options['organizations']:
+            raise CommandError("Every organization needs a project: --projects >= --organizations")
+
+        if options['writer'] == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError("--writer copy needs Postgres")
+
+        if options['flush']:
+            tables = [
+                model._meta.db_table for model in
+                (ArchivedTaskComment, ArchivedTask, TaskComment, Task, Project, Organization)
+            ]
+            connection.ops.execute_sql_flush(
+                connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+            )
+
+        started = time.perf_counter()
+
+        def progress(done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  {done}/{total} tasks, {done / elapsed if elapsed else 0:,.0f}/s", ending='\r'
+            )
+            self.stdout.flush()
+
+        try:
+            counts = seed(
+                options['organizations'],
+                options['projects'],
+                options['tasks'],
+                comments=options['comments'],
+                seed=options['seed'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                writer=options['writer'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(f"{e} (use --flush, or another --seed)")
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            "Created {organizations} organizations, {projects} projects, {tasks} tasks "
+            "and {comments} comments".format(**counts)
+            + f" in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from projects.routing import sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over each SQLite replica, to try read "
+        "replicas out locally; with --every, again and again (the replication lag)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Seconds between copies")
+
+    def handle(self, *args, every, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured (set DATABASE_REPLICA_URLS)")
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                try:
+                    sync_sqlite_replica(alias)
+                except ValueError as e:
+                    raise CommandError(f"{alias}: {e}")
+                self.stdout.write(f"Synced {alias}")
+            if not every:
+                return
+            time.sleep(every)
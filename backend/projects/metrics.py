@@ -0,0 +1,301 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+from django.conf import settings
+from django.db import connections
+from graphql import get_named_type, is_leaf_type
+
+# The Trace of the operation being executed, if any. Context variables are
+# copied into sync_to_async threads, so resolvers running there see it too.
+current_trace = ContextVar('current_trace', default=None)
+# Path of the resolver running, so its SQL can be attributed to it
+current_path = ContextVar('current_path', default=None)
+
+# Operation names are chosen by clients: beyond this many, they share a label
+MAX_OPERATIONS = 200
+OTHER_OPERATION = '~other'
+
+
+class Trace:
+    """
+    Timings of one GraphQL operation.
+
+    Always counts the SQL it issues and how long that took; when `detailed`
+    (the trace header was sent), also every resolver's path, wall time and
+    SQL, to be returned in the response.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.started = time.perf_counter()
+        self.duration = None
+        self.sql_count = 0
+        self.sql_duration = 0.0
+        self.fields = []    # (Type.field, seconds) for object fields
+        self.resolvers = {}  # path: [seconds, sql count, sql seconds]
+        self._lock = threading.Lock()
+
+    def record_sql(self, execute, sql, params, many, context):
+        """connection.execute_wrapper() hook"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            path = current_path.get()
+            with self._lock:
+                self.sql_count += 1
+                self.sql_duration += elapsed
+                if path is not None and path in self.resolvers:
+                    resolver = self.resolvers[path]
+                    resolver[1] += 1
+                    resolver[2] += elapsed
+
+    def start_resolver(self, path):
+        with self._lock:
+            self.resolvers[path] = [0.0, 0, 0.0]
+
+    def resolved(self, info, path, elapsed):
+        with self._lock:
+            if path is not None:
+                self.resolvers[path][0] = elapsed
+            if is_object_field(info):
+                self.fields.append((f'{info.parent_type.name}.{info.field_name}', elapsed))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_extension(self):
+        return {
+            'duration': round(self.duration * 1000, 3),
+            'sql': {
+                'count': self.sql_count,
+                'duration': round(self.sql_duration * 1000, 3),
+            },
+            'resolvers': [
+                {
+                    'path': path,
+                    'duration': round(elapsed * 1000, 3),
+                    'sqlCount': sql_count,
+                    'sqlDuration': round(sql_duration * 1000, 3),
+                }
+                for path, (elapsed, sql_count, sql_duration) in self.resolvers.items()
+            ],
+        }
+
+
+def is_object_field(info):
+    return not is_leaf_type(get_named_type(info.return_type))
+
+
+@contextmanager
+def sql_accounting():
+    """Count the SQL run on this thread's connections into the current trace"""
+    trace = current_trace.get()
+    with ExitStack() as stack:
+        if trace is not None:
+            for connection in connections.all():
+                if trace.record_sql not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(trace.record_sql))
+        yield
+
+
+class ResolverTimingMiddleware:
+    """Graphene middleware timing each resolver of a traced operation"""
+
+    def resolve(self, next, root, info, **args):
+        trace = current_trace.get()
+        if trace is None or not (trace.detailed or is_object_field(info)):
+            # Scalars are only timed for the detailed trace, to keep this cheap
+            return next(root, info, **args)
+
+        path = None
+        token = None
+        if trace.detailed:
+            path = '.'.join(str(key) for key in info.path.as_list())
+            trace.start_resolver(path)
+            token = current_path.set(path)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        finally:
+            if token is not None:
+                current_path.reset(token)
+
+        if isawaitable(result):
+            return self.resolve_async(trace, info, path, start, result)
+        trace.resolved(info, path, time.perf_counter() - start)
+        return result
+
+    async def resolve_async(self, trace, info, path, start, result):
+        token = current_path.set(path) if path is not None else None
+        try:
+            return await result
+        finally:
+            if token is not None:
+                current_path.reset(token)
+            trace.resolved(info, path, time.perf_counter() - start)
+
+
+# Prometheus metrics, aggregated per process
+
+# Upper bounds (seconds, or queries) of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label value"""
+
+    def __init__(self, name, help, label, buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.series = {}  # label value: [bucket counts..., sum, count]
+
+    def observe(self, value, amount):
+        series = self.series.get(value)
+        if series is None:
+            series = self.series[value] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, amount)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += amount
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for value, series in sorted(self.series.items()):
+            label = f'{self.label}="{escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{label}}} {series[-1]}')
+        return '\n'.join(lines)
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Metrics:
+    """The histograms behind /metrics/"""
+
+    def __init__(self):
+        self.operation_duration = Histogram(
+            'graphql_operation_duration_seconds',
+            "Time to execute a GraphQL operation.",
+            'operation', DURATION_BUCKETS,
+        )
+        self.sql_queries = Histogram(
+            'graphql_operation_sql_queries',
+            "SQL queries issued by a GraphQL operation.",
+            'operation', QUERY_COUNT_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            'graphql_operation_sql_duration_seconds',
+            "Time a GraphQL operation spent in SQL queries.",
+            'operation', DURATION_BUCKETS,
+        )
+        self.field_duration = Histogram(
+            'graphql_field_duration_seconds',
+            "Time to resolve a field returning objects.",
+            'field', DURATION_BUCKETS,
+        )
+        self._lock = threading.Lock()
+
+    def operation_label(self, name):
+        name = name or 'anonymous'
+        if name not in self.operation_duration.series and (
+            len(self.operation_duration.series) >= MAX_OPERATIONS
+        ):
+            return OTHER_OPERATION
+        return name
+
+    def observe(self, operation_name, trace):
+        with self._lock:
+            label = self.operation_label(operation_name)
+            self.operation_duration.observe(label, trace.duration)
+            self.sql_queries.observe(label, trace.sql_count)
+            self.sql_duration.observe(label, trace.sql_duration)
+            for field, elapsed in trace.fields:
+                self.field_duration.observe(field, elapsed)
+
+    def render(self):
+        with self._lock:
+            histograms = (
+                self.operation_duration, self.sql_queries, self.sql_duration, self.field_duration
+            )
+            return '\n'.join(histogram.render() for histogram in histograms) + '\n'
+
+
+metrics = Metrics()
+
+
+# psycopg_pool statistics of each pooled database, exported as
+# stat: (metric, type, help, scale to the metric's unit)
+POOL_METRICS = {
+    'pool_max': ('db_pool_max_connections', 'gauge', "Most connections the pool may open.", 1),
+    'pool_size': ('db_pool_connections', 'gauge', "Connections open, in use or idle.", 1),
+    'pool_available': (
+        'db_pool_idle_connections', 'gauge', "Connections idle in the pool.", 1,
+    ),
+    'requests_waiting': (
+        'db_pool_requests_waiting', 'gauge', "Requests waiting for a connection.", 1,
+    ),
+    'requests_num': (
+        'db_pool_requests_total', 'counter', "Connections requested from the pool.", 1,
+    ),
+    'requests_queued': (
+        'db_pool_requests_queued_total', 'counter',
+        "Requests that had to wait for a connection.", 1,
+    ),
+    'requests_wait_ms': (
+        'db_pool_requests_wait_seconds_total', 'counter',
+        "Time requests spent waiting for a connection.", 0.001,
+    ),
+    'requests_errors': (
+        'db_pool_requests_errors_total', 'counter',
+        "Requests that timed out waiting for a connection.", 1,
+    ),
+    'connections_lost': (
+        'db_pool_connections_lost_total', 'counter',
+        "Connections found broken when taken out of the pool.", 1,
+    ),
+}
+
+
+def connection_pool_stats():
+    """{alias: psycopg_pool statistics} of the databases with a connection pool"""
+    stats = {}
+    for alias in connections:
+        if connections.settings[alias]['OPTIONS'].get('pool'):
+            # Shared by the process's threads, unlike the connections
+            stats[alias] = connections[alias].pool.get_stats()
+    return stats
+
+
+def render_pool_stats(stats):
+    """Prometheus text lines for connection_pool_stats()"""
+    if not stats:
+        return ''
+    lines = []
+    for stat, (name, kind, help, scale) in POOL_METRICS.items():
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+        for alias, values in sorted(stats.items()):
+            lines.append(f'{name}{{database="{escape(alias)}"}} {values.get(stat, 0) * scale}')
+    return '\n'.join(lines) + '\n'
+
+
+def wants_trace(request):
+    """Whether the request asked for (and may see) the detailed trace"""
+    return bool(
+        settings.GRAPHQL_TRACING and request.headers.get(settings.GRAPHQL_TRACE_HEADER)
+    )
@@ -0,0 +1,38 @@
+from django.contrib.postgres import operations as postgres
+from django.db import migrations
+
+# Creating or dropping an index with a plain CREATE/DROP INDEX blocks the
+# table's writes until it's done: minutes to build one on the task and
+# comment tables, and a drop waits behind every query already running.
+# Postgres can do both while they carry on, outside a transaction.
+
+
+class Concurrently:
+    """Runs the Postgres operation `concurrently` there, and the operation itself elsewhere"""
+    concurrently = None
+
+    def _operation(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super()
+        _, args, kwargs = self.deconstruct()
+        return self.concurrently(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._operation(schema_editor).database_forwards(
+            app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._operation(schema_editor).database_backwards(
+            app_label, schema_editor, from_state, to_state
+        )
+
+
+# For migrations with `atomic = False`
+
+class AddIndexConcurrently(Concurrently, migrations.AddIndex):
+    concurrently = postgres.AddIndexConcurrently
+
+
+class RemoveIndexConcurrently(Concurrently, migrations.RemoveIndex):
+    concurrently = postgres.RemoveIndexConcurrently
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_task_counters(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Task = apps.get_model('projects', 'Task')
+    db = schema_editor.connection.alias
+    for status, field in (
+        ('TODO', 'todo_count'),
+        ('IN_PROGRESS', 'in_progress_count'),
+        ('DONE', 'done_count'),
+    ):
+        counts = (
+            Task.objects
+            .filter(project=OuterRef('pk'), status=status)
+            .order_by()
+            .values('project')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+        Project.objects.using(db).update(**{field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='done_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_task_counters, migrations.RunPython.noop),
+    ]
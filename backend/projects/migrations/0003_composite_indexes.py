@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:12
+
+from django.db import migrations, models
+from projects.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are built concurrently on Postgres
+    atomic = False
+
+    dependencies = [
+        ('projects', '0002_project_task_counters'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='organization',
+            index=models.Index(fields=['-created_at', '-id'], name='org_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='project',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='project_org_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='task_project_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_idx'),
+        ),
+    ]
@@ -0,0 +1,148 @@
+from django.db import migrations
+
+# Full-text indexes for searchTasks and the admin search (see projects.search).
+# They live outside the models, as each backend needs its own kind.
+
+# The columns searched, per table
+SEARCHED_COLUMNS = {
+    'projects_task': ('title', 'description', 'assignee_email'),
+    'projects_taskcomment': ('content', 'author_email'),
+}
+
+# Postgres: a search_vector column kept current by a trigger on every
+# insert and update of the searched columns (COPY and raw SQL writes too),
+# with a GIN index. Unlike a generated column, adding it doesn't rewrite the
+# table: the rows already there are filled in by batches, each committed on
+# its own, and the index is built concurrently, so writes carry on meanwhile.
+POSTGRES_VECTORS = {
+    'projects_task': (
+        "setweight(to_tsvector('english'::regconfig, coalesce({row}title, '')), 'A') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce({row}description, '')), 'B') || "
+        "setweight(to_tsvector('simple'::regconfig, coalesce({row}assignee_email, '')), 'C')"
+    ),
+    'projects_taskcomment': (
+        "setweight(to_tsvector('english'::regconfig, coalesce({row}content, '')), 'D') || "
+        "setweight(to_tsvector('simple'::regconfig, coalesce({row}author_email, '')), 'D')"
+    ),
+}
+
+POSTGRES_INDEXES = {
+    'projects_task': 'task_search_idx',
+    'projects_taskcomment': 'comment_search_idx',
+}
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def postgres_forward(schema_editor, table):
+    vector = POSTGRES_VECTORS[table]
+    columns = ', '.join(SEARCHED_COLUMNS[table])
+    schema_editor.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector")
+    schema_editor.execute(
+        f"CREATE FUNCTION {table}_search_vector() RETURNS trigger LANGUAGE plpgsql AS $$ "
+        f"BEGIN NEW.search_vector := {vector.format(row='NEW.')}; RETURN NEW; END $$"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {columns} "
+        f"ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()"
+    )
+    # The trigger covers the rows written from here on; fill in those already there
+    last_id = -1
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                f"UPDATE {table} SET search_vector = {vector.format(row='')} WHERE id IN ("
+                f"SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s"
+                f") RETURNING id",
+                [last_id, BACKFILL_BATCH_SIZE],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            last_id = max(ids)
+    schema_editor.execute(
+        f"CREATE INDEX CONCURRENTLY {POSTGRES_INDEXES[table]} "
+        f"ON {table} USING GIN (search_vector)"
+    )
+
+
+def postgres_backward(table):
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_search_vector ON {table}",
+        f"DROP FUNCTION IF EXISTS {table}_search_vector()",
+        # And its index
+        f"ALTER TABLE {table} DROP COLUMN search_vector",
+    ]
+
+
+# SQLite: FTS5 tables indexing the rows of the real tables ("external
+# content"), kept in sync by triggers. Django rebuilds an SQLite table for
+# most field alterations, which drops its triggers: a later migration that
+# alters these tables must create them again.
+def sqlite_forward(table, columns):
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    remove = (
+        f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    )
+    add = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {add} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {remove} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} "
+        f"BEGIN {remove} {add} END",
+        # Index the rows already there
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+def sqlite_backward(table):
+    fts = f'{table}_fts'
+    return [
+        f"DROP TRIGGER {fts}_insert",
+        f"DROP TRIGGER {fts}_delete",
+        f"DROP TRIGGER {fts}_update",
+        f"DROP TABLE {fts}",
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table in SEARCHED_COLUMNS:
+            postgres_forward(schema_editor, table)
+    elif vendor == 'sqlite':
+        for table, columns in SEARCHED_COLUMNS.items():
+            for sql in sqlite_forward(table, columns):
+                schema_editor.execute(sql)
+    # No search on other backends
+
+
+def drop_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = [sql for table in SEARCHED_COLUMNS for sql in postgres_backward(table)]
+    elif vendor == 'sqlite':
+        statements = [sql for table in SEARCHED_COLUMNS for sql in sqlite_backward(table)]
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    # Postgres fills in and indexes the rows already there in steps
+    atomic = False
+
+    dependencies = [
+        ('projects', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from projects.migration_operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+def backfill_organization_stats(apps, schema_editor):
+    Organization = apps.get_model('projects', 'Organization')
+    OrganizationStats = apps.get_model('projects', 'OrganizationStats')
+    Project = apps.get_model('projects', 'Project')
+    db = schema_editor.connection.alias
+    # From the projects' statuses and stored task counters; annotations
+    # can't take the stats' field names, as Project has some of them
+    aggregates = {
+        'active_projects': Count('pk', filter=Q(status='ACTIVE')),
+        'completed_projects': Count('pk', filter=Q(status='COMPLETED')),
+        'on_hold_projects': Count('pk', filter=Q(status='ON_HOLD')),
+        'todo_count': Coalesce(Sum('todo_count'), 0),
+        'in_progress_count': Coalesce(Sum('in_progress_count'), 0),
+        'done_count': Coalesce(Sum('done_count'), 0),
+    }
+    totals = {
+        row['organization_id']: row
+        for row in Project.objects.using(db).order_by().values('organization_id').annotate(
+            **{f'total_{field}': aggregate for field, aggregate in aggregates.items()}
+        )
+    }
+    OrganizationStats.objects.using(db).bulk_create(
+        (
+            OrganizationStats(
+                organization_id=pk,
+                **{field: totals.get(pk, {}).get(f'total_{field}', 0) for field in aggregates},
+            )
+            for pk in Organization.objects.using(db).values_list('pk', flat=True)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    # The task indexes are built and dropped concurrently on Postgres
+    atomic = False
+
+    dependencies = [
+        ('projects', '0004_task_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationStats',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='projects.organization')),
+                ('active_projects', models.PositiveIntegerField(default=0)),
+                ('completed_projects', models.PositiveIntegerField(default=0)),
+                ('on_hold_projects', models.PositiveIntegerField(default=0)),
+                ('todo_count', models.PositiveIntegerField(default=0)),
+                ('in_progress_count', models.PositiveIntegerField(default=0)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'organization stats',
+            },
+        ),
+        migrations.RunPython(backfill_organization_stats, migrations.RunPython.noop, atomic=True),
+        # Replaces task_project_status_idx, a prefix of it
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'due_date'], name='task_project_status_due_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='task',
+            name='task_project_status_idx',
+        ),
+    ]
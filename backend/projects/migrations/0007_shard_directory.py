@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardAssignment',
+            fields=[
+                ('organization_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField(unique=True)),
+                ('shard', models.CharField(max_length=100)),
+                ('moving', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The ForeignKey indexes of the task and comment tables, which their
+# composite indexes start with (task_project_*_idx, comment_task_created_idx).
+# Not dropped by AlterField: SQLite would rebuild the tables, dropping their
+# search triggers (see 0004), and Postgres would hold a lock on them.
+FOREIGN_KEYS = {
+    'Task': 'project',
+    'TaskComment': 'task',
+}
+
+
+def foreign_key_indexes(apps, schema_editor):
+    """(index, table, column) of each, the index named as Django made it"""
+    qn = schema_editor.quote_name
+    for model_name, field_name in FOREIGN_KEYS.items():
+        model = apps.get_model('projects', model_name)
+        table = model._meta.db_table
+        column = model._meta.get_field(field_name).column
+        name = schema_editor._create_index_name(table, [column])
+        yield qn(name), qn(table), qn(column)
+
+
+def concurrently(schema_editor):
+    return ' CONCURRENTLY' if schema_editor.connection.vendor == 'postgresql' else ''
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _, _ in foreign_key_indexes(apps, schema_editor):
+        schema_editor.execute(f"DROP INDEX{concurrently(schema_editor)} IF EXISTS {name}")
+
+
+def create_indexes(apps, schema_editor):
+    for name, table, column in foreign_key_indexes(apps, schema_editor):
+        schema_editor.execute(
+            f"CREATE INDEX{concurrently(schema_editor)} {name} ON {table} ({column})"
+        )
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are dropped concurrently on Postgres
+    atomic = False
+
+    dependencies = [
+        ('projects', '0007_shard_directory'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='task',
+                    name='project',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='projects.project'),
+                ),
+                migrations.AlterField(
+                    model_name='taskcomment',
+                    name='task',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='projects.task'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_indexes, create_indexes),
+            ],
+        ),
+    ]
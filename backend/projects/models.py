@@ -12,6 +12,10 @@ class Organization(models.Model):
 
     class Meta:
         ordering = ['-created_at']  
+        indexes = [
+            # allOrganizations pages newest first
+            models.Index(fields=['-created_at', '-id'], name='org_created_idx'),
+        ]
 
 class Project(models.Model):
     STATUS_CHOICES = [
@@ -32,12 +36,85 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Task counters per status, maintained by projects.counters
+    todo_count = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_count = models.PositiveIntegerField(default=0, editable=False)
+    done_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # When its tasks were last moved to the archive tables (projects.archive)
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    COUNTER_FIELDS = ('todo_count', 'in_progress_count', 'done_count')
+
     def __str__(self):
         return f"{self.organization.name} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        # A full save would write back stale counters over concurrent
+        # task changes, so existing rows never save the counter columns
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skip = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skip and f.name not in skip
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the organization's project counters currently include
+        if 'organization_id' in field_names and 'status' in field_names:
+            instance._counted = (instance.organization_id, instance.status)
+        return instance
+
+    @property
+    def task_count(self):
+        return self.todo_count + self.in_progress_count + self.done_count
+
+    @property
+    def completed_tasks(self):
+        return self.done_count
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # projectsByOrganization: filter by org, newest first
+            models.Index(
+                fields=['organization', '-created_at', '-id'],
+                name='project_org_created_idx',
+            ),
+        ]
         
+class OrganizationStats(models.Model):
+    """
+    An organization's projects and tasks counted by status, maintained by
+    projects.counters along with the per-project task counters, so the
+    dashboard never aggregates over the tasks themselves.
+    """
+    organization = models.OneToOneField(
+        Organization,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    active_projects = models.PositiveIntegerField(default=0)
+    completed_projects = models.PositiveIntegerField(default=0)
+    on_hold_projects = models.PositiveIntegerField(default=0)
+    # Sums of the counters of the organization's projects
+    todo_count = models.PositiveIntegerField(default=0)
+    in_progress_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+
+    PROJECT_COUNTER_FIELDS = ('active_projects', 'completed_projects', 'on_hold_projects')
+
+    def __str__(self):
+        return f"Stats of {self.organization_id}"
+
+    class Meta:
+        verbose_name_plural = 'organization stats'
+
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('TODO', 'To Do'),
@@ -48,7 +125,8 @@ class Task(models.Model):
     project = models.ForeignKey(
         Project, 
         on_delete=models.CASCADE,
-        related_name='tasks'
+        related_name='tasks',
+        db_index=False  # task_project_status_due_idx and task_project_created_idx start with it
     )
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -61,14 +139,34 @@ class Task(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the project counters currently include
+        if 'project_id' in field_names and 'status' in field_names:
+            instance._counted = (instance.project_id, instance.status)
+        return instance
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-status counts of a project's tasks, and its overdue open ones
+            models.Index(
+                fields=['project', 'status', 'due_date'], name='task_project_status_due_idx'
+            ),
+            # tasksByProject: filter by project, newest first
+            models.Index(
+                fields=['project', '-created_at', '-id'],
+                name='task_project_created_idx',
+            ),
+        ]
 
 class TaskComment(models.Model):
     task = models.ForeignKey(
         Task, 
         on_delete=models.CASCADE,
-        related_name='comments'
+        related_name='comments',
+        db_index=False  # comment_task_created_idx starts with it
     )
     content = models.TextField()
     author_email = models.EmailField()
@@ -80,5 +178,88 @@ class TaskComment(models.Model):
 
     class Meta:
         ordering = ['created_at']  # Oldest first (chronological)
+        indexes = [
+            # commentsByTask: filter by task, oldest first
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_idx'),
+        ]
+
 
+# Archive tier: the tasks and comments of completed projects, moved out of
+# Task and TaskComment by projects.archive with their ids and columns
+# unchanged, so that the hot tables and their indexes only hold work in
+# progress. Rows are only ever inserted with the ids they had. The project
+# counters and OrganizationStats still count them.
 
+class ArchivedTask(models.Model):
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='archived_tasks',
+        db_index=False  # archived_task_created_idx starts with it
+    )
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    assignee_email = models.EmailField(blank=True)
+    due_date = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # tasksByProject(includeArchived): filter by project, newest first
+            models.Index(
+                fields=['project', '-created_at', '-id'],
+                name='archived_task_created_idx',
+            ),
+        ]
+
+class ArchivedTaskComment(models.Model):
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        db_index=False  # archived_comment_created_idx starts with it
+    )
+    content = models.TextField()
+    author_email = models.EmailField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Comment by {self.author_email} on {self.task_id}"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['task', 'created_at', 'id'], name='archived_comment_created_idx'
+            ),
+        ]
+
+
+# The hot model each archive model mirrors
+HOT_MODELS = {ArchivedTask: Task, ArchivedTaskComment: TaskComment}
+
+
+class ShardAssignment(models.Model):
+    """
+    The shard directory: which database (settings.DATABASE_SHARDS) an
+    organization and everything under it lives on. Kept on the default
+    database only; organizations without a row live there too. See
+    projects.sharding.
+    """
+    # Not a foreign key: the organization may be on another database
+    organization_id = models.BigIntegerField(primary_key=True)
+    slug = models.SlugField(unique=True)
+    shard = models.CharField(max_length=100)
+    # Set while `move_organization` copies it: writes are refused meanwhile
+    moving = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.slug} on {self.shard}"
@@ -0,0 +1,191 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, prefetch_related_objects
+from graphene.utils.str_converters import to_camel_case
+from graphene_django.registry import get_global_registry
+from graphql.execution.values import get_argument_values
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from .models import HOT_MODELS
+
+
+def optimize(queryset, info, path=(), required=()):
+    """
+    Shape a queryset to the selection set of the field being resolved.
+
+    Forward foreign keys become select_related(), reverse relations become
+    prefetch_related() with their own optimized querysets, and only the
+    selected columns are loaded. `path` leads from the field to the node
+    selections (('edges', 'node') for connections); `required` names
+    columns to load regardless of the selection.
+    """
+    selections = _selections(info, path)
+    if not selections and not required:
+        return queryset
+    return _optimize(queryset, selections, info, required)
+
+
+def prefetch_selected(instances, info, path=()):
+    """
+    Load the relations the selection reads onto already fetched instances.
+
+    For objects that didn't come from an optimized queryset, such as a
+    mutation's result: foreign keys and reverse relations selected below
+    `path` are fetched with one query per relation, for all instances.
+    """
+    instances = [instance for instance in instances if instance is not None]
+    selections = _selections(info, path)
+    if not instances or not selections:
+        return
+
+    model = type(instances[0])
+    plan = _Plan()
+    _plan_model(plan, model, _object_type(model), selections, info, prefix='')
+    prefetch = plan.prefetch(info)
+    if plan.select or prefetch:
+        prefetch_related_objects(instances, *sorted(plan.select), *prefetch)
+
+
+def is_selected(info, name, path=()):
+    """Whether the selection below `path` has the field `name` (as the schema spells it)"""
+    return any(
+        node.name.value == name
+        for node in collect_fields(_selections(info, path), info.fragments)
+    )
+
+
+def _selections(info, path):
+    selections = []
+    for node in info.field_nodes:
+        if node.selection_set:
+            selections.extend(node.selection_set.selections)
+
+    for name in path:
+        selections = [
+            selection
+            for node in collect_fields(selections, info.fragments)
+            if node.name.value == name and node.selection_set
+            for selection in node.selection_set.selections
+        ]
+    return selections
+
+
+def _optimize(queryset, selections, info, required=()):
+    model = queryset.model
+    object_type = _object_type(model)
+    plan = _Plan()
+    plan.only.update(required)
+    _plan_model(plan, model, object_type, selections, info, prefix='')
+
+    queryset = queryset.only(*plan.only)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    prefetch = plan.prefetch(info)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class _Plan:
+    def __init__(self):
+        self.only = set()
+        self.select = set()
+        # Reverse relations by lookup: every field node reading one (under
+        # aliases, or with other arguments) shares a single prefetch, as
+        # Django allows only one queryset per lookup
+        self.relations = {}
+
+    def add_relation(self, lookup, related, selections, required):
+        _, merged, columns = self.relations.setdefault(lookup, (related, [], set()))
+        merged.extend(selections)
+        columns.update(required)
+
+    def prefetch(self, info):
+        return [
+            Prefetch(
+                lookup,
+                queryset=_optimize(
+                    related.related_model._default_manager.all(),
+                    selections,
+                    info,
+                    # The child rows need their FK to be attached to the parents
+                    required=[related.field.name, *sorted(required)],
+                ),
+            )
+            for lookup, (related, selections, required) in self.relations.items()
+        ]
+
+
+def _plan_model(plan, model, object_type, selections, info, prefix):
+    plan.only.add(prefix + model._meta.pk.name)
+    if object_type is None:
+        return
+
+    names = {to_camel_case(name): name for name in object_type._meta.fields}
+
+    for node in collect_fields(selections, info.fragments):
+        name = names.get(node.name.value)
+        if name is None:
+            continue  # __typename and the like
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Calculated field: load whatever columns the type says it reads
+            hints = getattr(object_type, 'optimizer_only', {})
+            plan.only.update(prefix + column for column in hints.get(name, ()))
+            continue
+
+        if field.many_to_one:
+            # Forward foreign key: join it in the same query
+            plan.only.add(prefix + name)
+            if node.selection_set:
+                plan.select.add(prefix + name)
+                related_model = field.related_model
+                _plan_model(
+                    plan,
+                    related_model,
+                    _object_type(related_model),
+                    node.selection_set.selections,
+                    info,
+                    prefix=f'{prefix}{name}__',
+                )
+        elif field.one_to_many:
+            # Reverse foreign key: one extra query for every parent at once
+            if not node.selection_set:
+                continue
+            relations = [(name, ())]
+            if hasattr(object_type, 'optimizer_relations'):
+                # The type's resolver may read other relations, or more columns
+                relations = object_type.optimizer_relations(
+                    name, _arguments(object_type, node, info)
+                )
+            for relation, required in relations:
+                plan.add_relation(
+                    prefix + relation,
+                    model._meta.get_field(relation),
+                    node.selection_set.selections,
+                    required,
+                )
+        elif field.concrete:
+            plan.only.add(prefix + name)
+
+
+def _object_type(model):
+    # Archived rows are served as their hot model's type (projects.archive)
+    return get_global_registry().get_type_for_model(HOT_MODELS.get(model, model))
+
+
+def _arguments(object_type, node, info):
+    field = info.schema.get_type(object_type._meta.name).fields[node.name.value]
+    return get_argument_values(field, node, info.variable_values)
+
+
+def collect_fields(selections, fragments):
+    """Flatten fragments into the plain field nodes they select"""
+    for selection in selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            yield from collect_fields(fragment.selection_set.selections, fragments)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from collect_fields(selection.selection_set.selections, fragments)
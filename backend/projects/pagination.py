@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+from graphql import GraphQLError
+from graphene.relay import PageInfo
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(obj):
+    """Opaque cursor for a row's (created_at, id) position"""
+    position = json.dumps([obj.created_at.isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def page_size(first):
+    """`first` checked against MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE when omitted"""
+    if first is None:
+        return DEFAULT_PAGE_SIZE
+    if not 0 <= first <= MAX_PAGE_SIZE:
+        raise GraphQLError(f"first must be between 0 and {MAX_PAGE_SIZE}")
+    return first
+
+
+def page_rows(queryset, first, after=None):
+    """
+    Up to first + 1 rows of queryset following the `after` cursor, ordered
+    by (created_at, id) in the direction of the model's Meta.ordering.
+
+    `after` becomes a keyset WHERE clause rather than an OFFSET, so every
+    page costs the same no matter how deep it is.
+    """
+    descending = queryset.model._meta.ordering[0].startswith('-')
+    if descending:
+        queryset = queryset.order_by('-created_at', '-id')
+    else:
+        queryset = queryset.order_by('created_at', 'id')
+
+    if after:
+        created_at, pk = decode_cursor(after)
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'created_at__{op}': created_at})
+            | Q(created_at=created_at, **{f'id__{op}': pk})
+        )
+
+    # One extra row tells us whether there is a next page
+    return list(queryset[:first + 1])
+
+
+def connection(rows, connection_type, first, after=None):
+    """The Relay connection of a page from page_rows()"""
+    has_next_page = len(rows) > first
+    rows = rows[:first]
+
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row))
+        for row in rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=has_next_page,
+            has_previous_page=bool(after),
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+    )
+
+
+def paginate(queryset, connection_type, first=None, after=None):
+    """Return one keyset page of queryset (see page_rows()) as a Relay connection"""
+    first = page_size(first)
+    return connection(page_rows(queryset, first, after), connection_type, first, after)
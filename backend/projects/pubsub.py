@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils.module_loading import import_string
+
+# Actions carried by change events
+CREATED = 'CREATED'
+UPDATED = 'UPDATED'
+
+
+# Brokers
+#
+# publish() is called from sync code (mutations, any thread) with a string;
+# subscribe() is an async generator yielding every string published on the
+# topic after it started. A custom broker just needs these two methods and
+# is selected with GRAPHQL_SUBSCRIPTIONS_BROKER = 'path.to.Class'.
+
+class InMemoryBroker:
+    """Delivers within one process: only for a single node/worker"""
+
+    # Events kept for a subscriber that isn't reading; later ones are dropped
+    MAX_PENDING = 1000
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, topic, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    @staticmethod
+    def _put(queue, message):
+        if not queue.full():
+            queue.put_nowait(message)
+
+    async def subscribe(self, topic):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.MAX_PENDING))
+        with self._lock:
+            self._subscribers[topic].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[topic].discard(subscriber)
+                if not self._subscribers[topic]:
+                    del self._subscribers[topic]
+
+
+class RedisBroker:
+    """Redis pub/sub, for several workers or nodes (needs the redis package)"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("The redis broker needs the 'redis' package")
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, topic, message):
+        self.client.publish(f'gql:{topic}', message)
+
+    async def subscribe(self, topic):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(f'gql:{topic}')
+        try:
+            async for event in pubsub.listen():
+                if event['type'] == 'message':
+                    yield event['data'].decode()
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_config = None
+
+
+def get_broker():
+    """The configured broker, or None when subscriptions are off"""
+    global _broker, _broker_config
+
+    config = (settings.GRAPHQL_SUBSCRIPTIONS_BROKER, settings.GRAPHQL_SUBSCRIPTIONS_REDIS_URL)
+    if config != _broker_config:
+        kind, redis_url = config
+        if kind == 'memory':
+            _broker = InMemoryBroker()
+        elif kind == 'redis':
+            _broker = RedisBroker(redis_url)
+        elif not kind:
+            _broker = None
+        else:
+            _broker = import_string(kind)()
+        _broker_config = config
+    return _broker
+
+
+# Topics: one per thing a client can watch, so it only gets those events
+
+def task_topic(project_id):
+    return f'tasks:project:{project_id}'
+
+
+def comment_topic(task_id):
+    return f'comments:task:{task_id}'
+
+
+def project_topic(organization_id):
+    return f'projects:organization:{organization_id}'
+
+
+# Events carry the row itself, so subscribers don't have to query for it
+
+def encode(obj, action, fields=None):
+    values = {
+        field.attname: field.value_from_object(obj)
+        for field in obj._meta.concrete_fields
+    }
+    return json.dumps(
+        # The database (shard) it was written to, where its relations are
+        {'action': action, 'fields': fields, 'values': values, 'db': obj._state.db},
+        cls=DjangoJSONEncoder,
+    )
+
+
+def decode(model, message):
+    """Return (action, changed field names or None, instance) for an event"""
+    event = json.loads(message)
+    fields = model._meta.concrete_fields
+    obj = model.from_db(
+        event.get('db', 'default'),
+        [field.attname for field in fields],
+        [field.to_python(event['values'][field.attname]) for field in fields],
+    )
+    return event['action'], event['fields'], obj
+
+
+def _publish_on_commit(topic, obj, action, fields=None):
+    broker = get_broker()
+    if broker is not None:
+        message = encode(obj, action, fields)
+        # Only announce what was committed
+        transaction.on_commit(
+            lambda: broker.publish(topic, message),
+            using=router.db_for_write(type(obj), instance=obj),
+        )
+
+
+def publish_task(task, action, fields=None):
+    _publish_on_commit(task_topic(task.project_id), task, action, fields)
+
+
+def publish_comment(comment):
+    _publish_on_commit(comment_topic(comment.task_id), comment, CREATED)
+
+
+def publish_project(project, action, fields=None):
+    _publish_on_commit(project_topic(project.organization_id), project, action, fields)
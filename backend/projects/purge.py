@@ -0,0 +1,83 @@
+from django.db import router, transaction
+from .caching import invalidate_all
+from .models import (
+    ArchivedTask, ArchivedTaskComment, Organization, OrganizationStats, Project, Task, TaskComment,
+)
+from .sharding import forget_organization
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _delete_in_chunks(queryset, chunk_size, report):
+    """
+    Delete rows matching queryset in primary key chunks, one transaction each.
+
+    Uses a raw DELETE ... WHERE id IN (SELECT id ... LIMIT n): no rows are
+    loaded into Python and no signals or cascades run, so the caller must
+    delete children first. Each chunk commits on its own to keep locks and
+    transaction size small; a purge interrupted halfway can simply be rerun.
+    """
+    deleted = 0
+    ids = queryset.order_by('pk').values('pk')
+    while True:
+        with transaction.atomic(using=queryset.db):
+            count = queryset.model.objects.filter(pk__in=ids[:chunk_size])._raw_delete(queryset.db)
+        if not count:
+            return deleted
+        deleted += count
+        report(deleted)
+
+
+def purge_organization(organization, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Delete an organization and everything under it without the deletion collector.
+
+    Comments, tasks (archived ones first) and projects are deleted
+    bottom-up in chunks, then the organization row itself and its shard
+    directory entry. `progress(model_name, deleted, total)` is called
+    after every chunk. Task counters aren't adjusted: their projects go too.
+    Returns {model_name: rows deleted}.
+    """
+    if progress is None:
+        progress = lambda name, deleted, total: None
+
+    projects = Project.objects.filter(organization=organization)
+    tasks = Task.objects.filter(project__organization=organization)
+    comments = TaskComment.objects.filter(task__project__organization=organization)
+    archived_tasks = ArchivedTask.objects.filter(project__organization=organization)
+    archived_comments = ArchivedTaskComment.objects.filter(task__project__organization=organization)
+
+    archived_total = archived_tasks.count()
+
+    steps = [
+        ('archived comments', archived_comments, archived_comments.count()),
+        ('archived tasks', archived_tasks, archived_total),
+        ('comments', comments, comments.count()),
+        # The stored counters give the task total without a COUNT over tasks;
+        # they include the archived ones
+        (
+            'tasks',
+            tasks,
+            sum(p.task_count for p in projects.only(*Project.COUNTER_FIELDS)) - archived_total,
+        ),
+        ('projects', projects, projects.count()),
+    ]
+
+    deleted = {}
+    for name, queryset, total in steps:
+        deleted[name] = _delete_in_chunks(
+            queryset, chunk_size, lambda count: progress(name, count, total)
+        )
+
+    # On the organization's shard (run inside projects.sharding.using_shard())
+    db = router.db_for_write(Organization)
+    with transaction.atomic(using=db):
+        OrganizationStats.objects.filter(organization=organization)._raw_delete(db)
+        deleted['organizations'] = (
+            Organization.objects.filter(pk=organization.pk)._raw_delete(db)
+        )
+        invalidate_all()
+    # Else a new organization with its slug would be taken for this one
+    forget_organization(organization)
+    progress('organizations', deleted['organizations'], 1)
+    return deleted
@@ -0,0 +1,182 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import (
+    ArchivedTask, ArchivedTaskComment, Organization, OrganizationStats, Project, ShardAssignment,
+    Task, TaskComment,
+)
+from .purge import purge_organization
+from .sharding import lock_organization, reserve_ids, shard_for_slug, using_shard
+
+# Moving an organization to another shard (projects.sharding) while it is
+# in use. Its rows are copied with their ids, in primary key batches, while
+# reads and writes carry on at the source; a second pass copies what
+# changed meanwhile. Then writes are refused (the directory marks it
+# `moving`), and once those under way have committed (they hold a shared
+# lock on the organization's row, see projects.sharding), the final pass
+# copies what changed since and deletes what went away at the source. The
+# directory then points at the target, and the source rows are purged.
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Each model with the path to its organization, parents before children
+TREE = (
+    (Organization, 'pk'),
+    (OrganizationStats, 'organization_id'),
+    (Project, 'organization_id'),
+    (Task, 'project__organization_id'),
+    (TaskComment, 'task__project__organization_id'),
+    (ArchivedTask, 'project__organization_id'),
+    (ArchivedTaskComment, 'task__project__organization_id'),
+)
+
+# Few rows, and counters that change without touching updated_at: the
+# final pass copies them whole
+SMALL = (Organization, OrganizationStats, Project)
+
+
+def _upsert(model, rows, alias):
+    """INSERT rows (tuples of every column), updating those whose id is already there"""
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    columns = ', '.join(qn(field.column) for field in fields)
+    updates = ', '.join(
+        f'{qn(field.column)} = excluded.{qn(field.column)}'
+        for field in fields if not field.primary_key
+    )
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({columns}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"ON CONFLICT ({qn(model._meta.pk.column)}) DO UPDATE SET {updates}"
+    )
+    # Not bulk_create(): auto_now fields would get the time of the copy
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _copy(queryset, target, batch_size):
+    """Copy the rows of a queryset to the target database in primary key batches"""
+    names = [field.attname for field in queryset.model._meta.concrete_fields]
+    pk_index = names.index(queryset.model._meta.pk.attname)
+    copied = 0
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch.values_list(*names)[:batch_size])
+        if not rows:
+            return copied
+        _upsert(queryset.model, rows, target)
+        copied += len(rows)
+        last_pk = rows[-1][pk_index]
+
+
+def _copy_pass(organization_id, source, target, since, until, batch_size, progress):
+    """
+    Copy the rows created before `until`, and changed since `since`. A child
+    created after its parent's turn waits for the next pass, so that every
+    batch commits with its parents already there.
+    """
+    for model, path in TREE:
+        rows = model.objects.using(source).filter(**{path: organization_id})
+        if model is not OrganizationStats:
+            rows = rows.filter(created_at__lt=until)
+            if since is not None:
+                rows = rows.filter(updated_at__gte=since)
+        copied = _copy(rows, target, batch_size)
+        progress('copy' if since is None else 'catch up', model._meta.verbose_name_plural, copied)
+
+
+def _final_pass(organization_id, source, target, since, batch_size, progress):
+    """With writes stopped: copy what changed or appeared since `since`, delete what went away"""
+    gone = []
+    for model, path in TREE:
+        rows = model.objects.filter(**{path: organization_id})
+        if model in SMALL:
+            copied = _copy(rows.using(source), target, batch_size)
+        else:
+            # Archiving moves tasks between tables keeping their updated_at,
+            # so compare the ids too
+            ids = set(rows.using(source).values_list('pk', flat=True))
+            copied_ids = set(rows.using(target).values_list('pk', flat=True))
+            changed = ids - copied_ids
+            changed.update(
+                rows.using(source).filter(updated_at__gte=since).values_list('pk', flat=True)
+            )
+            changed = sorted(changed)
+            copied = 0
+            for start in range(0, len(changed), batch_size):
+                copied += _copy(
+                    model.objects.using(source).filter(pk__in=changed[start:start + batch_size]),
+                    target,
+                    batch_size,
+                )
+            gone.append((model, sorted(copied_ids - ids)))
+        progress('sync', model._meta.verbose_name_plural, copied)
+
+    # Children first: raw deletes don't cascade
+    for model, ids in reversed(gone):
+        with transaction.atomic(using=target):
+            for start in range(0, len(ids), batch_size):
+                chunk = ids[start:start + batch_size]
+                model.objects.using(target).filter(pk__in=chunk)._raw_delete(target)
+        if ids:
+            progress('delete', model._meta.verbose_name_plural, len(ids))
+
+
+def _assign(organization, shard, moving):
+    ShardAssignment.objects.update_or_create(
+        organization_id=organization.pk,
+        defaults={'slug': organization.slug, 'shard': shard, 'moving': moving},
+    )
+
+
+def move_organization(slug, target, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Move an organization and everything under it to the `target` shard, as
+    described at the top of this module. Writes to it are refused while the
+    final pass runs; reads never stop. `progress(step, name, rows)` is
+    called after each model of each pass. An interrupted move can simply be
+    rerun. Returns {name: rows deleted} from the source.
+    """
+    if progress is None:
+        progress = lambda step, name, rows: None
+    if target not in settings.DATABASE_SHARDS:
+        raise ValueError(
+            f"Unknown shard {target!r}, expected one of {', '.join(settings.DATABASE_SHARDS)}"
+        )
+    source, moving, _ = shard_for_slug(slug)
+    if moving:
+        # An interrupted move: the directory still says where it is
+        ShardAssignment.objects.filter(slug=slug).update(moving=False)
+    if source == target:
+        raise ValueError(f"Organization '{slug}' is already on {target}")
+    organization = Organization.objects.using(source).get(slug=slug)
+    if Organization.objects.using(target).filter(slug=slug).exclude(pk=organization.pk).exists():
+        raise ValueError(f"Another organization has the slug '{slug}' on {target}")
+
+    reserve_ids(target)
+    copied_until = timezone.now()
+    _copy_pass(organization.pk, source, target, None, copied_until, batch_size, progress)
+    caught_up = timezone.now()
+    _copy_pass(organization.pk, source, target, copied_until, caught_up, batch_size, progress)
+
+    _assign(organization, source, moving=True)
+    try:
+        # Wait for the writes that passed the check before the flag was set
+        with transaction.atomic(using=source):
+            lock_organization(source, organization.pk, exclusive=True)
+        _final_pass(organization.pk, source, target, caught_up, batch_size, progress)
+    except BaseException:
+        _assign(organization, source, moving=False)
+        raise
+    _assign(organization, target, moving=False)
+
+    with using_shard(source):
+        return purge_organization(organization, chunk_size=batch_size)
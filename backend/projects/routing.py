@@ -0,0 +1,271 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Replicas are only read from while serving a request (ReplicaRoutingMiddleware);
+# management commands, migrations and subscriptions use the primary.
+#
+# Within a request, reads go to one healthy replica, picked when the request
+# first reads, unless the request is pinned to the primary: because it has
+# written to this app's tables (or its client did within
+# DATABASE_READ_YOUR_WRITES_SECONDS, as told by PRIMARY_COOKIE), or while a
+# transaction is open on the primary.
+
+PRIMARY_COOKIE = 'use_primary_until'
+
+
+class RoutingState:
+    """Where one request's reads go. Shared by the threads resolving it."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+# The RoutingState of the request being served, if any. Context variables are
+# copied into sync_to_async threads, which then share the same state object.
+current_routing = ContextVar('current_routing', default=None)
+
+
+@contextmanager
+def request_routing(pinned=False):
+    """Route the reads run inside as one request's, yielding its RoutingState"""
+    state = RoutingState(pinned)
+    token = current_routing.set(state)
+    try:
+        yield state
+    finally:
+        current_routing.reset(token)
+
+
+def pin_primary():
+    """Send the rest of this request's reads, and its client's next ones, to the primary"""
+    state = current_routing.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+class ReplicaHealth:
+    """
+    Whether each replica answers, checked at most every `interval` seconds
+    per replica (on whichever thread asks). With `max_lag` set, a Postgres
+    replica replaying WAL more than that many seconds behind also counts
+    as down.
+    """
+
+    def __init__(self, interval, max_lag=0):
+        self.interval = interval
+        self.max_lag = max_lag
+        self.checks = {}  # alias: (healthy, checked at, error)
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        with self._lock:
+            checked = self.checks.get(alias)
+        if checked is not None and time.monotonic() - checked[1] < self.interval:
+            return checked[0]
+        error = self.check(alias)
+        if error is not None:
+            logger.warning("Database replica %s is unavailable: %s", alias, error)
+        with self._lock:
+            self.checks[alias] = (error is None, time.monotonic(), error)
+        return error is None
+
+    def check(self, alias):
+        """None if the replica can serve reads, else why not"""
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql' and self.max_lag:
+                    # NULL when not a standby, or nothing replayed yet
+                    cursor.execute(
+                        "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+                    )
+                    (lag,) = cursor.fetchone()
+                    if lag is not None and lag > self.max_lag:
+                        return f"replication lag {lag:.1f}s"
+                else:
+                    cursor.execute("SELECT 1")
+        except DatabaseError as e:
+            # Connect again on the next check rather than reuse a broken one
+            connection.close_if_unusable_or_obsolete()
+            return str(e) or e.__class__.__name__
+        return None
+
+    def status(self):
+        with self._lock:
+            checks = dict(self.checks)
+        return {
+            alias: {
+                'healthy': healthy,
+                'checkedSecondsAgo': round(time.monotonic() - checked_at, 1),
+                'error': error,
+            }
+            for alias, (healthy, checked_at, error) in checks.items()
+        }
+
+
+_health = None
+_health_config = None
+
+
+def get_replica_health():
+    global _health, _health_config
+
+    config = (settings.DATABASE_REPLICA_CHECK_INTERVAL, settings.DATABASE_REPLICA_MAX_LAG)
+    if config != _health_config:
+        _health = ReplicaHealth(*config)
+        _health_config = config
+    return _health
+
+
+def replica_status():
+    """{alias: health} of every configured replica, for /graphql/stats/"""
+    checks = get_replica_health().status()
+    return {alias: checks.get(alias) for alias in settings.DATABASE_REPLICAS}
+
+
+def sync_sqlite_replica(alias):
+    """
+    Copy the primary's SQLite database over the replica's, as replication
+    would: for trying replicas out locally (or in tests) with SQLite files.
+    """
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+        raise ValueError("Only SQLite replicas can be synced")
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
+
+
+def in_primary_transaction():
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ('default'); reads of a request to one of
+    settings.DATABASE_REPLICAS, as described at the top of this module,
+    falling back to the primary when none is healthy.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or state.pinned or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if in_primary_transaction():
+            # Read what the transaction is about to change from where it changes
+            return DEFAULT_DB_ALIAS
+        health = get_replica_health()
+        if state.replica is None or not health.is_healthy(state.replica):
+            healthy = [alias for alias in settings.DATABASE_REPLICAS if health.is_healthy(alias)]
+            state.replica = random.choice(healthy) if healthy else None
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        # Only the API's rows: saving a session or the admin log isn't read back
+        if state is not None and model._meta.app_label == 'projects':
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+def _routed_chunks(chunks, state):
+    """A streamed body's chunks, produced with the request's routing"""
+    iterator = iter(chunks)
+    while True:
+        token = current_routing.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            current_routing.reset(token)
+        yield chunk
+
+
+async def _routed_chunks_async(chunks, state):
+    iterator = aiter(chunks)
+    while True:
+        token = current_routing.set(state)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            current_routing.reset(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes each request's reads (see PrimaryReplicaRouter), and after one
+    that wrote, sets PRIMARY_COOKIE so that its client reads from the
+    primary for the next DATABASE_READ_YOUR_WRITES_SECONDS too: long
+    enough for the replicas to catch up with what it just wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_routing(self.pinned(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(response, state)
+
+    async def __acall__(self, request):
+        with request_routing(self.pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(response, state)
+
+    def pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def process_response(self, response, state):
+        if response.streaming:
+            # Exports are read after the view returns, as they are sent
+            if response.is_async:
+                response.streaming_content = _routed_chunks_async(response.streaming_content, state)
+            else:
+                response.streaming_content = _routed_chunks(response.streaming_content, state)
+
+        window = settings.DATABASE_READ_YOUR_WRITES_SECONDS
+        if state.wrote and window > 0:
+            samesite = settings.DATABASE_READ_YOUR_WRITES_SAMESITE
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                str(time.time() + window),
+                max_age=window,
+                httponly=True,
+                samesite=samesite,
+                # Browsers drop SameSite=None cookies that aren't Secure
+                secure=samesite == 'None',
+            )
+        return response
@@ -1,6 +1,21 @@
 import graphene
-from graphene_django import DjangoObjectType
-from .models import Organization, Project, Task, TaskComment
+from django.db import transaction
+from graphene_django import DjangoListField, DjangoObjectType
+from . import bulk
+from .archive import unarchived_comments, unarchived_tasks
+from .caching import invalidate_organization, invalidate_project, invalidate_task
+from .counters import move_project_counters, move_task_counters
+from .models import ArchivedTask, ArchivedTaskComment, Organization, Project, Task, TaskComment
+from .optimizer import is_selected, optimize, prefetch_selected
+from .pagination import connection, page_rows, page_size, paginate
+from .pubsub import CREATED, UPDATED, publish_comment, publish_project, publish_task
+from .search import search_tasks
+from .sharding import (
+    is_sharded, organization_page_rows, routed, shard_for_project, shard_for_slug,
+    shard_for_task, shard_of, using_shard,
+)
+from .stats import organization_stats, project_progress
+from .writes import lock_referenced, update_returning
 
 
 class OrganizationType(DjangoObjectType):
@@ -10,26 +25,62 @@ class OrganizationType(DjangoObjectType):
 
 
 class ProjectType(DjangoObjectType):
+    # Calculated from the stored counters, no query needed
     task_count = graphene.Int()
     completed_tasks = graphene.Int()
+    # With includeArchived, its archived tasks too (see projects.archive)
+    tasks = DjangoListField(
+        lambda: TaskType,
+        required=True,
+        include_archived=graphene.Boolean(default_value=False),
+    )
+
+    # Columns optimize() must load for the calculated fields
+    optimizer_only = {
+        'task_count': Project.COUNTER_FIELDS,
+        'completed_tasks': ('done_count',),
+    }
 
     class Meta:
         model = Project
         fields = '__all__'
 
-    # Custom field resolvers (calculated fields)
-    def resolve_task_count(self, info):
-        return self.tasks.count()
-
-    def resolve_completed_tasks(self, info):
-        return self.tasks.filter(status='DONE').count()
+    @staticmethod
+    def optimizer_relations(name, arguments):
+        # What optimize() prefetches for a selected relation, with the
+        # columns resolve_tasks() merges by
+        if name == 'tasks' and arguments['include_archived']:
+            return [('tasks', ['created_at']), ('archived_tasks', ['created_at'])]
+        return [(name, ())]
+
+    def resolve_tasks(project, info, include_archived):
+        if not include_archived:
+            return project.tasks.all()
+        if 'archived_tasks' in getattr(project, '_prefetched_objects_cache', {}):
+            # Both loaded with the project, in the root field's thread on
+            # the async endpoint
+            tasks = list(project.tasks.all()) + unarchived_tasks(project.archived_tasks.all())
+        else:
+            # Both tables, merged newest first: a query each, for every project
+            with using_shard(shard_of(project)):
+                tasks = list(
+                    optimize(Task.objects.filter(project=project), info, required=['created_at'])
+                )
+                tasks += unarchived(ArchivedTask.objects.filter(project=project), info)
+        return sorted(tasks, key=lambda task: (task.created_at, task.pk), reverse=True)
 
 
 class TaskType(DjangoObjectType):
+    # Read from the archive tables (includeArchived), and so read-only
+    archived = graphene.Boolean()
+
     class Meta:
         model = Task
         fields = '__all__'
 
+    def resolve_archived(task, info):
+        return getattr(task, '_archived', False)
+
 
 class TaskCommentType(DjangoObjectType):
     class Meta:
@@ -37,10 +88,104 @@ class TaskCommentType(DjangoObjectType):
         fields = '__all__'
 
 
+# Relay-style connections for the paginated list fields
+class OrganizationConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrganizationType
+
+
+class TaskConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+
+
+class TaskCommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskCommentType
+
+
+class TaskSearchConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+
+    class Edge:
+        # Relevance, higher is better; only comparable within one search
+        rank = graphene.Float()
+
+
+class ProjectStatusCountsType(graphene.ObjectType):
+    active = graphene.Int()
+    completed = graphene.Int()
+    on_hold = graphene.Int()
+    total = graphene.Int()
+
+
+class TaskStatusCountsType(graphene.ObjectType):
+    todo = graphene.Int()
+    in_progress = graphene.Int()
+    done = graphene.Int()
+    total = graphene.Int()
+
+
+class ProjectProgressType(graphene.ObjectType):
+    id = graphene.ID()
+    name = graphene.String()
+    status = graphene.String()
+    task_count = graphene.Int()
+    completed_tasks = graphene.Int()
+    progress = graphene.Float()  # completed / all tasks, 0 to 1
+
+
+class OrganizationStatsType(graphene.ObjectType):
+    organization = graphene.Field(OrganizationType)
+    projects_by_status = graphene.Field(ProjectStatusCountsType)
+    tasks_by_status = graphene.Field(TaskStatusCountsType)
+    overdue_tasks = graphene.Int()  # not DONE and past their due date
+    project_progress = graphene.List(ProjectProgressType)
+
+
+def paginate_optimized(queryset, info, connection_type, first=None, after=None):
+    """Optimize the edges' nodes and return one keyset page"""
+    queryset = optimize(queryset, info, path=('edges', 'node'), required=['created_at'])
+    return paginate(queryset, connection_type, first=first, after=after)
+
+
+def unarchived(rows, info, path=()):
+    """
+    Archived tasks or comments (projects.archive) as Task or TaskComment
+    instances, with the relations the selection below `path` reads loaded
+    """
+    rows = list(rows)
+    if rows and isinstance(rows[0], ArchivedTaskComment):
+        instances = unarchived_comments(rows)
+    else:
+        instances = unarchived_tasks(rows, with_comments=is_selected(info, 'comments', path))
+    prefetch_selected(instances, info, path)
+    return instances
+
+
+def paginate_with_archive(queryset, archived, info, connection_type, first=None, after=None):
+    """
+    paginate_optimized() over the rows of a hot table and of its archive
+    together: the page is read from both and merged in the same order.
+    """
+    first = page_size(first)
+    path = ('edges', 'node')
+    rows = page_rows(optimize(queryset, info, path=path, required=['created_at']), first, after)
+    rows += unarchived(page_rows(archived, first, after), info, path)
+    descending = queryset.model._meta.ordering[0].startswith('-')
+    rows.sort(key=lambda row: (row.created_at, row.pk), reverse=descending)
+    return connection(rows[:first + 1], connection_type, first, after)
+
+
 # Define Queries (read operations)
 class Query(graphene.ObjectType):
     # Get all organizations
-    all_organizations = graphene.List(OrganizationType)
+    all_organizations = graphene.Field(
+        OrganizationConnection,
+        first=graphene.Int(),
+        after=graphene.String()
+    )
     
     # Get single organization by slug
     organization = graphene.Field(OrganizationType, slug=graphene.String(required=True))
@@ -54,36 +199,122 @@ class Query(graphene.ObjectType):
     # Get single project
     project = graphene.Field(ProjectType, id=graphene.ID(required=True))
     
-    # Get tasks for a project
-    tasks_by_project = graphene.List(TaskType, project_id=graphene.ID(required=True))
+    # Get tasks for a project (includeArchived: archived ones too)
+    tasks_by_project = graphene.Field(
+        TaskConnection,
+        project_id=graphene.ID(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        include_archived=graphene.Boolean(default_value=False)
+    )
     
     # Get single task
-    task = graphene.Field(TaskType, id=graphene.ID(required=True))
+    task = graphene.Field(
+        TaskType,
+        id=graphene.ID(required=True),
+        include_archived=graphene.Boolean(default_value=False)
+    )
     
     # Get comments for a task
-    comments_by_task = graphene.List(TaskCommentType, task_id=graphene.ID(required=True))
+    comments_by_task = graphene.Field(
+        TaskCommentConnection,
+        task_id=graphene.ID(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        include_archived=graphene.Boolean(default_value=False)
+    )
 
-    # Resolver methods (how to fetch the data)
-    def resolve_all_organizations(self, info):
-        return Organization.objects.all()
+    # Full-text search over an organization's tasks and their comments
+    search_tasks = graphene.Field(
+        TaskSearchConnection,
+        organization_slug=graphene.String(required=True),
+        query=graphene.String(required=True),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
+
+    # Project and task totals of an organization, for its dashboard
+    organization_stats = graphene.Field(
+        OrganizationStatsType,
+        slug=graphene.String(required=True)
+    )
 
+    # Resolver methods (how to fetch the data). Each runs on the shard of
+    # the organization its arguments name (projects.sharding).
+    def resolve_all_organizations(self, info, first=None, after=None):
+        if not is_sharded():
+            return paginate_optimized(
+                Organization.objects.all(), info, OrganizationConnection,
+                first=first, after=after,
+            )
+        # A page from every shard, merged
+        first = page_size(first)
+        organizations = optimize(
+            Organization.objects.all(), info, path=('edges', 'node'), required=['created_at']
+        )
+        rows = organization_page_rows(organizations, first, after)
+        return connection(rows, OrganizationConnection, first, after)
+
+    @routed(shard_for_slug, 'slug')
     def resolve_organization(self, info, slug):
-        return Organization.objects.get(slug=slug)
+        return optimize(Organization.objects.all(), info).get(slug=slug)
 
+    @routed(shard_for_slug, 'organization_slug')
     def resolve_projects_by_organization(self, info, organization_slug):
-        return Project.objects.filter(organization__slug=organization_slug)
+        return optimize(
+            Project.objects.filter(organization__slug=organization_slug), info
+        )
 
+    @routed(shard_for_project, 'id')
     def resolve_project(self, info, id):
-        return Project.objects.get(pk=id)
-
-    def resolve_tasks_by_project(self, info, project_id):
-        return Task.objects.filter(project_id=project_id)
-
-    def resolve_task(self, info, id):
-        return Task.objects.get(pk=id)
-
-    def resolve_comments_by_task(self, info, task_id):
-        return TaskComment.objects.filter(task_id=task_id)
+        return optimize(Project.objects.all(), info).get(pk=id)
+
+    @routed(shard_for_project, 'project_id')
+    def resolve_tasks_by_project(self, info, project_id, include_archived, **page):
+        tasks = Task.objects.filter(project_id=project_id)
+        if include_archived:
+            return paginate_with_archive(
+                tasks, ArchivedTask.objects.filter(project_id=project_id), info, TaskConnection, **page
+            )
+        return paginate_optimized(tasks, info, TaskConnection, **page)
+
+    @routed(shard_for_task, 'id')
+    def resolve_task(self, info, id, include_archived):
+        try:
+            return optimize(Task.objects.all(), info).get(pk=id)
+        except Task.DoesNotExist:
+            if not include_archived:
+                raise
+        tasks = unarchived(ArchivedTask.objects.filter(pk=id), info)
+        if not tasks:
+            raise Task.DoesNotExist("Task matching query does not exist.")
+        return tasks[0]
+
+    @routed(shard_for_task, 'task_id')
+    def resolve_comments_by_task(self, info, task_id, include_archived, **page):
+        comments = TaskComment.objects.filter(task_id=task_id)
+        if include_archived:
+            archived = ArchivedTaskComment.objects.filter(task_id=task_id).select_related('task')
+            return paginate_with_archive(
+                comments, archived, info, TaskCommentConnection, **page
+            )
+        return paginate_optimized(comments, info, TaskCommentConnection, **page)
+
+    @routed(shard_for_slug, 'slug')
+    def resolve_organization_stats(self, info, slug):
+        stats = organization_stats(slug)
+        # Loaded here rather than by nested resolvers, which the async
+        # endpoint runs on the event loop. The aggregate fallback already
+        # computed the progress.
+        if 'project_progress' not in stats and is_selected(info, 'projectProgress'):
+            stats['project_progress'] = project_progress(stats['organization'].pk)
+        prefetch_selected([stats['organization']], info, path=('organization',))
+        return stats
+
+    @routed(shard_for_slug, 'organization_slug')
+    def resolve_search_tasks(self, info, organization_slug, query, **page):
+        tasks = optimize(Task.objects.all(), info, path=('edges', 'node'))
+        return search_tasks(tasks, TaskSearchConnection, organization_slug, query, **page)
 
 
 # Define Mutations (write operations)
@@ -97,6 +328,7 @@ class CreateProject(graphene.Mutation):
 
     project = graphene.Field(ProjectType)
 
+    @routed(shard_for_slug, 'organization_slug', write=True)
     def mutate(self, info, organization_slug, name, **kwargs):
         organization = Organization.objects.get(slug=organization_slug)
         project = Project.objects.create(
@@ -104,6 +336,8 @@ class CreateProject(graphene.Mutation):
             name=name,
             **kwargs
         )
+        invalidate_organization(organization.pk)
+        publish_project(project, CREATED)
         return CreateProject(project=project)
 
 
@@ -117,12 +351,15 @@ class UpdateProject(graphene.Mutation):
 
     project = graphene.Field(ProjectType)
 
+    @routed(shard_for_project, 'id', write=True)
     def mutate(self, info, id, **kwargs):
-        project = Project.objects.get(pk=id)
-        for key, value in kwargs.items():
-            if value is not None:
-                setattr(project, key, value)
-        project.save()
+        # One UPDATE of just the supplied fields, returning the row
+        fields = {key: value for key, value in kwargs.items() if value is not None}
+        if 'status' in fields:
+            move_project_counters(id, fields['status'])
+        project = update_returning(Project, id, fields)
+        invalidate_organization(project.organization_id)
+        publish_project(project, UPDATED, list(fields))
         return UpdateProject(project=project)
 
 
@@ -137,13 +374,20 @@ class CreateTask(graphene.Mutation):
 
     task = graphene.Field(TaskType)
 
+    @routed(shard_for_project, 'project_id', write=True)
     def mutate(self, info, project_id, title, **kwargs):
-        project = Project.objects.get(pk=project_id)
-        task = Task.objects.create(
-            project=project,
-            title=title,
-            **kwargs
-        )
+        # Insert by id; a missing project surfaces when its counters are
+        # bumped, and the error rolls the insert back (the FK is only
+        # checked at commit)
+        with transaction.atomic(savepoint=False):
+            task = Task.objects.create(
+                # IDs arrive as strings; store the FK as the int the project's pk is
+                project_id=Task._meta.get_field('project').to_python(project_id),
+                title=title,
+                **kwargs
+            )
+        invalidate_project(task.project_id)
+        publish_task(task, CREATED)
         return CreateTask(task=task)
 
 
@@ -158,12 +402,14 @@ class UpdateTask(graphene.Mutation):
 
     task = graphene.Field(TaskType)
 
+    @routed(shard_for_task, 'id', write=True)
     def mutate(self, info, id, **kwargs):
-        task = Task.objects.get(pk=id)
-        for key, value in kwargs.items():
-            if value is not None:
-                setattr(task, key, value)
-        task.save()
+        fields = {key: value for key, value in kwargs.items() if value is not None}
+        if 'status' in fields:
+            move_task_counters(id, fields['status'])
+        task = update_returning(Task, id, fields)
+        invalidate_task(task.pk)
+        publish_task(task, UPDATED, list(fields))
         return UpdateTask(task=task)
 
 
@@ -175,16 +421,99 @@ class CreateComment(graphene.Mutation):
 
     comment = graphene.Field(TaskCommentType)
 
+    @routed(shard_for_task, 'task_id', write=True)
     def mutate(self, info, task_id, content, author_email):
-        task = Task.objects.get(pk=task_id)
-        comment = TaskComment.objects.create(
-            task=task,
-            content=content,
-            author_email=author_email
-        )
+        task_id = TaskComment._meta.get_field('task').to_python(task_id)
+        # Insert by id, once the task is known to be there
+        with transaction.atomic(savepoint=False):
+            lock_referenced(Task, task_id)
+            comment = TaskComment.objects.create(
+                task_id=task_id,
+                content=content,
+                author_email=author_email
+            )
+        invalidate_task(comment.task_id)
+        publish_comment(comment)
         return CreateComment(comment=comment)
 
 
+# Bulk mutations: validated in one pass, written in one transaction
+class TaskInput(graphene.InputObjectType):
+    project_id = graphene.ID(required=True)
+    title = graphene.String(required=True)
+    description = graphene.String()
+    status = graphene.String()
+    assignee_email = graphene.String()
+    due_date = graphene.DateTime()
+
+
+class TaskUpdateInput(graphene.InputObjectType):
+    id = graphene.ID(required=True)
+    title = graphene.String()
+    description = graphene.String()
+    status = graphene.String()
+    assignee_email = graphene.String()
+    due_date = graphene.DateTime()
+
+
+class CommentInput(graphene.InputObjectType):
+    task_id = graphene.ID(required=True)
+    content = graphene.String(required=True)
+    author_email = graphene.String(required=True)
+
+
+class BulkItemError(graphene.ObjectType):
+    index = graphene.Int()  # Position of the item in the input list
+    message = graphene.String()
+
+
+def bulk_errors(result):
+    return [BulkItemError(index=index, message=message) for index, message in result.errors]
+
+
+class BulkCreateTasks(graphene.Mutation):
+    class Arguments:
+        tasks = graphene.List(graphene.NonNull(TaskInput), required=True)
+        # Write nothing if any item is invalid
+        all_or_nothing = graphene.Boolean(default_value=False)
+
+    tasks = graphene.List(TaskType)
+    errors = graphene.List(BulkItemError)
+
+    @routed(shard_for_project, 'tasks', 'project_id', write=True)
+    def mutate(self, info, tasks, all_or_nothing):
+        result = bulk.bulk_create_tasks(tasks, all_or_nothing)
+        return BulkCreateTasks(tasks=result.objects, errors=bulk_errors(result))
+
+
+class BulkUpdateTasks(graphene.Mutation):
+    class Arguments:
+        tasks = graphene.List(graphene.NonNull(TaskUpdateInput), required=True)
+        all_or_nothing = graphene.Boolean(default_value=False)
+
+    tasks = graphene.List(TaskType)
+    errors = graphene.List(BulkItemError)
+
+    @routed(shard_for_task, 'tasks', 'id', write=True)
+    def mutate(self, info, tasks, all_or_nothing):
+        result = bulk.bulk_update_tasks(tasks, all_or_nothing)
+        return BulkUpdateTasks(tasks=result.objects, errors=bulk_errors(result))
+
+
+class BulkCreateComments(graphene.Mutation):
+    class Arguments:
+        comments = graphene.List(graphene.NonNull(CommentInput), required=True)
+        all_or_nothing = graphene.Boolean(default_value=False)
+
+    comments = graphene.List(TaskCommentType)
+    errors = graphene.List(BulkItemError)
+
+    @routed(shard_for_task, 'comments', 'task_id', write=True)
+    def mutate(self, info, comments, all_or_nothing):
+        result = bulk.bulk_create_comments(comments, all_or_nothing)
+        return BulkCreateComments(comments=result.objects, errors=bulk_errors(result))
+
+
 # Combine all mutations
 class Mutation(graphene.ObjectType):
     create_project = CreateProject.Field()
@@ -192,6 +521,9 @@ class Mutation(graphene.ObjectType):
     create_task = CreateTask.Field()
     update_task = UpdateTask.Field()
     create_comment = CreateComment.Field()
+    bulk_create_tasks = BulkCreateTasks.Field()
+    bulk_update_tasks = BulkUpdateTasks.Field()
+    bulk_create_comments = BulkCreateComments.Field()
 
 
 # Create schema
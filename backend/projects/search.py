@@ -0,0 +1,225 @@
+import base64
+import json
+import re
+from contextlib import contextmanager
+from django.db import connection, connections, router
+from graphql import GraphQLError
+from graphene.relay import PageInfo
+from .models import Task
+from .pagination import page_size
+
+# The indexes are created by migration 0004, outside the models:
+#
+# Postgres: a tsvector column, search_vector, kept current by a trigger,
+# on projects_task (title A, description B, assignee C) and on
+# projects_taskcomment (content and author, D), each with a GIN index.
+#
+# SQLite: FTS5 tables projects_task_fts (title, description, assignee_email)
+# and projects_taskcomment_fts (content, author_email) over the real tables'
+# rows, kept in sync by triggers.
+
+SEARCH_CONFIG = 'english'
+
+# FTS5 column weights, in the proportions of Postgres' default A/B/C/D ones
+TASK_FTS_WEIGHTS = (1.0, 0.4, 0.2)
+COMMENT_FTS_WEIGHTS = (0.1, 0.1)
+
+# Table -> its FTS5 table, on SQLite
+FTS_TABLES = {
+    'projects_task': 'projects_task_fts',
+    'projects_taskcomment': 'projects_taskcomment_fts',
+}
+
+
+def is_supported():
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+@contextmanager
+def sqlite_index_deferred():
+    """
+    For bulk loads on SQLite: drop the triggers indexing rows one by one,
+    then put them back and rebuild the FTS5 tables in one pass, which is
+    several times faster. Writes by other connections meanwhile aren't
+    indexed until the rebuild. Does nothing on other databases.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (%s, %s)",
+            list(FTS_TABLES),
+        )
+        triggers = cursor.fetchall()
+        for name, _ in triggers:
+            cursor.execute(f'DROP TRIGGER {name}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in triggers:
+                cursor.execute(sql)
+            for fts in FTS_TABLES.values():
+                cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def fts5_query(text):
+    """
+    The words of `text` as an FTS5 query that matches rows containing all of
+    them. Quoting each word keeps user input from being read as FTS5 syntax.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def task_matches(text):
+    """(sql, params) selecting the ids of tasks whose own fields match"""
+    if connection.vendor == 'postgresql':
+        return (
+            "SELECT id FROM projects_task "
+            "WHERE search_vector @@ websearch_to_tsquery(%s::regconfig, %s)",
+            [SEARCH_CONFIG, text],
+        )
+    return (
+        "SELECT rowid FROM projects_task_fts WHERE projects_task_fts MATCH %s",
+        [fts5_query(text)],
+    )
+
+
+def comment_matches(text):
+    """(sql, params) selecting the ids of comments whose content or author matches"""
+    if connection.vendor == 'postgresql':
+        return (
+            "SELECT id FROM projects_taskcomment "
+            "WHERE search_vector @@ websearch_to_tsquery(%s::regconfig, %s)",
+            [SEARCH_CONFIG, text],
+        )
+    return (
+        "SELECT rowid FROM projects_taskcomment_fts WHERE projects_taskcomment_fts MATCH %s",
+        [fts5_query(text)],
+    )
+
+
+def _ranked_sql():
+    """
+    One row per matching task of an organization: (id, rank), where rank
+    is the best of the task's own match and its comments' matches.
+    """
+    if connection.vendor == 'postgresql':
+        rank = "ts_rank({}.search_vector, websearch_to_tsquery(%s::regconfig, %s))::float8"
+        match = "{}.search_vector @@ websearch_to_tsquery(%s::regconfig, %s)"
+        tasks = f"""
+            SELECT t.id, {rank.format('t')} AS rank
+            FROM projects_task t
+            JOIN projects_project p ON p.id = t.project_id
+            WHERE {match.format('t')}
+              AND p.organization_id = (SELECT id FROM projects_organization WHERE slug = %s)
+        """
+        comments = f"""
+            SELECT c.task_id, {rank.format('c')}
+            FROM projects_taskcomment c
+            JOIN projects_task t ON t.id = c.task_id
+            JOIN projects_project p ON p.id = t.project_id
+            WHERE {match.format('c')}
+              AND p.organization_id = (SELECT id FROM projects_organization WHERE slug = %s)
+        """
+    else:
+        # bm25() is lower for better matches
+        task_weights = ', '.join(str(weight) for weight in TASK_FTS_WEIGHTS)
+        comment_weights = ', '.join(str(weight) for weight in COMMENT_FTS_WEIGHTS)
+        tasks = f"""
+            SELECT t.id, -bm25(projects_task_fts, {task_weights}) AS rank
+            FROM projects_task_fts
+            JOIN projects_task t ON t.id = projects_task_fts.rowid
+            JOIN projects_project p ON p.id = t.project_id
+            WHERE projects_task_fts MATCH %s
+              AND p.organization_id = (SELECT id FROM projects_organization WHERE slug = %s)
+        """
+        comments = f"""
+            SELECT c.task_id, -bm25(projects_taskcomment_fts, {comment_weights})
+            FROM projects_taskcomment_fts
+            JOIN projects_taskcomment c ON c.id = projects_taskcomment_fts.rowid
+            JOIN projects_task t ON t.id = c.task_id
+            JOIN projects_project p ON p.id = t.project_id
+            WHERE projects_taskcomment_fts MATCH %s
+              AND p.organization_id = (SELECT id FROM projects_organization WHERE slug = %s)
+        """
+    return f"""
+        SELECT id, MAX(rank) AS rank FROM ({tasks} UNION ALL {comments}) matches
+        GROUP BY id
+    """
+
+
+def _arm_params(text, organization_slug):
+    """Parameters of one side of the UNION in _ranked_sql()"""
+    if connection.vendor == 'postgresql':
+        return [SEARCH_CONFIG, text, SEARCH_CONFIG, text, organization_slug]
+    return [fts5_query(text), organization_slug]
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(json.dumps([rank, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(pk)
+    except (ValueError, TypeError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def ranked_task_ids(organization_slug, text, limit, after=None):
+    """
+    [(task id, rank)] of an organization's tasks matching `text` in their
+    title, description, assignee or comments: best first, then by id.
+    `after` is the (rank, id) the previous page ended on.
+    """
+    if not is_supported():
+        raise GraphQLError("Search needs Postgres or SQLite")
+    if not text.strip() or (connection.vendor == 'sqlite' and not fts5_query(text)):
+        return []
+
+    params = _arm_params(text, organization_slug) * 2
+    where = ''
+    if after is not None:
+        rank, pk = after
+        where = 'WHERE rank < %s OR (rank = %s AND id > %s)'
+        params += [rank, rank, pk]
+    sql = (
+        f"SELECT id, rank FROM ({_ranked_sql()}) ranked {where} "
+        f"ORDER BY rank DESC, id LIMIT %s"
+    )
+    # Raw SQL isn't routed: read from where the ORM would read tasks
+    with connections[router.db_for_read(Task)].cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return cursor.fetchall()
+
+
+def search_tasks(queryset, connection_type, organization_slug, text, first=None, after=None):
+    """
+    One page of ranked search results as a Relay connection whose edges
+    carry the rank. Tasks are loaded from `queryset` (shaped by optimize()).
+    """
+    first = page_size(first)
+    matches = ranked_task_ids(
+        organization_slug, text, first + 1, decode_cursor(after) if after else None
+    )
+    has_next_page = len(matches) > first
+    matches = matches[:first]
+
+    tasks = queryset.order_by().in_bulk([pk for pk, _ in matches])
+    edges = [
+        connection_type.Edge(node=tasks[pk], rank=rank, cursor=encode_cursor(rank, pk))
+        for pk, rank in matches
+        if pk in tasks  # deleted since it was matched
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=has_next_page,
+            has_previous_page=bool(after),
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+    )
@@ -0,0 +1,462 @@
+import csv
+import io
+import math
+import multiprocessing
+import random
+from bisect import bisect
+from datetime import timedelta
+from itertools import accumulate
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from .counters import PROJECT_COUNTER_FIELDS
+from .models import Organization, OrganizationStats, Project, Task, TaskComment
+from .search import sqlite_index_deferred
+
+# Made-up vocabulary the generated rows are built from
+COMPANY_WORDS = [
+    'Acme', 'Blue', 'Bright', 'Cedar', 'Delta', 'Echo', 'Falcon', 'Granite', 'Harbor',
+    'Iron', 'Juniper', 'Keystone', 'Lumen', 'Maple', 'North', 'Orbit', 'Pine', 'Quartz',
+    'River', 'Summit', 'Tidal', 'Union', 'Vertex', 'Willow', 'Zenith',
+]
+COMPANY_KINDS = ['Labs', 'Studio', 'Systems', 'Partners', 'Works', 'Group', 'Digital', 'Inc']
+PROJECT_TOPICS = [
+    'Website Redesign', 'Mobile App', 'Data Platform', 'Billing Migration', 'Brand Refresh',
+    'Customer Portal', 'Onboarding Flow', 'Search', 'Analytics Dashboard', 'API Gateway',
+    'Marketing Campaign', 'Security Audit', 'Support Tooling', 'Infrastructure Upgrade',
+]
+TASK_VERBS = [
+    'Design', 'Implement', 'Review', 'Test', 'Document', 'Fix', 'Refactor', 'Deploy',
+    'Plan', 'Research', 'Update', 'Migrate',
+]
+TASK_OBJECTS = [
+    'login page', 'checkout', 'email templates', 'database schema', 'navigation',
+    'search results', 'user settings', 'reporting', 'notifications', 'permissions',
+    'landing page', 'invoices', 'file uploads', 'audit log', 'dashboard widgets',
+]
+FIRST_NAMES = [
+    'alex', 'sam', 'jordan', 'taylor', 'morgan', 'casey', 'riley', 'jamie', 'robin',
+    'avery', 'quinn', 'drew', 'kai', 'rowan', 'sasha', 'noa', 'eli', 'maya', 'omar', 'lena',
+]
+COMMENTS = [
+    "Started on this, will update by end of day.",
+    "Can we adjust the spacing in the header?",
+    "Blocked until the API change lands.",
+    "Looks good to me.",
+    "I pushed a fix, please take another look.",
+    "Moving this to next sprint.",
+    "Added screenshots to the description.",
+    "Who owns the follow-up?",
+    "Done, closing once QA signs off.",
+    "This needs a design review first.",
+]
+
+# How work is mixed: project statuses, and each one's task statuses
+PROJECT_STATUSES = [('ACTIVE', 60), ('COMPLETED', 25), ('ON_HOLD', 15)]
+TASK_STATUSES = {
+    'ACTIVE': [('TODO', 40), ('IN_PROGRESS', 25), ('DONE', 35)],
+    'COMPLETED': [('TODO', 2), ('IN_PROGRESS', 1), ('DONE', 97)],
+    'ON_HOLD': [('TODO', 60), ('IN_PROGRESS', 20), ('DONE', 20)],
+}
+# Busy tasks attract more discussion than untouched ones
+COMMENT_FACTOR = {'TODO': 0.5, 'IN_PROGRESS': 1.5, 'DONE': 1.0}
+UNASSIGNED_SHARE = 0.15
+NO_DUE_DATE_SHARE = 0.25
+
+DEFAULT_BATCH_SIZE = 10_000
+# Tasks per unit of work handed to a worker process
+UNIT_SIZE = 50_000
+
+COUNTER_BY_STATUS = dict(zip(('TODO', 'IN_PROGRESS', 'DONE'), Project.COUNTER_FIELDS))
+
+# Generated rows are tuples of these fields
+TASK_COLUMNS = (
+    'id', 'project_id', 'title', 'description', 'status', 'assignee_email', 'due_date',
+    'created_at', 'updated_at',
+)
+COMMENT_COLUMNS = ('task_id', 'content', 'author_email', 'created_at', 'updated_at')
+
+
+class Picker:
+    """Weighted random choice with precomputed cumulative weights"""
+
+    def __init__(self, weighted):
+        self.values = [value for value, _ in weighted]
+        self.cumulative = list(accumulate(weight for _, weight in weighted))
+
+    def __call__(self, rng):
+        return self.values[bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+PROJECT_STATUS = Picker(PROJECT_STATUSES)
+TASK_STATUS = {status: Picker(weights) for status, weights in TASK_STATUSES.items()}
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def allocate(total, weights, minimum=0):
+    """Split `total` in proportion to `weights` (largest remainder), each >= minimum"""
+    spare = total - minimum * len(weights)
+    scale = sum(weights)
+    shares = [spare * weight / scale for weight in weights]
+    counts = [minimum + int(share) for share in shares]
+    by_remainder = sorted(
+        range(len(weights)), key=lambda i: shares[i] - int(shares[i]), reverse=True
+    )
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def geometric(rng, mean):
+    """Number of comments: mostly none or few, occasionally long threads"""
+    if mean <= 0:
+        return 0
+    return int(math.log(1 - rng.random()) / math.log(mean / (mean + 1)))
+
+
+def plan(organizations, projects, tasks, seed):
+    """
+    Decide every organization and project, and how many tasks each gets.
+
+    Organization and project sizes follow Zipf and log-normal distributions,
+    so a few tenants and projects are much larger than the rest.
+    """
+    rng = random.Random(f'{seed}:plan')
+    org_projects = allocate(projects, zipf_weights(organizations, 0.8), minimum=1)
+    org_tasks = allocate(tasks, org_projects)
+    now = timezone.now()
+
+    orgs = []
+    for index, (project_count, task_count) in enumerate(zip(org_projects, org_tasks)):
+        name = f'{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)}'
+        slug = f'{slugify(name)}-{index}'
+        sizes = allocate(task_count, [rng.lognormvariate(0, 1.2) for _ in range(project_count)])
+        project_specs = []
+        for p, size in enumerate(sizes):
+            status = PROJECT_STATUS(rng)
+            if status == 'ACTIVE':
+                due_date = (now + timedelta(days=rng.randint(7, 180))).date()
+            elif status == 'COMPLETED':
+                due_date = (now - timedelta(days=rng.randint(1, 365))).date()
+            elif rng.random() < 0.5:
+                due_date = (now + timedelta(days=rng.randint(30, 365))).date()
+            else:
+                due_date = None
+            project_specs.append({
+                'name': f'{rng.choice(PROJECT_TOPICS)} {p + 1}',
+                'description': f'{status.replace("_", " ").title()} project for {name}',
+                'status': status,
+                'due_date': due_date,
+                'tasks': size,
+            })
+        orgs.append({
+            'name': name,
+            'slug': slug,
+            'contact_email': f'contact@{slug}.example.com',
+            'people': max(3, min(200, int(math.sqrt(task_count)))),
+            'projects': project_specs,
+        })
+    return orgs
+
+
+def generate_tasks(index, project_id, spec, people, first_task_id, seed, comments_mean, now):
+    """
+    Yield (status, task row, comment rows) for the index-th planned project.
+
+    Rows are tuples in the column order of TASK_COLUMNS / COMMENT_COLUMNS,
+    and the same for a given seed and index whatever process generates them.
+    """
+    rng = random.Random(f'{seed}:project:{index}')
+    team = rng.sample(people, min(len(people), rng.randint(3, 15)))
+    pick_member = Picker(list(zip(team, zipf_weights(len(team)))))
+    pick_status = TASK_STATUS[spec['status']]
+    project_due = spec['due_date']
+
+    for i in range(spec['tasks']):
+        task_id = first_task_id + i
+        status = pick_status(rng)
+        assignee = '' if rng.random() < UNASSIGNED_SHARE else pick_member(rng)
+
+        if rng.random() < NO_DUE_DATE_SHARE:
+            due_date = None
+        elif status == 'DONE':
+            due_date = now - timedelta(days=rng.randint(1, 120), hours=rng.randint(0, 23))
+        elif project_due is not None:
+            due_date = now.replace(
+                year=project_due.year, month=project_due.month, day=project_due.day
+            ) - timedelta(days=rng.randint(0, 30))
+        else:
+            due_date = now + timedelta(days=rng.randint(-14, 90), hours=rng.randint(0, 23))
+
+        # Created some time in the last year; the thread follows, hours apart
+        created = now - timedelta(minutes=rng.randint(60, 525_600))
+        updated = created
+        comments = []
+        participants = [member for member in (assignee, rng.choice(team)) if member]
+        for c in range(geometric(rng, comments_mean * COMMENT_FACTOR[status])):
+            updated = min(now, updated + timedelta(minutes=rng.randint(5, 2880)))
+            comments.append((
+                task_id, rng.choice(COMMENTS), participants[c % len(participants)],
+                updated, updated,
+            ))
+
+        verb, obj = rng.choice(TASK_VERBS), rng.choice(TASK_OBJECTS)
+        task = (
+            task_id, project_id, f'{verb} {obj}', f'{verb} the {obj} for {spec["name"]}',
+            status, assignee, due_date, created, updated,
+        )
+        yield status, task, comments
+
+
+class BulkCreateWriter:
+    """Batched bulk_create, for any database (timestamps become now)"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def write(self, model, columns, rows):
+        model.objects.bulk_create(
+            (model(**dict(zip(columns, row))) for row in rows), batch_size=self.batch_size
+        )
+
+
+class InsertWriter:
+    """
+    One INSERT executed for the whole batch: what bulk_create sends, without
+    building model instances or compiling SQL per row (20x faster on SQLite)
+    """
+
+    def write(self, model, columns, rows):
+        if not rows:
+            return
+        fields = [model._meta.get_field(column) for column in columns]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        # Only the datetimes need converting to what the database stores
+        datetimes = [
+            i for i, field in enumerate(fields) if field.get_internal_type() == 'DateTimeField'
+        ]
+        adapt = self.datetime_adapter()
+        if datetimes:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in datetimes:
+                    row[i] = adapt(row[i])
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    @staticmethod
+    def datetime_adapter():
+        if connection.vendor == 'sqlite' and settings.USE_TZ:
+            # adapt_datetimefield_value() for the UTC datetimes generated
+            # here, without its checks: they were half the seeding time
+            return lambda value: None if value is None else str(value.replace(tzinfo=None))
+        return connection.ops.adapt_datetimefield_value
+
+
+def copy_rows(table, columns, rows):
+    """COPY rows into a table (psycopg 2 or 3); `columns` are column names"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+        connection.ops.quote_name(table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class CopyWriter:
+    """COPY FROM STDIN, Postgres' fastest way in"""
+
+    def write(self, model, columns, rows):
+        copy_rows(
+            model._meta.db_table,
+            [model._meta.get_field(c).column for c in columns],
+            rows,
+        )
+
+
+# How rows are written: COPY on Postgres, one INSERT per batch elsewhere,
+# or plain bulk_create()
+WRITERS = ('copy', 'insert', 'bulk_create')
+
+
+def get_writer(method, batch_size):
+    if method is None:
+        method = 'copy' if connection.vendor == 'postgresql' else 'insert'
+    if method == 'copy':
+        if connection.vendor != 'postgresql':
+            raise ValueError("COPY is only available on Postgres")
+        return CopyWriter()
+    if method == 'insert':
+        return InsertWriter()
+    return BulkCreateWriter(batch_size)
+
+
+def seed_unit(unit):
+    """Write the tasks and comments of some projects; return their counters"""
+    writer = get_writer(unit['writer'], unit['batch_size'])
+    now = timezone.now()
+    counters = {}
+    tasks, comments = [], []
+    comment_count = 0
+
+    def flush():
+        nonlocal comment_count
+        # Tasks first: the comments reference them
+        writer.write(Task, TASK_COLUMNS, tasks)
+        writer.write(TaskComment, COMMENT_COLUMNS, comments)
+        comment_count += len(comments)
+        tasks.clear()
+        comments.clear()
+
+    with transaction.atomic():
+        for index, project_id, spec, people, first_task_id in unit['projects']:
+            counts = counters[project_id] = dict.fromkeys(Project.COUNTER_FIELDS, 0)
+            for status, task, task_comments in generate_tasks(
+                index, project_id, spec, people, first_task_id,
+                unit['seed'], unit['comments'], now,
+            ):
+                counts[COUNTER_BY_STATUS[status]] += 1
+                tasks.append(task)
+                comments.extend(task_comments)
+                if len(tasks) >= unit['batch_size']:
+                    flush()
+        flush()
+    return counters, comment_count
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+
+
+def seed(organizations, projects, tasks, comments=1.0, seed=0, workers=1,
+         batch_size=DEFAULT_BATCH_SIZE, writer=None, progress=None):
+    """
+    Generate organizations, `projects` and `tasks` in total, and about
+    `comments` comments per task. The same arguments always produce the
+    same data, whatever the number of workers.
+
+    Organizations and projects are inserted here; tasks and comments are
+    split into units written by `workers` processes (Postgres only, SQLite
+    has a single writer), each into IDs reserved for it up front, with
+    the `writer` method (see WRITERS; by default the fastest available).
+    Returns {'organizations', 'projects', 'tasks', 'comments'} counts.
+    """
+    if connection.vendor == 'sqlite':
+        workers = 1
+    get_writer(writer, batch_size)  # fail early on an unavailable method
+
+    orgs = plan(organizations, projects, tasks, seed)
+    taken = set(
+        Organization.objects.filter(slug__in=[org['slug'] for org in orgs])
+        .values_list('slug', flat=True)
+    )
+    if taken:
+        raise ValueError(f"Organizations already exist: {', '.join(sorted(taken))}")
+
+    with transaction.atomic():
+        org_objs = Organization.objects.bulk_create(
+            Organization(name=org['name'], slug=org['slug'], contact_email=org['contact_email'])
+            for org in orgs
+        )
+        project_objs = Project.objects.bulk_create(
+            (
+                Project(
+                    organization=org_obj,
+                    **{key: spec[key] for key in ('name', 'description', 'status', 'due_date')}
+                )
+                for org_obj, org in zip(org_objs, orgs)
+                for spec in org['projects']
+            ),
+            batch_size=batch_size,
+        )
+
+    # Reserve a block of task IDs per project, and cut the work into units
+    next_task_id = (Task.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    units = []
+    unit = None
+    specs = ((org, spec) for org in orgs for spec in org['projects'])
+    for index, (project, (org, spec)) in enumerate(zip(project_objs, specs)):
+        if unit is None or unit['tasks'] >= UNIT_SIZE:
+            unit = {
+                'projects': [], 'tasks': 0, 'seed': seed, 'comments': comments,
+                'batch_size': batch_size, 'writer': writer,
+            }
+            units.append(unit)
+        people = [
+            f'{FIRST_NAMES[i % len(FIRST_NAMES)]}{i // len(FIRST_NAMES) or ""}@{org["slug"]}.example.com'
+            for i in range(org['people'])
+        ]
+        unit['projects'].append((index, project.pk, spec, people, next_task_id))
+        unit['tasks'] += spec['tasks']
+        next_task_id += spec['tasks']
+
+    counters = {}
+    done = comment_count = 0
+
+    def collect(result, unit):
+        nonlocal done, comment_count
+        unit_counters, unit_comments = result
+        counters.update(unit_counters)
+        comment_count += unit_comments
+        done += unit['tasks']
+        if progress:
+            progress(done, tasks)
+
+    if workers > 1 and len(units) > 1:
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            for result, unit in zip(pool.imap(seed_unit, units), units):
+                collect(result, unit)
+    else:
+        # Index everything at the end rather than row by row
+        with sqlite_index_deferred():
+            for unit in units:
+                collect(seed_unit(unit), unit)
+
+    with transaction.atomic():
+        for project in project_objs:
+            for field, value in counters[project.pk].items():
+                setattr(project, field, value)
+        Project.objects.bulk_update(project_objs, Project.COUNTER_FIELDS, batch_size=1000)
+        # bulk_create() sent no signals: create the organizations' stats here
+        stats = {org.pk: OrganizationStats(organization=org) for org in org_objs}
+        for project in project_objs:
+            org_stats = stats[project.organization_id]
+            field = PROJECT_COUNTER_FIELDS[project.status]
+            setattr(org_stats, field, getattr(org_stats, field) + 1)
+            for field in Project.COUNTER_FIELDS:
+                setattr(org_stats, field, getattr(org_stats, field) + getattr(project, field))
+        OrganizationStats.objects.bulk_create(stats.values())
+        # Explicit IDs were inserted: move the sequences past them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Task, TaskComment]):
+                cursor.execute(sql)
+
+    return {
+        'organizations': len(org_objs),
+        'projects': len(project_objs),
+        'tasks': tasks,
+        'comments': comment_count,
+    }
@@ -0,0 +1,365 @@
+import functools
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import QuerySet
+from graphql import GraphQLError
+from .models import (
+    ArchivedTask, ArchivedTaskComment, Organization, Project, ShardAssignment, Task, TaskComment,
+)
+from .pagination import page_rows
+
+# Tenant sharding: every organization lives, with its stats row, projects,
+# tasks (archived ones too) and comments, on one of settings.DATABASE_SHARDS.
+# ShardAssignment, on the default database, is the directory of which one;
+# an organization without a row lives on 'default', so a single database
+# is simply the one shard and none of this costs a query.
+#
+# Root fields and mutations find the shard from their organizationSlug,
+# projectId or taskId (routed()) and run on it. Nested fields follow the
+# instances they start from: Django routes a related lookup to the database
+# its instance came from. allOrganizations reads every shard and merges.
+#
+# Each shard hands out ids from its own range (reserve_ids()), so a project
+# or task id is unique across shards and says where the row was created;
+# moved rows keep their ids. Replicas (projects.routing) serve the default
+# shard's reads.
+#
+# Writes hold a shared lock on their organization's row until they commit;
+# moving it (projects.relocate) takes it exclusively, and so waits for them.
+
+# Ids of the shard at position n of DATABASE_SHARDS start at n * SHARD_ID_SPAN
+SHARD_ID_SPAN = 10 ** 12
+
+MOVING = "This organization is being moved to another database, try again shortly"
+
+# The shard the code running in this context reads and writes. Context
+# variables are copied into sync_to_async threads, as routing's state is.
+current_shard = ContextVar('current_shard', default=DEFAULT_DB_ALIAS)
+
+
+def is_sharded():
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+@contextmanager
+def using_shard(alias, atomic=False):
+    """
+    Route the queries run inside to a shard's database. With `atomic`, in
+    one transaction on it (the default shard's writes already have one).
+    """
+    token = current_shard.set(alias)
+    try:
+        if atomic and alias != DEFAULT_DB_ALIAS:
+            with transaction.atomic(using=alias):
+                yield alias
+        else:
+            yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def shard_of(instance):
+    """The shard an instance was loaded from: 'default' for its replicas too"""
+    db = instance._state.db
+    return db if db in settings.DATABASE_SHARDS else DEFAULT_DB_ALIAS
+
+
+class ShardRouter:
+    """
+    Sends the projects app's queries to the current shard: the one their
+    instance came from, else the one using_shard() set. Queries left on the
+    default shard go on to PrimaryReplicaRouter. The directory stays on the
+    default database.
+    """
+
+    def _shard(self, model, hints):
+        if model._meta.app_label != 'projects':
+            return None
+        if model is ShardAssignment:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            shard = shard_of(instance)
+        else:
+            shard = current_shard.get()
+        return None if shard == DEFAULT_DB_ALIAS else shard
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if shard_of(obj1) != shard_of(obj2):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name == ShardAssignment._meta.model_name and app_label == 'projects':
+            return db == DEFAULT_DB_ALIAS
+        if db != DEFAULT_DB_ALIAS and db in settings.DATABASE_SHARDS:
+            # Users, sessions and the admin stay on the default database
+            return app_label == 'projects'
+        return None
+
+
+# Which shard
+
+def home_shard(pk):
+    """The shard whose id range `pk` is in (see reserve_ids())"""
+    shards = settings.DATABASE_SHARDS
+    return shards[min(max(pk // SHARD_ID_SPAN, 0), len(shards) - 1)]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# (model, path to its organization id) of the rows an id can belong to
+OWNERS = {
+    'project': ((Project, 'organization_id'),),
+    'task': ((Task, 'project__organization_id'), (ArchivedTask, 'project__organization_id')),
+}
+
+
+def _owner(kind, pk):
+    for model, field in OWNERS[kind]:
+        organization_id = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+        if organization_id is not None:
+            return organization_id
+    return None
+
+
+def _organization_id(kind, pk):
+    # Not cached: projects can be moved to another organization (the admin)
+    pk = _int(pk)
+    if pk is None:
+        return None
+    if not is_sharded():
+        return _owner(kind, pk)
+    # The shard the id was created on first: that's where most rows stay
+    home = home_shard(pk)
+    for alias in [home, *(alias for alias in settings.DATABASE_SHARDS if alias != home)]:
+        with using_shard(alias):
+            organization_id = _owner(kind, pk)
+        if organization_id is not None:
+            return organization_id
+    return None
+
+
+def organization_id_for_project(project_id):
+    """The id of a project's organization, on whichever shard; None if there's no such project"""
+    return _organization_id('project', project_id)
+
+
+def organization_id_for_task(task_id):
+    """The same for a task, archived or not"""
+    return _organization_id('task', task_id)
+
+
+def organization_id_for_slug(slug):
+    if is_sharded():
+        return shard_for_slug(slug).organization_id
+    return Organization.objects.filter(slug=slug).values_list('pk', flat=True).first()
+
+
+# The shard_for_*() lookups return where an organization lives: its shard,
+# whether it is being moved, and its id. Unknown rows are looked for on the
+# default shard, or the shard of their id, and not found there (no id).
+Location = namedtuple('Location', 'shard moving organization_id')
+
+# Everything with a single database: nothing is ever moved
+UNSHARDED = Location(DEFAULT_DB_ALIAS, False, None)
+
+
+def shard_for_organization(organization_id):
+    if not is_sharded():
+        return UNSHARDED
+    row = (
+        ShardAssignment.objects
+        .filter(organization_id=organization_id)
+        .values_list('shard', 'moving')
+        .first()
+    )
+    return Location(*(row or (DEFAULT_DB_ALIAS, False)), organization_id)
+
+
+def shard_for_slug(slug):
+    if not is_sharded():
+        return UNSHARDED
+    row = (
+        ShardAssignment.objects
+        .filter(slug=slug)
+        .values_list('shard', 'moving', 'organization_id')
+        .first()
+    )
+    if row is not None:
+        return Location(*row)
+    with using_shard(DEFAULT_DB_ALIAS):
+        organization = Organization.objects.filter(slug=slug).values_list('pk', flat=True)
+        return Location(DEFAULT_DB_ALIAS, False, organization.first())
+
+
+def shard_for_project(project_id):
+    if not is_sharded():
+        return UNSHARDED
+    organization_id = organization_id_for_project(project_id)
+    if organization_id is None:
+        return Location(home_shard(_int(project_id) or 0), False, None)
+    return shard_for_organization(organization_id)
+
+
+def shard_for_task(task_id):
+    if not is_sharded():
+        return UNSHARDED
+    organization_id = organization_id_for_task(task_id)
+    if organization_id is None:
+        return Location(home_shard(_int(task_id) or 0), False, None)
+    return shard_for_organization(organization_id)
+
+
+def forget_organization(organization):
+    """
+    Remove a deleted organization from the directory. Not when the row names
+    another shard: that's a move deleting what it left behind at its source.
+    """
+    ShardAssignment.objects.filter(
+        organization_id=organization.pk, shard=shard_of(organization)
+    ).delete()
+
+
+def lock_organization(alias, organization_id, exclusive=False):
+    """
+    Lock an organization's row on a shard until the transaction on it ends:
+    shared by the writes to the organization, exclusive to move it.
+    """
+    connection = connections[alias]
+    table = connection.ops.quote_name(Organization._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            mode = 'UPDATE' if exclusive else 'SHARE'
+            cursor.execute(f"SELECT 1 FROM {table} WHERE id = %s FOR {mode}", [organization_id])
+        else:
+            # SQLite has one lock for the whole database, which any write
+            # takes until the transaction ends
+            cursor.execute(f"UPDATE {table} SET id = id WHERE id = %s", [organization_id])
+
+
+def _argument(arguments, path):
+    # A list argument (bulk mutations) is routed by its first item
+    value = arguments
+    for name in path:
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if value is None:
+            return None
+        value = value.get(name)
+    return value
+
+
+def routed(lookup, *path, write=False):
+    """
+    Run a root resolver (or mutate) on the shard `lookup` gives for its
+    argument at `path`, e.g. routed(shard_for_project, 'project_id'). A
+    returned QuerySet stays bound to that shard. Writes run in a
+    transaction on it, holding the organization's lock (lock_organization()),
+    and are refused while the organization is moved.
+
+    A bulk mutation writes to the shard of its first item; items of
+    organizations on other shards are reported as not existing.
+    """
+    def decorator(resolve):
+        @functools.wraps(resolve)
+        def wrapper(root, info, **arguments):
+            key = _argument(arguments, path)
+            location = lookup(key) if key is not None else UNSHARDED
+            alias = location.shard
+            if write and location.moving:
+                raise GraphQLError(MOVING)
+            with using_shard(alias, atomic=write):
+                if write and location.organization_id is not None:
+                    lock_organization(alias, location.organization_id)
+                    # A move started since waits for this lock to take its own,
+                    # having marked the organization moving first
+                    if shard_for_organization(location.organization_id) != location:
+                        raise GraphQLError(MOVING)
+                result = resolve(root, info, **arguments)
+            if isinstance(result, QuerySet) and alias != DEFAULT_DB_ALIAS:
+                result = result.using(alias)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def organization_page_rows(queryset, first, after=None):
+    """
+    page_rows() of an Organization queryset across all the shards: a page
+    from each, merged. Being copied, an organization is on two shards for a
+    while; only the one the directory names is kept.
+    """
+    rows = []
+    for alias in settings.DATABASE_SHARDS:
+        with using_shard(alias):
+            rows += [(alias, row) for row in page_rows(queryset, first, after)]
+    shards = dict(
+        ShardAssignment.objects
+        .filter(organization_id__in={row.pk for _, row in rows})
+        .values_list('organization_id', 'shard')
+    )
+    rows = [row for alias, row in rows if shards.get(row.pk, DEFAULT_DB_ALIAS) == alias]
+    rows.sort(key=lambda row: (row.created_at, row.pk), reverse=True)
+    return rows[:first + 1]
+
+
+# Models with an id sequence per shard
+SEQUENCED_MODELS = (Organization, Project, Task, TaskComment, ArchivedTask, ArchivedTaskComment)
+
+
+def reserve_ids(alias):
+    """
+    Make a shard hand out ids from its range: position in DATABASE_SHARDS
+    times SHARD_ID_SPAN (the default shard starts at 0, as before). Run
+    after migrating a new shard; sequences already past the start are
+    left alone.
+    """
+    start = settings.DATABASE_SHARDS.index(alias) * SHARD_ID_SPAN
+    if not start:
+        return
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in SEQUENCED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {qn(table)})))",
+                    [table, start],
+                )
+            elif connection.vendor == 'sqlite':
+                # AUTOINCREMENT tables continue from sqlite_sequence, or
+                # their largest id if that's higher
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [start, table]
+                )
+                if not cursor.rowcount:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start]
+                    )
+            else:
+                raise ValueError(f"Can't reserve ids on {connection.vendor}")
+
+
+def reserve_shard_ids(using, **kwargs):
+    """post_migrate: give a newly migrated shard its id range"""
+    if using != DEFAULT_DB_ALIAS and using in settings.DATABASE_SHARDS:
+        reserve_ids(using)
@@ -0,0 +1,103 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .counters import (
+    COUNTER_FIELDS,
+    PROJECT_COUNTER_FIELDS,
+    adjust_organization_stats,
+    adjust_task_counters,
+)
+from .models import Organization, OrganizationStats, Project, ShardAssignment, Task
+from .sharding import forget_organization, is_sharded
+
+
+@receiver(post_save, sender=Organization)
+def create_organization_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        OrganizationStats.objects.create(organization=instance)
+
+
+@receiver(post_save, sender=Organization)
+def update_shard_directory(sender, instance, created, raw, **kwargs):
+    # The directory finds organizations by slug too
+    if not created and not raw and is_sharded():
+        (
+            ShardAssignment.objects
+            .filter(organization_id=instance.pk)
+            .exclude(slug=instance.slug)
+            .update(slug=instance.slug)
+        )
+
+
+@receiver(post_delete, sender=Organization)
+def remove_from_shard_directory(sender, instance, **kwargs):
+    if is_sharded():
+        forget_organization(instance)
+
+
+@receiver(pre_save, sender=Project)
+def remember_counted_project(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding or hasattr(instance, '_counted'):
+        return
+    instance._counted = (
+        Project.objects.filter(pk=instance.pk).values_list('organization_id', 'status').first()
+    )
+
+
+@receiver(post_save, sender=Project)
+def update_organization_stats_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counted', None)
+    new = (instance.organization_id, instance.status)
+    if old != new:
+        changes = [(new[0], PROJECT_COUNTER_FIELDS.get(new[1]), 1)]
+        if old is not None:
+            changes.append((old[0], PROJECT_COUNTER_FIELDS.get(old[1]), -1))
+        if old is not None and old[0] != new[0]:
+            # Moved to another organization: so did its tasks
+            counts = Project.objects.filter(pk=instance.pk).values(*Project.COUNTER_FIELDS).get()
+            for field, count in counts.items():
+                changes += [(old[0], field, -count), (new[0], field, count)]
+        adjust_organization_stats(changes)
+    instance._counted = new
+
+
+@receiver(post_delete, sender=Project)
+def update_organization_stats_on_delete(sender, instance, **kwargs):
+    # Its tasks were deleted first and took their counts with them
+    old = getattr(instance, '_counted', (instance.organization_id, instance.status))
+    adjust_organization_stats([(old[0], PROJECT_COUNTER_FIELDS.get(old[1]), -1)])
+
+
+@receiver(pre_save, sender=Task)
+def remember_counted_task(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding or hasattr(instance, '_counted'):
+        return
+    # Loaded without project/status (e.g. .only()), look up what was counted
+    instance._counted = (
+        Task.objects.filter(pk=instance.pk).values_list('project_id', 'status').first()
+    )
+
+
+@receiver(post_save, sender=Task)
+def update_counters_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counted', None)
+    new = (instance.project_id, instance.status)
+    if old != new:
+        changes = [(*new, 1)]
+        if old is not None:
+            changes.append((*old, -1))
+        updated = adjust_task_counters(changes)
+        if created and not updated and instance.status in COUNTER_FIELDS:
+            # The FK check is deferred to commit; the counter UPDATE
+            # matching no row already tells us the project is missing
+            raise Project.DoesNotExist("Project matching query does not exist.")
+    instance._counted = new
+
+
+@receiver(post_delete, sender=Task)
+def update_counters_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_counted', (instance.project_id, instance.status))
+    adjust_task_counters([(*old, -1)])
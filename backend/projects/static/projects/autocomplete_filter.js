@@ -0,0 +1,14 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist filtered by the object picked in an
+    // AutocompleteFilter (select2 fires jQuery events, not DOM ones)
+    $(document).on('change', 'select.autocomplete-filter', function() {
+        const url = new URL(this.dataset.queryString, window.location.href);
+        if (this.value) {
+            url.searchParams.set(this.dataset.parameter, this.value);
+        }
+        window.location.href = url.href;
+    });
+}
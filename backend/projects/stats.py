@@ -0,0 +1,160 @@
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .counters import COUNTER_FIELDS
+from .models import ArchivedTask, Organization, OrganizationStats, Project, Task
+
+# Tasks with work left, so overdue once past their due date
+OPEN_STATUSES = ('TODO', 'IN_PROGRESS')
+
+
+def overdue_tasks(organization, now):
+    """
+    Count of an organization's open tasks due before `now`, as a subquery.
+    Being overdue changes with time, so it can't be a stored counter; the
+    (project, status, due_date) index makes it a range scan per project.
+    Archived tasks belong to completed projects, which nothing is due for.
+    """
+    overdue = (
+        Task.objects
+        .filter(project__organization=organization, status__in=OPEN_STATUSES, due_date__lt=now)
+        .order_by()
+        .values('project__organization')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(overdue, output_field=IntegerField()), 0)
+
+
+def _by_status(active, completed, on_hold, todo, in_progress, done):
+    return {
+        'projects_by_status': {
+            'active': active,
+            'completed': completed,
+            'on_hold': on_hold,
+            'total': active + completed + on_hold,
+        },
+        'tasks_by_status': {
+            'todo': todo,
+            'in_progress': in_progress,
+            'done': done,
+            'total': todo + in_progress + done,
+        },
+    }
+
+
+def _progress(pk, name, status, task_count, completed_tasks):
+    return {
+        'id': pk,
+        'name': name,
+        'status': status,
+        'task_count': task_count,
+        'completed_tasks': completed_tasks,
+        'progress': completed_tasks / task_count if task_count else 0.0,
+    }
+
+
+def organization_stats(slug, now=None):
+    """
+    {organization, projects_by_status, tasks_by_status, overdue_tasks} of
+    an organization, in one query: its OrganizationStats row, joined, with
+    the overdue count as a subquery. Without a stats row it falls back to
+    aggregate_organization_stats(). Raises Organization.DoesNotExist.
+    """
+    now = now or timezone.now()
+    organization = (
+        Organization.objects
+        .select_related('stats')
+        .annotate(overdue_tasks=overdue_tasks(OuterRef('pk'), now))
+        .get(slug=slug)
+    )
+    try:
+        stats = organization.stats
+    except OrganizationStats.DoesNotExist:
+        return aggregate_organization_stats(organization, now)
+    return {
+        'organization': organization,
+        'overdue_tasks': organization.overdue_tasks,
+        **_by_status(
+            stats.active_projects, stats.completed_projects, stats.on_hold_projects,
+            stats.todo_count, stats.in_progress_count, stats.done_count,
+        ),
+    }
+
+
+def project_progress(organization_id):
+    """Task totals of each of an organization's projects, newest first, from their counters"""
+    projects = (
+        Project.objects
+        .filter(organization_id=organization_id)
+        .order_by('-created_at', '-id')
+        .values_list('pk', 'name', 'status', *COUNTER_FIELDS.values())
+    )
+    return [
+        _progress(pk, name, status, todo + in_progress + done, done)
+        for pk, name, status, todo, in_progress, done in projects
+    ]
+
+
+def aggregate_organization_stats(organization, now=None):
+    """
+    The same stats, project_progress included, computed from the tasks
+    themselves in one GROUP BY (plus one query for the projects). The
+    fallback for organizations without a stats row; unlike the summary
+    its cost grows with the number of tasks.
+    """
+    now = now or timezone.now()
+    counts = {
+        row.pop('project_id'): row
+        for row in Task.objects
+        .filter(project__organization=organization)
+        .order_by()
+        .values('project_id')
+        .annotate(
+            **{
+                status: Count('pk', filter=Q(status=status))
+                for status in COUNTER_FIELDS
+            },
+            overdue=Count('pk', filter=Q(status__in=OPEN_STATUSES, due_date__lt=now)),
+        )
+    }
+    # Archived tasks (projects.archive) count as the counters count them
+    archived = (
+        ArchivedTask.objects
+        .filter(project__organization=organization)
+        .order_by()
+        .values('project_id')
+        .annotate(**{status: Count('pk', filter=Q(status=status)) for status in COUNTER_FIELDS})
+    )
+    for row in archived:
+        totals = counts.setdefault(
+            row['project_id'], dict.fromkeys([*COUNTER_FIELDS, 'overdue'], 0)
+        )
+        for status in COUNTER_FIELDS:
+            totals[status] += row[status]
+    projects = (
+        Project.objects
+        .filter(organization=organization)
+        .order_by('-created_at', '-id')
+        .values_list('pk', 'name', 'status')
+    )
+
+    empty = dict.fromkeys([*COUNTER_FIELDS, 'overdue'], 0)
+    totals = dict.fromkeys(['ACTIVE', 'COMPLETED', 'ON_HOLD', *COUNTER_FIELDS, 'overdue'], 0)
+    progress = []
+    for pk, name, status in projects:
+        row = counts.get(pk, empty)
+        totals[status] += 1
+        for key, count in row.items():
+            totals[key] += count
+        progress.append(_progress(pk, name, status, sum(row[s] for s in COUNTER_FIELDS), row['DONE']))
+
+    return {
+        'organization': organization,
+        'overdue_tasks': totals['overdue'],
+        'project_progress': progress,
+        **_by_status(
+            totals['ACTIVE'], totals['COMPLETED'], totals['ON_HOLD'],
+            totals['TODO'], totals['IN_PROGRESS'], totals['DONE'],
+        ),
+    }
@@ -1,3 +1,583 @@
-from django.shortcuts import render
+import hashlib
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from inspect import isawaitable
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    specified_rules,
+    validate,
+    validate_schema,
+)
+from .async_schema import async_schema
+from .caching import LRUCache, get_response_cache
+from .cost import QueryCostRule, operation_costs
+from .export import export, filename, parse_updated_since
+from .importer import MAX_REPORTED_ERRORS, Importer, open_text, records
+from .metrics import (
+    Trace,
+    connection_pool_stats,
+    current_trace,
+    metrics,
+    render_pool_stats,
+    sql_accounting,
+    wants_trace,
+)
+from .models import Organization
+from .routing import pin_primary, replica_status
+from .sharding import shard_for_slug, using_shard
 
-# Create your views here.
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def load_persisted_queries(path):
+    """Read a {sha256: query} manifest, checking every hash"""
+    if not path:
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    for key, query in manifest.items():
+        if query_hash(query) != key:
+            raise ValueError(f"Persisted query {key} doesn't match its text")
+    return manifest
+
+
+# Shared by every request: Django builds a new view instance per request
+document_cache = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+registered_queries = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+persisted_queries = load_persisted_queries(settings.GRAPHQL_PERSISTED_QUERIES_FILE)
+
+
+# A parsed and validated request, ready to execute
+PreparedRequest = namedtuple('PreparedRequest', 'schema document operation key cost')
+
+
+def persisted_query_error(message, code):
+    return GraphQLError(message, extensions={'code': code})
+
+
+def resolve_persisted_query(data, query):
+    """
+    Return (query, sha256) for a request's `query` and `extensions`,
+    following the persisted-query rules (see CachedGraphQLView)
+    """
+    extensions = data.get('extensions') or {}
+    if isinstance(extensions, str):
+        extensions = json.loads(extensions)
+    persisted = extensions.get('persistedQuery') or {}
+    requested = persisted.get('sha256Hash')
+
+    if query:
+        key = query_hash(query)
+        if requested and requested != key:
+            raise persisted_query_error(
+                "provided sha does not match query", 'PERSISTED_QUERY_HASH_MISMATCH'
+            )
+        if settings.GRAPHQL_ALLOWLIST and key not in persisted_queries:
+            raise persisted_query_error(
+                "Query is not in the allow-list", 'PERSISTED_QUERY_NOT_ALLOWED'
+            )
+        if requested and key not in persisted_queries:
+            registered_queries.set(key, query)
+        return query, key
+
+    if requested:
+        query = persisted_queries.get(requested) or registered_queries.get(requested)
+        if query is None:
+            raise persisted_query_error(
+                "PersistedQueryNotFound", 'PERSISTED_QUERY_NOT_FOUND'
+            )
+        return query, requested
+
+    return None, None
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView that parses and validates each distinct document once.
+
+    Documents are cached by the SHA-256 of their text. Clients may also
+    send only that hash (Apollo's automatic persisted queries protocol);
+    with GRAPHQL_ALLOWLIST on, only queries from the manifest are run.
+    Read-only operations are answered from the response cache when it
+    is configured (GRAPHQL_RESPONSE_CACHE).
+
+    Operations over the depth or cost limits are rejected while
+    validating; the cost of the others is sent in the response's
+    `extensions`, with resolver and SQL timings when the trace header
+    is sent. Those timings are also aggregated for /metrics/.
+    """
+
+    validation_rules = (*specified_rules, QueryCostRule)
+
+    def resolve_query(self, data, query):
+        """Return (query, sha256) for the request, following persisted-query rules"""
+        return resolve_persisted_query(data, query)
+
+    def get_document(self, query, key):
+        """Parse and validate a query, or reuse the cached result"""
+        cached = document_cache.get(key)
+        if cached is not None:
+            return cached
+
+        schema = self.schema.graphql_schema
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            cached = (None, [e], None)
+        else:
+            errors = validate(
+                schema,
+                document,
+                self.validation_rules,
+                graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+            costs = None if errors else operation_costs(schema, document)
+            cached = (document, errors, costs)
+
+        document_cache.set(key, cached)
+        return cached
+
+    def prepare_request(self, request, data, query, operation_name, show_graphiql):
+        """
+        Resolve, parse and validate the request's document.
+
+        Returns a PreparedRequest, or the result to respond with straight
+        away (an ExecutionResult with errors, or None to show GraphiQL).
+        """
+        try:
+            query, key = self.resolve_query(data, query)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors, costs = self.get_document(query, key)
+        if document is None:
+            return ExecutionResult(errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        cost = None
+        if operation_ast is not None:
+            cost = costs.get(operation_ast.name.value if operation_ast.name else None)
+        return PreparedRequest(schema, document, operation_ast, key, cost)
+
+    @contextmanager
+    def traced(self, request, prepared):
+        """Time the operation run inside, for /metrics/ and the trace header"""
+        trace = Trace(detailed=wants_trace(request))
+        token = current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+            trace.finish()
+            operation = prepared.operation
+            metrics.observe(operation.name.value if operation and operation.name else None, trace)
+
+    def with_extensions(self, result, prepared, trace):
+        extensions = {}
+        if prepared.cost is not None:
+            extensions['cost'] = {
+                'requested': prepared.cost['cost'],
+                'depth': prepared.cost['depth'],
+                'maxCost': settings.GRAPHQL_MAX_QUERY_COST,
+                'maxDepth': settings.GRAPHQL_MAX_QUERY_DEPTH,
+            }
+        if trace.detailed:
+            extensions['tracing'] = trace.as_extension()
+        result.extensions = extensions or None
+        return result
+
+    def get_response(self, request, data, show_graphiql=False):
+        # GraphQLView.get_response, answered by format_response
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+        return self.format_response(request, execution_result, id, pretty=show_graphiql)
+
+    def format_response(self, request, execution_result, id=None, pretty=False):
+        """Return (JSON body, status code), including the result's extensions"""
+        status_code = 200
+        response = {}
+
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=pretty), status_code
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def get_response_cache_key(self, prepared, operation_name, variables):
+        response_cache = get_response_cache()
+        if response_cache is None:
+            return None
+        return response_cache.get_key(
+            prepared.schema,
+            prepared.document,
+            prepared.operation,
+            prepared.key,
+            operation_name,
+            variables,
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # Same flow as GraphQLView, with parse/validate going through the cache
+        prepared = self.prepare_request(request, data, query, operation_name, show_graphiql)
+        if not isinstance(prepared, PreparedRequest):
+            return prepared
+
+        with self.traced(request, prepared) as trace, sql_accounting():
+            result = self.execute_prepared(request, prepared, variables, operation_name)
+        return self.with_extensions(result, prepared, trace)
+
+    def execute_prepared(self, request, prepared, variables, operation_name):
+        schema, document, operation_ast, key, _ = prepared
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                pin_primary()
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            cache_key = self.get_response_cache_key(prepared, operation_name, variables)
+            if cache_key is not None:
+                cached = get_response_cache().get(cache_key)
+                if cached is not None:
+                    return ExecutionResult(data=cached)
+
+            result = execute(schema, document, **execute_options)
+            if cache_key is not None and not result.errors:
+                get_response_cache().set(cache_key, result.data)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncGraphQLView(CachedGraphQLView):
+    """
+    CachedGraphQLView executing async_schema on the event loop.
+
+    Serve it from an ASGI server (uvicorn): a worker then keeps handling
+    other requests while resolvers wait on the database, and independent
+    root fields of one operation are resolved concurrently. Each mutation
+    field runs in its own transaction.
+    """
+
+    view_is_async = True
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('schema', async_schema)
+        super().__init__(**kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                # GraphiQL's page doesn't touch the database
+                return await sync_to_async(super(CachedGraphQLView, self).dispatch)(
+                    request, *args, **kwargs
+                )
+
+            if self.batch:
+                responses = [await self.get_response_async(request, entry) for entry in data]
+                result = "[{}]".format(",".join(response[0] for response in responses))
+                status_code = max((response[1] for response in responses), default=200)
+            else:
+                result, status_code = await self.get_response_async(request, data)
+
+            return HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    async def get_response_async(self, request, data):
+        # GraphQLView.get_response around the async executor
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(
+            request, data, query, variables, operation_name
+        )
+        return self.format_response(request, execution_result, id)
+
+    async def execute_graphql_request_async(
+        self, request, data, query, variables, operation_name
+    ):
+        prepared = self.prepare_request(request, data, query, operation_name, False)
+        if not isinstance(prepared, PreparedRequest):
+            return prepared
+
+        # SQL is accounted for in the threads the resolvers run in
+        with self.traced(request, prepared) as trace:
+            result = await self.execute_prepared_async(
+                request, prepared, variables, operation_name
+            )
+        return self.with_extensions(result, prepared, trace)
+
+    async def execute_prepared_async(self, request, prepared, variables, operation_name):
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            cache_key = None
+            if (
+                prepared.operation is not None
+                and prepared.operation.operation == OperationType.QUERY
+            ):
+                cache_key = await sync_to_async(self.get_response_cache_key)(
+                    prepared, operation_name, variables
+                )
+            if cache_key is not None:
+                cached = await sync_to_async(get_response_cache().get)(cache_key)
+                if cached is not None:
+                    return ExecutionResult(data=cached)
+
+            result = execute(prepared.schema, prepared.document, **execute_options)
+            if isawaitable(result):
+                result = await result
+            if cache_key is not None and not result.errors:
+                await sync_to_async(get_response_cache().set)(cache_key, result.data)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def graphql_stats(request):
+    """Cache and persisted query counters for monitoring, for the same addresses as /metrics/"""
+    if request.META.get('REMOTE_ADDR') not in settings.GRAPHQL_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    response_cache = get_response_cache()
+    return JsonResponse({
+        'documentCache': document_cache.stats(),
+        'responseCache': response_cache.backend.stats() if response_cache else None,
+        'registeredQueries': registered_queries.stats(),
+        'persistedQueries': len(persisted_queries),
+        'allowlist': settings.GRAPHQL_ALLOWLIST,
+        'replicas': replica_status(),
+        'connectionPools': connection_pool_stats(),
+    })
+
+
+def graphql_metrics(request):
+    """Operation and resolver timings, and connection pool usage, in the Prometheus text format"""
+    if request.META.get('REMOTE_ADDR') not in settings.GRAPHQL_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    body = metrics.render() + render_pool_stats(connection_pool_stats())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
+
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+async def iterate_in_thread(chunks):
+    """
+    Serve a sync iterator to an ASGI server one chunk at a time (Django would
+    otherwise read it all into memory first). Every chunk is produced in the
+    request's thread, where the database cursor lives.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (chunk := await next_chunk(chunks, done)) is not done:
+        yield chunk
+
+
+@require_GET
+def organization_export(request, slug):
+    """
+    Stream an organization's data: ?format=ndjson|csv, ?resource=projects|
+    tasks|comments (required for CSV), ?updatedSince=<ISO date/datetime>
+    for incremental exports and ?gzip=1.
+    """
+    with using_shard(shard_for_slug(slug)[0]):
+        organization = get_object_or_404(Organization, slug=slug)
+    format = request.GET.get('format', 'ndjson')
+    resource = request.GET.get('resource') or None
+    gzip = request.GET.get('gzip') in ('1', 'true')
+    # Rows changed while this runs may be missed: the next incremental
+    # export should ask for updatedSince = this time
+    started = timezone.now()
+    try:
+        chunks = export(
+            organization,
+            format=format,
+            resource=resource,
+            updated_since=parse_updated_since(request.GET.get('updatedSince')),
+            gzip=gzip,
+        )
+    except ValueError as e:
+        return JsonResponse({'errors': [{'message': str(e)}]}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+    response = StreamingHttpResponse(
+        chunks, content_type='application/gzip' if gzip else EXPORT_CONTENT_TYPES[format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename(organization, format, resource, gzip)}"'
+    )
+    response['X-Export-Started-At'] = started.isoformat()
+    return response
+
+
+@require_POST
+def import_data(request):
+    """
+    Import an uploaded NDJSON or CSV file (multipart field "file"; ?format=
+    and ?resource= as for exports). Responds with what was created and the
+    rejected rows, first MAX_REPORTED_ERRORS of them in full.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'errors': [{'message': "Upload the data as a 'file' field"}]}, status=400)
+    name = upload.name or ''
+    format = request.GET.get('format') or (
+        'csv' if name.removesuffix('.gz').endswith('.csv') else 'ndjson'
+    )
+
+    rejected = []
+
+    def reject(line, record, message):
+        if len(rejected) < MAX_REPORTED_ERRORS:
+            rejected.append({
+                'line': line,
+                'type': record.get('type') if record else None,
+                'message': message,
+            })
+
+    try:
+        rows = records(open_text(upload.file, name), format, request.GET.get('resource'))
+    except ValueError as e:
+        return JsonResponse({'errors': [{'message': str(e)}]}, status=400)
+
+    pin_primary()
+    importer = Importer(reject)
+    body = {}
+    try:
+        importer.run(rows)
+    except (UnicodeDecodeError, OSError) as e:
+        # Not UTF-8, or a broken gzip stream: the batches before it are kept
+        body['errors'] = [{'message': f"The file could not be read: {e}"}]
+    body.update({
+        'created': {
+            'projects': importer.created['project'],
+            'tasks': importer.created['task'],
+            'comments': importer.created['comment'],
+        },
+        'rejectedCount': importer.rejected,
+        'rejected': rejected,
+    })
+    return JsonResponse(body, status=400 if 'errors' in body else 200)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+from django.conf import settings
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    specified_rules,
+    subscribe,
+    validate,
+)
+from .async_schema import async_schema
+from .caching import LRUCache
+from .cost import QueryCostRule
+from .views import resolve_persisted_query
+
+# The graphql-transport-ws protocol (what the graphql-ws client speaks)
+PROTOCOL = 'graphql-transport-ws'
+
+# Close codes defined by the protocol
+BAD_REQUEST = 4400
+UNAUTHORIZED = 4401
+SUBSCRIBER_EXISTS = 4409
+TOO_MANY_INIT = 4429
+
+documents = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def get_document(query, key):
+    """Parse and validate against async_schema (which has the Subscription type)"""
+    cached = documents.get(key)
+    if cached is None:
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            cached = (None, [e])
+        else:
+            cached = (document, validate(
+                async_schema.graphql_schema, document, (*specified_rules, QueryCostRule)
+            ))
+        documents.set(key, cached)
+    return cached
+
+
+class GraphQLWebSocket:
+    """
+    One WebSocket connection speaking graphql-transport-ws.
+
+    Every `subscribe` message runs as its own task; queries and mutations
+    sent over the socket get a single result, subscriptions a result per
+    event until the client completes them or disconnects.
+    """
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.send_lock = asyncio.Lock()
+        self.acknowledged = False
+        self.operations = {}
+
+    async def send(self, message):
+        async with self.send_lock:
+            await self._send(message)
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def close(self, code, reason=''):
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    async def run(self):
+        try:
+            while True:
+                event = await self.receive()
+                if event['type'] == 'websocket.connect':
+                    if PROTOCOL not in self.scope.get('subprotocols', []):
+                        await self.send({'type': 'websocket.close', 'code': 1002})
+                        return
+                    await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+                elif event['type'] == 'websocket.receive':
+                    if not await self.handle(event.get('text') or event.get('bytes', b'').decode()):
+                        return
+                elif event['type'] == 'websocket.disconnect':
+                    return
+        finally:
+            for task in list(self.operations.values()):
+                task.cancel()
+
+    async def handle(self, text):
+        """Handle one client message; False once the connection is closed"""
+        try:
+            message = json.loads(text)
+            kind = message['type']
+        except (ValueError, KeyError, TypeError):
+            await self.close(BAD_REQUEST, "Invalid message")
+            return False
+
+        if kind == 'connection_init':
+            if self.acknowledged:
+                await self.close(TOO_MANY_INIT, "Too many initialisation requests")
+                return False
+            self.acknowledged = True
+            await self.send_json({'type': 'connection_ack'})
+        elif kind == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif kind == 'subscribe':
+            if not self.acknowledged:
+                await self.close(UNAUTHORIZED, "Unauthorized")
+                return False
+            operation_id = message.get('id')
+            if operation_id in self.operations:
+                await self.close(SUBSCRIBER_EXISTS, f"Subscriber for {operation_id} already exists")
+                return False
+            self.operations[operation_id] = asyncio.create_task(
+                self.operate(operation_id, message.get('payload') or {})
+            )
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(BAD_REQUEST, f"Unexpected message type {kind}")
+            return False
+        return True
+
+    async def operate(self, operation_id, payload):
+        try:
+            try:
+                # The same persisted-query and allow-list rules as over HTTP
+                query, key = resolve_persisted_query(payload, payload.get('query'))
+                if query is None:
+                    raise GraphQLError("Must provide query string.")
+            except GraphQLError as e:
+                document, errors = None, [e]
+            else:
+                document, errors = get_document(query, key)
+            if errors:
+                await self.send_json({
+                    'id': operation_id,
+                    'type': 'error',
+                    'payload': [error.formatted for error in errors],
+                })
+                return
+
+            schema = async_schema.graphql_schema
+            options = {
+                'variable_values': payload.get('variables'),
+                'operation_name': payload.get('operationName'),
+            }
+            operation = get_operation_ast(document, options['operation_name'])
+            if operation is not None and operation.operation == OperationType.SUBSCRIPTION:
+                results = await subscribe(schema, document, **options)
+                if isinstance(results, ExecutionResult):
+                    await self.send_next(operation_id, results)
+                else:
+                    try:
+                        async for result in results:
+                            await self.send_next(operation_id, result)
+                    finally:
+                        await results.aclose()
+            else:
+                result = execute(schema, document, **options)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                await self.send_next(operation_id, result)
+
+            await self.send_json({'id': operation_id, 'type': 'complete'})
+        except Exception as e:
+            await self.send_json({
+                'id': operation_id,
+                'type': 'error',
+                'payload': [GraphQLError(str(e)).formatted],
+            })
+        finally:
+            self.operations.pop(operation_id, None)
+
+    async def send_next(self, operation_id, result):
+        await self.send_json({'id': operation_id, 'type': 'next', 'payload': result.formatted})
+
+
+async def graphql_websocket(scope, receive, send):
+    """ASGI application for GraphQL over WebSocket"""
+    await GraphQLWebSocket(scope, receive, send).run()
@@ -0,0 +1,73 @@
+from django.db import connections, router
+from django.utils import timezone
+
+
+def update_returning(model, pk, values):
+    """
+    Set only the given fields on one row and return it, in one statement.
+
+    Runs UPDATE ... RETURNING, so no SELECT is needed before or after the
+    write. auto_now fields are bumped as save() would. Raises
+    model.DoesNotExist if there is no such row.
+    """
+    opts = model._meta
+    # Raw SQL isn't routed: write where the ORM would
+    db = router.db_for_write(model)
+    connection = connections[db]
+    values = dict(values)
+    for field in opts.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            values[field.name] = timezone.now()
+
+    if not connection.features.can_return_columns_from_insert:
+        # Backends without RETURNING: update, then read back
+        queryset = model.objects.using(db).filter(pk=pk)
+        if not queryset.update(**values):
+            raise model.DoesNotExist(f"{opts.object_name} matching query does not exist.")
+        return queryset.get()
+
+    qn = connection.ops.quote_name
+    assignments = []
+    params = []
+    for name, value in values.items():
+        field = opts.get_field(name)
+        assignments.append(f'{qn(field.column)} = %s')
+        params.append(field.get_db_prep_save(value, connection))
+    params.append(opts.pk.get_db_prep_value(pk, connection))
+
+    sql = 'UPDATE {} SET {} WHERE {} = %s RETURNING {}'.format(
+        qn(opts.db_table),
+        ', '.join(assignments),
+        qn(opts.pk.column),
+        ', '.join(qn(field.column) for field in opts.concrete_fields),
+    )
+    rows = list(model.objects.db_manager(db).raw(sql, params))
+    if not rows:
+        raise model.DoesNotExist(f"{opts.object_name} matching query does not exist.")
+    return rows[0]
+
+
+def lock_referenced(model, pk):
+    """
+    Check that a row exists before inserting one that refers to it, and keep
+    it from being deleted until the transaction ends, as the foreign key
+    check would: foreign keys are only checked at commit, too late to report
+    a missing row. Raises model.DoesNotExist if there is no such row.
+    """
+    db = router.db_for_write(model)
+    connection = connections[db]
+    if connection.vendor == 'postgresql':
+        # The lock the foreign key check takes, which doesn't block updates
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT 1 FROM {qn(model._meta.db_table)} "
+                f"WHERE {qn(model._meta.pk.column)} = %s FOR KEY SHARE",
+                [model._meta.pk.get_db_prep_value(pk, connection)],
+            )
+            exists = cursor.fetchone() is not None
+    else:
+        # SQLite has one writer at a time: the row can't go before the commit
+        exists = model.objects.using(db).filter(pk=pk).exists()
+    if not exists:
+        raise model.DoesNotExist(f"{model._meta.object_name} matching query does not exist.")
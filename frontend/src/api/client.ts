@@ -1,16 +1,54 @@
-import { ApolloClient, InMemoryCache, HttpLink } from '@apollo/client';
+import { ApolloClient, ApolloLink, InMemoryCache, HttpLink } from '@apollo/client';
+import { PersistedQueryLink } from '@apollo/client/link/persisted-queries';
+import { getMainDefinition } from '@apollo/client/utilities';
+import { OperationTypeNode } from 'graphql';
+import { SubscriptionLink } from './subscriptionLink';
 
 const httpLink = new HttpLink({
   uri: import.meta.env.VITE_API_URL || 'http://localhost:8000/graphql/',
+  // Send the backend's cookie that keeps reads on the primary after a write
+  credentials: 'include',
 });
 
+// SHA-256 of the query text, hex encoded (what the backend keys queries by)
+async function sha256(query: string): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(query));
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+// Send only the query hash once the backend has seen the query
+const persistedQueryLink = new PersistedQueryLink({ sha256 });
+
+const queryLink = persistedQueryLink.concat(httpLink);
+
+// Subscriptions need the ASGI server (ws://<host>/graphql/); without
+// VITE_WS_URL they are not sent and pages fall back to refetching
+const wsUrl = import.meta.env.VITE_WS_URL;
+const link = wsUrl
+  ? ApolloLink.split(
+      ({ query }) => {
+        const definition = getMainDefinition(query);
+        return (
+          definition.kind === 'OperationDefinition' &&
+          definition.operation === OperationTypeNode.SUBSCRIPTION
+        );
+      },
+      new SubscriptionLink(wsUrl),
+      queryLink
+    )
+  : queryLink;
+
+export const subscriptionsEnabled = Boolean(wsUrl);
+
 // Create Apollo Client
 export const client = new ApolloClient({
-  link: httpLink,
+  link,
   cache: new InMemoryCache(),
   defaultOptions: {
     watchQuery: {
       fetchPolicy: 'cache-and-network',
     },
   },
-});
\ No newline at end of file
+});
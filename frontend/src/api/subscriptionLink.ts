@@ -0,0 +1,91 @@
+import { ApolloLink } from '@apollo/client';
+import { print } from 'graphql';
+import { Observable, type Observer } from 'rxjs';
+
+// Minimal graphql-transport-ws client: one WebSocket shared by every
+// subscription, opened on first use and reopened after it closes.
+export class SubscriptionLink extends ApolloLink {
+  private url: string;
+  private socket: Promise<WebSocket> | null = null;
+  private observers = new Map<string, Observer<ApolloLink.Result>>();
+  private nextId = 0;
+
+  constructor(url: string) {
+    super();
+    this.url = url;
+  }
+
+  private connect(): Promise<WebSocket> {
+    if (!this.socket) {
+      this.socket = new Promise((resolve, reject) => {
+        const socket = new WebSocket(this.url, 'graphql-transport-ws');
+
+        socket.onopen = () => socket.send(JSON.stringify({ type: 'connection_init' }));
+
+        socket.onmessage = (event) => {
+          const message = JSON.parse(event.data);
+          const observer = this.observers.get(message.id);
+          switch (message.type) {
+            case 'connection_ack':
+              resolve(socket);
+              break;
+            case 'ping':
+              socket.send(JSON.stringify({ type: 'pong' }));
+              break;
+            case 'next':
+              observer?.next(message.payload);
+              break;
+            case 'error':
+              observer?.error(message.payload);
+              this.observers.delete(message.id);
+              break;
+            case 'complete':
+              observer?.complete();
+              this.observers.delete(message.id);
+              break;
+          }
+        };
+
+        socket.onclose = () => {
+          const error = new Error('Subscription connection closed');
+          this.socket = null;
+          this.observers.forEach((observer) => observer.error(error));
+          this.observers.clear();
+          reject(error);
+        };
+      });
+    }
+    return this.socket;
+  }
+
+  request(operation: ApolloLink.Operation): Observable<ApolloLink.Result> {
+    return new Observable<ApolloLink.Result>((observer) => {
+      const id = String(++this.nextId);
+      this.observers.set(id, observer);
+
+      this.connect().then(
+        (socket) => {
+          if (!this.observers.has(id)) return; // unsubscribed while connecting
+          socket.send(
+            JSON.stringify({
+              id,
+              type: 'subscribe',
+              payload: {
+                query: print(operation.query),
+                variables: operation.variables,
+                operationName: operation.operationName,
+              },
+            })
+          );
+        },
+        (error) => observer.error(error)
+      );
+
+      return () => {
+        if (this.observers.delete(id)) {
+          this.socket?.then((socket) => socket.send(JSON.stringify({ id, type: 'complete' })));
+        }
+      };
+    });
+  }
+}
@@ -2,7 +2,7 @@ import { useState, type FormEvent } from 'react';
 import { useQuery, useMutation } from '@apollo/client/react';
 import { GET_COMMENTS_BY_TASK } from '../../graphql/queries';
 import { CREATE_COMMENT, UPDATE_TASK } from '../../graphql/mutations';
-import type { Task, TaskComment, GetCommentsByTaskData, CreateCommentData, UpdateTaskData } from '../../types';
+import { nodes, type Task, type TaskComment, type GetCommentsByTaskData, type CreateCommentData, type UpdateTaskData } from '../../types';
 import { format } from 'date-fns';
 
 interface TaskDetailModalProps {
@@ -44,7 +44,7 @@ export default function TaskDetailModal({
     },
   });
 
-  const comments: TaskComment[] = data?.commentsByTask || [];
+  const comments: TaskComment[] = nodes(data?.commentsByTask);
 
   const handleCommentSubmit = async (e: FormEvent) => {
     e.preventDefault();
@@ -2,11 +2,19 @@ import { gql } from '@apollo/client';
 
 export const GET_ORGANIZATIONS = gql`
   query GetOrganizations {
-    allOrganizations {
-      id
-      name
-      slug
-      contactEmail
+    allOrganizations(first: 100) {
+      edges {
+        node {
+          id
+          name
+          slug
+          contactEmail
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
@@ -46,26 +54,42 @@ export const GET_PROJECT = gql`
 `;
 
 export const GET_TASKS_BY_PROJECT = gql`
-  query GetTasksByProject($projectId: ID!) {
-    tasksByProject(projectId: $projectId) {
-      id
-      title
-      description
-      status
-      assigneeEmail
-      dueDate
-      createdAt
+  query GetTasksByProject($projectId: ID!, $after: String) {
+    tasksByProject(projectId: $projectId, first: 100, after: $after) {
+      edges {
+        node {
+          id
+          title
+          description
+          status
+          assigneeEmail
+          dueDate
+          createdAt
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
 
 export const GET_COMMENTS_BY_TASK = gql`
-  query GetCommentsByTask($taskId: ID!) {
-    commentsByTask(taskId: $taskId) {
-      id
-      content
-      authorEmail
-      createdAt
+  query GetCommentsByTask($taskId: ID!, $after: String) {
+    commentsByTask(taskId: $taskId, first: 100, after: $after) {
+      edges {
+        node {
+          id
+          content
+          authorEmail
+          createdAt
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
\ No newline at end of file
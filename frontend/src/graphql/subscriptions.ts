@@ -0,0 +1,19 @@
+import { gql } from '@apollo/client';
+
+export const TASK_CHANGED = gql`
+  subscription TaskChanged($projectId: ID!) {
+    taskChanged(projectId: $projectId) {
+      action
+      changedFields
+      task {
+        id
+        title
+        description
+        status
+        assigneeEmail
+        dueDate
+        createdAt
+      }
+    }
+  }
+`;
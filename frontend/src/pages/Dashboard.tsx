@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { useQuery } from '@apollo/client/react';
 import { GET_ORGANIZATIONS, GET_PROJECTS_BY_ORG } from '../graphql/queries';
-import type { GetOrganizationsData, GetProjectsByOrgData, Organization, Project } from '../types';
+import { nodes, type GetOrganizationsData, type GetProjectsByOrgData, type Organization, type Project } from '../types';
 import ProjectList from '../components/features/ProjectList';
 import CreateProjectModal from '../components/features/CreateProjectModal';
 
@@ -23,9 +23,9 @@ export default function Dashboard() {
   });
 
   useEffect(() => {
-    const organizations = orgData?.allOrganizations;
+    const organizations = nodes(orgData?.allOrganizations);
     
-    if (organizations && organizations.length > 0 && !selectedOrg) {
+    if (organizations.length > 0 && !selectedOrg) {
       setSelectedOrg(organizations[0].slug);
     }
   }, [orgData, selectedOrg]);
@@ -51,7 +51,7 @@ export default function Dashboard() {
     );
   }
 
-  const organizations: Organization[] = orgData?.allOrganizations || [];
+  const organizations: Organization[] = nodes(orgData?.allOrganizations);
   const projects: Project[] = projectData?.projectsByOrganization || [];
 
   return (
@@ -1,8 +1,16 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useQuery } from '@apollo/client/react';
+import { subscriptionsEnabled } from '../api/client';
 import { GET_PROJECT, GET_TASKS_BY_PROJECT } from '../graphql/queries';
-import type { GetProjectData, GetTasksByProjectData, Task } from '../types';
+import { TASK_CHANGED } from '../graphql/subscriptions';
+import {
+  nodes,
+  type GetProjectData,
+  type GetTasksByProjectData,
+  type Task,
+  type TaskChangedData,
+} from '../types';
 import TaskBoard from '../components/features/TaskBoard';
 import CreateTaskModal from '../components/features/CreateTaskModal';
 
@@ -21,11 +29,42 @@ export default function ProjectDetail() {
   const { 
     data: tasksData, 
     loading: tasksLoading, 
-    refetch 
+    refetch,
+    fetchMore,
+    subscribeToMore
   } = useQuery<GetTasksByProjectData>(GET_TASKS_BY_PROJECT, {
     variables: { projectId: id },
   });
 
+  // Live updates from other users: updated tasks are merged into the cache
+  // by id, new ones are added to the board
+  useEffect(() => {
+    if (!subscriptionsEnabled || !id) return;
+    return subscribeToMore<TaskChangedData>({
+      document: TASK_CHANGED,
+      variables: { projectId: id },
+      updateQuery: (previous, { subscriptionData }) => {
+        const change = subscriptionData.data?.taskChanged;
+        const connection = previous.tasksByProject;
+        if (
+          !change ||
+          change.action !== 'CREATED' ||
+          !connection?.edges ||
+          connection.edges.some((edge) => edge?.node?.id === change.task.id)
+        ) {
+          return previous as GetTasksByProjectData;
+        }
+        return {
+          ...previous,
+          tasksByProject: {
+            ...connection,
+            edges: [{ node: change.task }, ...connection.edges],
+          },
+        } as GetTasksByProjectData;
+      },
+    });
+  }, [id, subscribeToMore]);
+
   if (projectLoading) {
     return (
       <div className="flex items-center justify-center min-h-screen bg-gray-50">
@@ -51,7 +90,23 @@ export default function ProjectDetail() {
   }
 
   const project = projectData.project;
-  const tasks: Task[] = tasksData?.tasksByProject || [];
+  const tasks: Task[] = nodes(tasksData?.tasksByProject);
+  const pageInfo = tasksData?.tasksByProject.pageInfo;
+
+  // Append the next page of tasks after the current end cursor
+  const loadMoreTasks = () =>
+    fetchMore({
+      variables: { after: pageInfo?.endCursor },
+      updateQuery: (previous, { fetchMoreResult }) => ({
+        tasksByProject: {
+          ...fetchMoreResult.tasksByProject,
+          edges: [
+            ...previous.tasksByProject.edges,
+            ...fetchMoreResult.tasksByProject.edges,
+          ],
+        },
+      }),
+    });
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -142,7 +197,19 @@ export default function ProjectDetail() {
             <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-indigo-600"></div>
           </div>
         ) : (
-          <TaskBoard tasks={tasks} onTaskUpdate={refetch} />
+          <>
+            <TaskBoard tasks={tasks} onTaskUpdate={refetch} />
+            {pageInfo?.hasNextPage && (
+              <div className="mt-6 text-center">
+                <button
+                  onClick={loadMoreTasks}
+                  className="px-4 py-2 text-indigo-600 hover:text-indigo-700 font-medium"
+                >
+                  Load more tasks
+                </button>
+              </div>
+            )}
+          </>
         )}
       </main>
 
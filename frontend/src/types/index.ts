@@ -93,8 +93,23 @@ export enum ProjectStatus {
     content: string;
     authorEmail: string;
   }
+  // Relay-style connection returned by the paginated list fields
+  export interface PageInfo {
+    hasNextPage: boolean;
+    endCursor?: string | null;
+  }
+
+  export interface Connection<T> {
+    edges: { node: T }[];
+    pageInfo: PageInfo;
+  }
+
+  export function nodes<T>(connection?: Connection<T>): T[] {
+    return connection?.edges.map((edge) => edge.node) || [];
+  }
+
   export interface GetOrganizationsData {
-    allOrganizations: Organization[];
+    allOrganizations: Connection<Organization>;
   }
   
   export interface GetProjectsByOrgData {
@@ -106,11 +121,19 @@ export enum ProjectStatus {
   }
   
   export interface GetTasksByProjectData {
-    tasksByProject: Task[];
+    tasksByProject: Connection<Task>;
   }
   
   export interface GetCommentsByTaskData {
-    commentsByTask: TaskComment[];
+    commentsByTask: Connection<TaskComment>;
+  }
+
+  export interface TaskChangedData {
+    taskChanged: {
+      action: 'CREATED' | 'UPDATED';
+      changedFields: string[] | null;
+      task: Task;
+    };
   }
   
   // GraphQL Mutation Result Types